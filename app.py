@@ -4,6 +4,7 @@ import plotly.express as px
 import plotly.graph_objects as go
 from datetime import datetime
 import numpy as np
+from src.utils.data_loader import load_data_source
 
 # ページ設定
 st.set_page_config(
@@ -17,13 +18,9 @@ st.set_page_config(
 st.title("📊 販売データダッシュボード")
 st.markdown("---")
 
-# データの読み込み
-@st.cache_data
+# データの読み込み（全セッションで共有するデータセット）
 def load_data():
-    df = pd.read_csv('data/sample-data.csv')
-    df['購入日'] = pd.to_datetime(df['購入日'])
-    df['年月'] = df['購入日'].dt.to_period('M').astype(str)
-    return df
+    return load_data_source('data/sample-data.csv')
 
 try:
     df = load_data()
@@ -87,7 +84,7 @@ try:
     
     with tab1:
         st.subheader("月別売上推移")
-        monthly_sales = filtered_df.groupby('年月')['購入金額'].sum().reset_index()
+        monthly_sales = filtered_df.groupby('年月', observed=True)['購入金額'].sum().reset_index()
         fig1 = px.line(
             monthly_sales,
             x='年月',
@@ -106,7 +103,7 @@ try:
         
         with col1:
             st.subheader("支払方法別売上")
-            payment_sales = filtered_df.groupby('支払方法')['購入金額'].sum().reset_index()
+            payment_sales = filtered_df.groupby('支払方法', observed=True)['購入金額'].sum().reset_index()
             fig2 = px.pie(
                 payment_sales,
                 values='購入金額',
@@ -117,7 +114,7 @@ try:
         
         with col2:
             st.subheader("地域別売上")
-            region_sales = filtered_df.groupby('地域')['購入金額'].sum().reset_index()
+            region_sales = filtered_df.groupby('地域', observed=True)['購入金額'].sum().reset_index()
             fig3 = px.bar(
                 region_sales,
                 x='地域',
@@ -133,7 +130,7 @@ try:
         
         with col1:
             st.subheader("カテゴリー別売上")
-            category_sales = filtered_df.groupby('購入カテゴリー')['購入金額'].sum().reset_index()
+            category_sales = filtered_df.groupby('購入カテゴリー', observed=True)['購入金額'].sum().reset_index()
             fig4 = px.bar(
                 category_sales,
                 x='購入カテゴリー',
@@ -176,7 +173,7 @@ try:
         
         with col2:
             st.subheader("性別×地域別売上")
-            gender_region = filtered_df.groupby(['性別', '地域'])['購入金額'].sum().reset_index()
+            gender_region = filtered_df.groupby(['性別', '地域'], observed=True)['購入金額'].sum().reset_index()
             fig7 = px.bar(
                 gender_region,
                 x='地域',
@@ -193,7 +190,7 @@ try:
             bins=[0, 20, 30, 40, 50, 60, 100],
             labels=['~20代', '30代', '40代', '50代', '60代', '70代~']
         )
-        age_group_sales = filtered_df.groupby('年齢層')['購入金額'].agg(['sum', 'mean', 'count']).reset_index()
+        age_group_sales = filtered_df.groupby('年齢層', observed=True)['購入金額'].agg(['sum', 'mean', 'count']).reset_index()
         age_group_sales.columns = ['年齢層', '合計金額', '平均金額', '購入件数']
         
         fig8 = go.Figure()
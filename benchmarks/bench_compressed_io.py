@@ -0,0 +1,152 @@
+"""
+圧縮CSV読み込みのベンチマーク
+
+非圧縮・gzip・bz2・xzの各形式について、一括読み込み（load_dataと同じパース）と
+チャンク単位のストリーミング取り込みの実行時間とピークメモリ（RSS）を比較する。
+計測は形式・方式ごとに別プロセスで行い、ピークRSSが互いに影響しないようにする。
+
+使い方:
+    python benchmarks/bench_compressed_io.py --rows 100000 1000000
+"""
+import argparse
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+
+# プロジェクトルートをパスに追加
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+from src.utils.schema import CSV_DTYPES, add_derived_columns
+from src.utils.streaming import stream_ingest
+
+# 比較する形式（拡張子, pandasのcompression引数）
+FORMATS = [
+    ('.csv', None),
+    ('.csv.gz', 'gzip'),
+    ('.csv.bz2', 'bz2'),
+    ('.csv.xz', 'xz'),
+]
+
+MODES = ['一括読み込み', 'ストリーミング']
+
+
+def generate_data(rows: int, seed: int = 0) -> pd.DataFrame:
+    """サンプルデータと同じ列構成の合成データを生成"""
+    rng = np.random.default_rng(seed)
+    dates = pd.Timestamp('2023-01-01') + pd.to_timedelta(rng.integers(0, 730, rows), unit='D')
+    return pd.DataFrame({
+        '顧客ID': rng.integers(1, max(rows // 4, 2), rows),
+        '年齢': rng.integers(18, 80, rows),
+        '性別': rng.choice(['男性', '女性'], rows),
+        '地域': rng.choice(['関東', '関西', '中部', '九州'], rows),
+        '購入カテゴリー': rng.choice(['家電', 'スポーツ', 'ファッション', '食品', '書籍'], rows),
+        '購入金額': rng.integers(500, 100000, rows),
+        '購入日': dates.strftime('%Y-%m-%d'),
+        '支払方法': rng.choice(['クレジットカード', '現金', '電子マネー'], rows),
+    })
+
+
+def run_worker(mode: str, file_path: str, chunksize: int) -> None:
+    """1つの形式・方式を計測し、結果を標準出力に書き出す（子プロセスで実行）"""
+    start = time.perf_counter()
+    
+    if mode == '一括読み込み':
+        df = pd.read_csv(file_path, dtype=CSV_DTYPES)
+        rows = len(add_derived_columns(df))
+    else:
+        with tempfile.TemporaryDirectory() as store_dir:
+            rows = stream_ingest(file_path, store_dir, chunksize).row_count
+    
+    elapsed = time.perf_counter() - start
+    print(f"{rows},{elapsed},{peak_rss_mb()}")
+
+
+def peak_rss_mb() -> float:
+    """
+    このプロセスのピークRSS（MB）を取得
+    
+    ru_maxrssはexec前の親プロセスの値を引き継ぐため、Linuxでは
+    exec後のアドレス空間のピークであるVmHWMを使う。
+    """
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    
+    # Linux以外（ru_maxrssはmacOSではバイト単位、その他はKB単位）
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return maxrss / 1024 ** 2 if sys.platform == 'darwin' else maxrss / 1024
+
+
+def measure(mode: str, file_path: str, chunksize: int) -> dict:
+    """子プロセスで計測を実行し、結果を取得"""
+    output = subprocess.run(
+        [sys.executable, __file__, '--worker', mode, file_path, '--chunksize', str(chunksize)],
+        check=True,
+        capture_output=True,
+        text=True
+    ).stdout.strip().splitlines()[-1]
+    rows, elapsed, peak_rss_mb = output.split(',')
+    
+    return {
+        '行数': int(rows),
+        '実行時間(秒)': float(elapsed),
+        'ピークRSS(MB)': float(peak_rss_mb),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='圧縮CSV読み込みのベンチマーク')
+    parser.add_argument('--rows', type=int, nargs='+', default=[100_000, 500_000, 2_000_000])
+    parser.add_argument('--chunksize', type=int, default=200_000)
+    parser.add_argument('--worker', nargs=2, metavar=('MODE', 'FILE'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    
+    if args.worker:
+        run_worker(args.worker[0], args.worker[1], args.chunksize)
+        return
+    
+    results = []
+    with tempfile.TemporaryDirectory() as work_dir:
+        for rows in args.rows:
+            data = generate_data(rows)
+            
+            for ext, compression in FORMATS:
+                file_path = os.path.join(work_dir, f"bench_{rows}{ext}")
+                data.to_csv(file_path, index=False, compression=compression)
+                
+                for mode in MODES:
+                    result = measure(mode, file_path, args.chunksize)
+                    results.append({
+                        '行数': rows,
+                        '形式': ext,
+                        'ファイルサイズ(MB)': os.path.getsize(file_path) / 1024 ** 2,
+                        '方式': mode,
+                        '実行時間(秒)': result['実行時間(秒)'],
+                        'ピークRSS(MB)': result['ピークRSS(MB)'],
+                    })
+                
+                os.remove(file_path)
+    
+    report = pd.DataFrame(results)
+    
+    # 非圧縮CSVに対する比率
+    baseline = report[report['形式'] == '.csv'].set_index(['行数', '方式'])
+    keys = pd.MultiIndex.from_frame(report[['行数', '方式']])
+    report['時間比'] = report['実行時間(秒)'].values / baseline.loc[keys, '実行時間(秒)'].values
+    report['RSS比'] = report['ピークRSS(MB)'].values / baseline.loc[keys, 'ピークRSS(MB)'].values
+    
+    print(report.to_string(index=False, float_format=lambda x: f'{x:,.2f}'))
+
+
+if __name__ == '__main__':
+    main()
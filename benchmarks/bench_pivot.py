@@ -0,0 +1,104 @@
+"""
+ピボット集計のベンチマーク
+
+ヒートマップと同じ行・列の組み合わせ（地域×カテゴリー、支払方法×カテゴリー、
+年月×カテゴリー）と集計関数（sum・count・mean）について、pd.pivot_tableと
+bincountによるピボット集計（bincount_pivot）の実行時間を比較する。
+両者の結果が一致することも確認する。
+
+使い方:
+    python benchmarks/bench_pivot.py --rows 1000000 10000000
+"""
+import argparse
+import os
+import sys
+import time
+import numpy as np
+import pandas as pd
+
+# プロジェクトルートをパスに追加
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+from src.config import CATEGORICAL_COLUMNS
+from src.utils.pivot import bincount_pivot
+from src.utils.schema import add_derived_columns
+
+# 比較する(行のカラム, 列のカラム)
+DIMENSIONS = [
+    ('地域', '購入カテゴリー'),
+    ('支払方法', '購入カテゴリー'),
+    ('年月', '購入カテゴリー'),
+]
+
+AGGFUNCS = ['sum', 'count', 'mean']
+
+
+def generate_data(rows: int, seed: int = 0) -> pd.DataFrame:
+    """サンプルデータと同じ列構成の合成データを生成（load_dataと同じくカテゴリー型・派生カラム付き）"""
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({
+        '顧客ID': rng.integers(1, max(rows // 4, 2), rows),
+        '年齢': rng.integers(18, 80, rows),
+        '性別': rng.choice(['男性', '女性'], rows),
+        '地域': rng.choice(['北海道', '東北', '関東', '中部', '関西', '中国', '四国', '九州'], rows),
+        '購入カテゴリー': rng.choice(['家電', 'スポーツ', 'ファッション', '食品', '書籍'], rows),
+        '購入金額': rng.integers(500, 100000, rows).astype(np.int32),
+        '購入日': pd.Timestamp('2023-01-01') + pd.to_timedelta(rng.integers(0, 730, rows), unit='D'),
+        '支払方法': rng.choice(['クレジットカード', '現金', '電子マネー'], rows),
+    })
+    df = df.astype({col: 'category' for col in CATEGORICAL_COLUMNS})
+    return add_derived_columns(df)
+
+
+def best_time(func, repeat: int) -> float:
+    """関数をrepeat回実行し、最短の実行時間（秒）を取得"""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='ピボット集計のベンチマーク')
+    parser.add_argument('--rows', type=int, nargs='+', default=[1_000_000, 10_000_000])
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+    
+    results = []
+    for rows in args.rows:
+        df = generate_data(rows)
+        
+        for index, columns in DIMENSIONS:
+            for aggfunc in AGGFUNCS:
+                expected = pd.pivot_table(df, index=index, columns=columns, values='購入金額', aggfunc=aggfunc, fill_value=0)
+                actual = bincount_pivot(df[index], df[columns], df['購入金額'], aggfunc, fill_value=0)
+                pd.testing.assert_frame_equal(actual, expected)
+                
+                pivot_table_time = best_time(
+                    lambda: pd.pivot_table(df, index=index, columns=columns, values='購入金額', aggfunc=aggfunc, fill_value=0),
+                    args.repeat
+                )
+                bincount_time = best_time(
+                    lambda: bincount_pivot(df[index], df[columns], df['購入金額'], aggfunc, fill_value=0),
+                    args.repeat
+                )
+                results.append({
+                    '行数': rows,
+                    '行×列': f"{index}×{columns}",
+                    '集計': aggfunc,
+                    'pivot_table(秒)': pivot_table_time,
+                    'bincount(秒)': bincount_time,
+                    '高速化倍率': pivot_table_time / bincount_time,
+                })
+        
+        del df
+    
+    report = pd.DataFrame(results)
+    print(report.to_string(index=False, float_format=lambda x: f'{x:,.3f}'))
+
+
+if __name__ == '__main__':
+    main()
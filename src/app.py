@@ -10,14 +10,16 @@ import os
 # パスの設定
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from src.config import PAGE_CONFIG, DATA_PATH
-from src.utils.data_loader import load_data
-from src.utils.data_processor import filter_data, add_age_group, calculate_kpis
+from src.config import PAGE_CONFIG, DATA_PATH, COMPARISON_PERIODS
+from src.utils.data_loader import load_data_source
+from src.utils.data_processor import filter_view, add_age_group, calculate_kpis, group_summary, aggregate_by_calendar
 from src.utils.analytics import (
     calculate_rfm, generate_insights, calculate_seasonality,
     calculate_trend, calculate_customer_lifetime_value
 )
 from src.utils.export import export_to_csv, export_to_excel, prepare_export_data, create_summary_report
+from src.utils.filtered_view import as_frame
+from src.utils.period_comparison import compare_periods
 from src.components.kpi_cards import display_kpi_cards, display_comparison_metrics
 from src.components.filters import display_sidebar_filters, display_filter_summary
 from src.components import charts
@@ -38,9 +40,8 @@ st.markdown("### 顧客行動と売上の高度な可視化・分析")
 st.markdown("---")
 
 # データの読み込み
-@st.cache_data
 def get_data():
-    return load_data(DATA_PATH)
+    return load_data_source(DATA_PATH)
 
 try:
     df = get_data()
@@ -53,7 +54,7 @@ try:
     filters = display_sidebar_filters(df)
     
     # データフィルタリング
-    filtered_df = filter_data(df, filters)
+    filtered_df = filter_view(df, filters)
     
     # 年齢層を追加
     filtered_df = add_age_group(filtered_df)
@@ -75,6 +76,28 @@ try:
     st.markdown("## 📈 主要指標（KPI）")
     display_kpi_cards(kpis)
     
+    # 直近の期間と前期間の比較
+    comparison_period = st.selectbox(
+        "比較期間",
+        list(COMPARISON_PERIODS),
+        index=1,
+        format_func=lambda period: f"{COMPARISON_PERIODS[period]}比"
+    )
+    # 前期間が期間フィルターの外にはみ出しても欠けないよう、日付以外の条件だけを適用した
+    # データで比較し、直近の期間の末日はフィルター結果の最終日にそろえる
+    comparison = None
+    if not filtered_df.empty:
+        comparison_filters = {key: value for key, value in filters.items() if key != 'date_range'}
+        comparison = compare_periods(
+            filter_view(df, comparison_filters),
+            comparison_period,
+            end=filtered_df['購入日'].max()
+        )
+    if comparison:
+        current_start, current_end = comparison['current_range']
+        st.caption(f"直近の期間: {current_start:%Y-%m-%d} 〜 {current_end:%Y-%m-%d}")
+        display_comparison_metrics(comparison['current'], comparison['previous'], comparison['period_name'])
+    
     st.markdown("---")
     
     # メインタブ
@@ -175,7 +198,7 @@ try:
         
         # 支払方法別統計
         st.subheader("📊 支払方法別統計")
-        payment_stats = filtered_df.groupby('支払方法').agg({
+        payment_stats = group_summary(filtered_df, '支払方法', {
             '購入金額': ['sum', 'mean', 'count'],
             '顧客ID': 'nunique'
         }).reset_index()
@@ -252,20 +275,32 @@ try:
         
         with col2:
             # 曜日別統計
-            weekday_stats = filtered_df.groupby('曜日_日本語').agg({
+            weekday_stats = group_summary(filtered_df, '曜日_日本語', {
                 '購入金額': ['sum', 'mean', 'count']
             }).reset_index()
             weekday_stats.columns = ['曜日', '総売上', '平均購入金額', '取引件数']
             
-            weekday_order = ['月曜日', '火曜日', '水曜日', '木曜日', '金曜日', '土曜日', '日曜日']
-            weekday_stats['曜日'] = pd.Categorical(weekday_stats['曜日'], categories=weekday_order, ordered=True)
-            weekday_stats = weekday_stats.sort_values('曜日')
-            
             weekday_stats['総売上'] = weekday_stats['総売上'].apply(lambda x: f'¥{x:,.0f}')
             weekday_stats['平均購入金額'] = weekday_stats['平均購入金額'].apply(lambda x: f'¥{x:,.0f}')
             
             st.dataframe(weekday_stats, use_container_width=True, hide_index=True)
         
+        # 平日・土日・祝日別、週番号別分析
+        st.subheader("🎌 平日・土日・祝日別売上")
+        col1, col2 = st.columns(2)
+        
+        with col1:
+            day_type_stats = aggregate_by_calendar(filtered_df, '日区分')
+            for column in ['総売上', '平均購入金額', '1日あたり売上']:
+                day_type_stats[column] = day_type_stats[column].apply(lambda x: f'¥{x:,.0f}')
+            
+            st.dataframe(day_type_stats, use_container_width=True, hide_index=True)
+        
+        with col2:
+            week_stats = aggregate_by_calendar(filtered_df, '週番号')
+            st.bar_chart(week_stats.set_index('週番号')['1日あたり売上'])
+            st.caption("週番号（ISO週）別の1日あたり売上")
+        
         # 月×カテゴリーヒートマップ
         st.subheader("🗓️ 月×カテゴリーヒートマップ")
         fig_monthly_heatmap = charts.create_monthly_category_heatmap(filtered_df)
@@ -306,7 +341,7 @@ try:
         
         # データ表示
         if display_columns and sort_column:
-            display_df = filtered_df[display_columns].copy()
+            display_df = as_frame(filtered_df, display_columns)
             display_df = display_df.sort_values(
                 by=sort_column,
                 ascending=(sort_order == "昇順")
@@ -428,7 +463,7 @@ try:
         
         with col1:
             st.markdown("#### カテゴリー別統計")
-            category_summary = filtered_df.groupby('購入カテゴリー').agg({
+            category_summary = group_summary(filtered_df, '購入カテゴリー', {
                 '購入金額': ['count', 'sum', 'mean', 'max', 'min']
             }).reset_index()
             category_summary.columns = ['カテゴリー', '購入件数', '総売上', '平均購入金額', '最高購入金額', '最低購入金額']
@@ -441,7 +476,7 @@ try:
         
         with col2:
             st.markdown("#### 地域別統計")
-            region_summary = filtered_df.groupby('地域').agg({
+            region_summary = group_summary(filtered_df, '地域', {
                 '購入金額': ['count', 'sum', 'mean'],
                 '顧客ID': 'nunique'
             }).reset_index()
@@ -7,11 +7,13 @@ from plotly.subplots import make_subplots
 import pandas as pd
 import numpy as np
 from src.config import CATEGORY_COLORS, PLOTLY_CONFIG, PLOTLY_LAYOUT
+from src.utils.data_processor import create_pivot_table, group_aggregate
+from src.utils.filtered_view import as_frame
 
 
 def create_monthly_sales_chart(df: pd.DataFrame, title: str = "月別売上推移") -> go.Figure:
     """月別売上推移グラフ"""
-    monthly_sales = df.groupby('年月')['購入金額'].sum().reset_index()
+    monthly_sales = group_aggregate(df, '年月', '購入金額')
     
     fig = px.line(
         monthly_sales,
@@ -39,7 +41,7 @@ def create_monthly_sales_chart(df: pd.DataFrame, title: str = "月別売上推
 
 def create_category_pie_chart(df: pd.DataFrame, title: str = "カテゴリー別売上構成") -> go.Figure:
     """カテゴリー別円グラフ"""
-    category_sales = df.groupby('購入カテゴリー')['購入金額'].sum().reset_index()
+    category_sales = group_aggregate(df, '購入カテゴリー', '購入金額')
     
     colors = [CATEGORY_COLORS.get(cat, '#cccccc') for cat in category_sales['購入カテゴリー']]
     
@@ -64,7 +66,7 @@ def create_category_pie_chart(df: pd.DataFrame, title: str = "カテゴリー別
 
 def create_region_bar_chart(df: pd.DataFrame, title: str = "地域別売上") -> go.Figure:
     """地域別棒グラフ"""
-    region_sales = df.groupby('地域')['購入金額'].sum().reset_index()
+    region_sales = group_aggregate(df, '地域', '購入金額')
     region_sales = region_sales.sort_values('購入金額', ascending=False)
     
     fig = px.bar(
@@ -88,8 +90,9 @@ def create_region_bar_chart(df: pd.DataFrame, title: str = "地域別売上") ->
 
 def create_payment_donut_chart(df: pd.DataFrame, title: str = "支払方法別利用割合") -> go.Figure:
     """支払方法別ドーナツグラフ"""
-    payment_counts = df['支払方法'].value_counts().reset_index()
+    payment_counts = group_aggregate(df, '支払方法', '顧客ID', 'count')
     payment_counts.columns = ['支払方法', '件数']
+    payment_counts = payment_counts.sort_values('件数', ascending=False)
     
     fig = go.Figure(data=[go.Pie(
         labels=payment_counts['支払方法'],
@@ -112,7 +115,7 @@ def create_payment_donut_chart(df: pd.DataFrame, title: str = "支払方法別
 def create_age_distribution_histogram(df: pd.DataFrame, title: str = "年齢分布") -> go.Figure:
     """年齢分布ヒストグラム"""
     fig = px.histogram(
-        df,
+        as_frame(df, ['年齢']),
         x='年齢',
         nbins=30,
         title=title,
@@ -131,7 +134,7 @@ def create_age_distribution_histogram(df: pd.DataFrame, title: str = "年齢分
 
 def create_gender_region_grouped_bar(df: pd.DataFrame, title: str = "性別×地域別売上") -> go.Figure:
     """性別×地域別グループ化棒グラフ"""
-    gender_region = df.groupby(['性別', '地域'])['購入金額'].sum().reset_index()
+    gender_region = group_aggregate(df, ['性別', '地域'], '購入金額')
     
     fig = px.bar(
         gender_region,
@@ -154,17 +157,13 @@ def create_gender_region_grouped_bar(df: pd.DataFrame, title: str = "性別×地
 
 def create_age_group_analysis(df: pd.DataFrame, title: str = "年齢層別分析") -> go.Figure:
     """年齢層別の複合グラフ（棒グラフ+折れ線グラフ）"""
-    df_copy = df.copy()
-    df_copy['年齢層'] = pd.cut(
-        df_copy['年齢'],
+    age_group = pd.cut(
+        df['年齢'],
         bins=[0, 20, 30, 40, 50, 60, 100],
         labels=['10代', '20代', '30代', '40代', '50代', '60代以上']
-    )
+    ).rename('年齢層')
     
-    age_stats = df_copy.groupby('年齢層').agg({
-        '購入金額': ['sum', 'mean'],
-        '顧客ID': 'count'
-    }).reset_index()
+    age_stats = df['購入金額'].groupby(age_group, observed=True).agg(['sum', 'mean', 'count']).reset_index()
     
     age_stats.columns = ['年齢層', '総売上', '平均購入金額', '購入件数']
     
@@ -208,14 +207,7 @@ def create_age_group_analysis(df: pd.DataFrame, title: str = "年齢層別分析
 
 def create_heatmap_region_category(df: pd.DataFrame, title: str = "地域×カテゴリーヒートマップ") -> go.Figure:
     """地域×カテゴリーのヒートマップ"""
-    pivot_data = pd.pivot_table(
-        df,
-        values='購入金額',
-        index='地域',
-        columns='購入カテゴリー',
-        aggfunc='sum',
-        fill_value=0
-    )
+    pivot_data = create_pivot_table(df, '地域', '購入カテゴリー', '購入金額', 'sum')
     
     fig = go.Figure(data=go.Heatmap(
         z=pivot_data.values,
@@ -237,7 +229,7 @@ def create_heatmap_region_category(df: pd.DataFrame, title: str = "地域×カ
 
 def create_time_series_area_chart(df: pd.DataFrame, title: str = "日別売上推移") -> go.Figure:
     """日別売上推移エリアチャート"""
-    daily_sales = df.groupby('購入日')['購入金額'].sum().reset_index()
+    daily_sales = group_aggregate(df, '購入日', '購入金額')
     
     fig = px.area(
         daily_sales,
@@ -262,7 +254,7 @@ def create_time_series_area_chart(df: pd.DataFrame, title: str = "日別売上
 
 def create_category_ranking_bar(df: pd.DataFrame, title: str = "カテゴリー別売上ランキング") -> go.Figure:
     """カテゴリー別横棒グラフ（ランキング）"""
-    category_sales = df.groupby('購入カテゴリー')['購入金額'].sum().reset_index()
+    category_sales = group_aggregate(df, '購入カテゴリー', '購入金額')
     category_sales = category_sales.sort_values('購入金額', ascending=True)
     
     colors = [CATEGORY_COLORS.get(cat, '#cccccc') for cat in category_sales['購入カテゴリー']]
@@ -289,7 +281,7 @@ def create_category_ranking_bar(df: pd.DataFrame, title: str = "カテゴリー
 def create_scatter_age_amount(df: pd.DataFrame, title: str = "年齢×購入金額の散布図") -> go.Figure:
     """年齢と購入金額の散布図"""
     fig = px.scatter(
-        df,
+        as_frame(df, ['年齢', '購入金額', '性別']),
         x='年齢',
         y='購入金額',
         color='性別',
@@ -309,14 +301,7 @@ def create_scatter_age_amount(df: pd.DataFrame, title: str = "年齢×購入金
 
 def create_payment_category_heatmap(df: pd.DataFrame, title: str = "支払方法×カテゴリーヒートマップ") -> go.Figure:
     """支払方法×カテゴリーのヒートマップ"""
-    pivot_data = pd.pivot_table(
-        df,
-        values='顧客ID',
-        index='支払方法',
-        columns='購入カテゴリー',
-        aggfunc='count',
-        fill_value=0
-    )
+    pivot_data = create_pivot_table(df, '支払方法', '購入カテゴリー', '顧客ID', 'count')
     
     fig = go.Figure(data=go.Heatmap(
         z=pivot_data.values,
@@ -338,15 +323,8 @@ def create_payment_category_heatmap(df: pd.DataFrame, title: str = "支払方法
 
 def create_weekday_sales_bar(df: pd.DataFrame, title: str = "曜日別売上") -> go.Figure:
     """曜日別売上棒グラフ"""
-    weekday_order = ['月曜日', '火曜日', '水曜日', '木曜日', '金曜日', '土曜日', '日曜日']
-    
-    weekday_sales = df.groupby('曜日_日本語')['購入金額'].sum().reset_index()
-    weekday_sales['曜日_日本語'] = pd.Categorical(
-        weekday_sales['曜日_日本語'],
-        categories=weekday_order,
-        ordered=True
-    )
-    weekday_sales = weekday_sales.sort_values('曜日_日本語')
+    # 曜日_日本語は月曜始まりの順序付きカテゴリーのため、集計結果は曜日順に並ぶ
+    weekday_sales = group_aggregate(df, '曜日_日本語', '購入金額')
     
     fig = px.bar(
         weekday_sales,
@@ -369,14 +347,7 @@ def create_weekday_sales_bar(df: pd.DataFrame, title: str = "曜日別売上") -
 
 def create_monthly_category_heatmap(df: pd.DataFrame, title: str = "月×カテゴリーヒートマップ") -> go.Figure:
     """月×カテゴリーのヒートマップ"""
-    pivot_data = pd.pivot_table(
-        df,
-        values='購入金額',
-        index='月',
-        columns='購入カテゴリー',
-        aggfunc='sum',
-        fill_value=0
-    )
+    pivot_data = create_pivot_table(df, '月', '購入カテゴリー', '購入金額', 'sum')
     
     fig = go.Figure(data=go.Heatmap(
         z=pivot_data.values,
@@ -399,7 +370,7 @@ def create_monthly_category_heatmap(df: pd.DataFrame, title: str = "月×カテ
 def create_purchase_amount_distribution(df: pd.DataFrame, title: str = "購入金額分布") -> go.Figure:
     """購入金額の分布ヒストグラム"""
     fig = px.histogram(
-        df,
+        as_frame(df, ['購入金額']),
         x='購入金額',
         nbins=50,
         title=title,
@@ -468,7 +439,7 @@ def create_customer_segment_pie(rfm_df: pd.DataFrame, title: str = "顧客セグ
 
 def create_trend_with_moving_average(df: pd.DataFrame, title: str = "売上トレンド（移動平均付き）") -> go.Figure:
     """移動平均線付き売上トレンド"""
-    daily_sales = df.groupby('購入日')['購入金額'].sum().reset_index()
+    daily_sales = group_aggregate(df, '購入日', '購入金額')
     daily_sales = daily_sales.sort_values('購入日')
     
     # 7日移動平均
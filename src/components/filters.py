@@ -3,6 +3,10 @@
 """
 import streamlit as st
 from datetime import datetime, timedelta
+from src.utils.data_loader import get_date_range, get_unique_values
+from src.utils.data_processor import explain_filters, get_facet_counts
+from src.utils.distinct_sketch import standard_error
+from src.utils.query_planner import FILTER_LABELS
 
 
 def display_sidebar_filters(df, key_prefix: str = ""):
@@ -22,8 +26,7 @@ def display_sidebar_filters(df, key_prefix: str = ""):
     
     # 日付範囲フィルター
     st.sidebar.subheader("📅 期間")
-    min_date = df['購入日'].min().date()
-    max_date = df['購入日'].max().date()
+    min_date, max_date = (value.date() for value in get_date_range(df))
     
     date_range = st.sidebar.date_input(
         "期間を選択",
@@ -70,55 +73,69 @@ def display_sidebar_filters(df, key_prefix: str = ""):
     
     st.sidebar.markdown("---")
     
+    regions = get_unique_values(df, '地域')
+    genders = get_unique_values(df, '性別')
+    categories = get_unique_values(df, '購入カテゴリー')
+    payment_methods = get_unique_values(df, '支払方法')
+    ages = get_unique_values(df, '年齢')
+    min_age, max_age = int(ages[0]), int(ages[-1])
+    
+    # 各選択肢の件数（他のフィルター条件の下で一致する件数）
+    facets = get_facet_counts(df, {
+        'date_range': filters['date_range'],
+        'regions': st.session_state.get(f"{key_prefix}regions"),
+        'genders': st.session_state.get(f"{key_prefix}genders"),
+        'categories': st.session_state.get(f"{key_prefix}categories"),
+        'payment_methods': st.session_state.get(f"{key_prefix}payment_methods"),
+        'age_range': st.session_state.get(f"{key_prefix}age_range", (min_age, max_age)),
+    })
+    
     # 地域フィルター
     st.sidebar.subheader("🗾 地域")
-    regions = sorted(df['地域'].unique().tolist())
     selected_regions = st.sidebar.multiselect(
         "地域を選択",
         options=regions,
         default=regions,
+        format_func=_count_label(facets, 'regions'),
         key=f"{key_prefix}regions"
     )
     filters['regions'] = selected_regions if selected_regions else regions
     
     # 性別フィルター
     st.sidebar.subheader("👥 性別")
-    genders = sorted(df['性別'].unique().tolist())
     selected_genders = st.sidebar.multiselect(
         "性別を選択",
         options=genders,
         default=genders,
+        format_func=_count_label(facets, 'genders'),
         key=f"{key_prefix}genders"
     )
     filters['genders'] = selected_genders if selected_genders else genders
     
     # カテゴリーフィルター
     st.sidebar.subheader("🏷️ 購入カテゴリー")
-    categories = sorted(df['購入カテゴリー'].unique().tolist())
     selected_categories = st.sidebar.multiselect(
         "カテゴリーを選択",
         options=categories,
         default=categories,
+        format_func=_count_label(facets, 'categories'),
         key=f"{key_prefix}categories"
     )
     filters['categories'] = selected_categories if selected_categories else categories
     
     # 支払方法フィルター
     st.sidebar.subheader("💳 支払方法")
-    payment_methods = sorted(df['支払方法'].unique().tolist())
     selected_payment_methods = st.sidebar.multiselect(
         "支払方法を選択",
         options=payment_methods,
         default=payment_methods,
+        format_func=_count_label(facets, 'payment_methods'),
         key=f"{key_prefix}payment_methods"
     )
     filters['payment_methods'] = selected_payment_methods if selected_payment_methods else payment_methods
     
     # 年齢範囲フィルター
     st.sidebar.subheader("👤 年齢")
-    min_age = int(df['年齢'].min())
-    max_age = int(df['年齢'].max())
-    
     age_range = st.sidebar.slider(
         "年齢範囲",
         min_value=min_age,
@@ -128,15 +145,66 @@ def display_sidebar_filters(df, key_prefix: str = ""):
     )
     filters['age_range'] = age_range
     
+    # 顧客数の近似計算
+    error = standard_error()
+    filters['approximate'] = st.sidebar.checkbox(
+        "顧客数を近似計算する",
+        value=False,
+        help=f"HyperLogLogで顧客数を推定します。長い期間や大量のデータで高速になります（相対標準誤差 約{error:.1%}）",
+        key=f"{key_prefix}approximate"
+    )
+    if filters['approximate']:
+        st.sidebar.caption(f"顧客数は推定値です（約95%の確率で誤差±{2 * error:.1%}以内）")
+    
     st.sidebar.markdown("---")
     
     # フィルターリセットボタン
     if st.sidebar.button("🔄 フィルターをリセット", key=f"{key_prefix}reset"):
         st.rerun()
     
+    display_filter_plan(df, filters)
+    
     return filters
 
 
+def _count_label(facets: dict, key: str):
+    """選択肢に件数を添えて表示する関数を作成（件数がない場合はそのまま表示）"""
+    if facets is None:
+        return str
+    counts = facets[key]
+    return lambda value: f"{value}（{counts.get(value, 0):,}件）"
+
+
+def display_filter_plan(df, filters: dict):
+    """
+    フィルターの実行計画をサイドバーに表示（デバッグ用）
+    
+    Args:
+        df: DataFrame
+        filters: フィルター条件の辞書
+    """
+    plan = explain_filters(df, filters)
+    if plan is None:
+        return
+    
+    with st.sidebar.expander("🧭 フィルター実行計画"):
+        if plan.is_empty:
+            st.caption("一致する行がないため、条件は評価しません")
+        
+        steps = plan.to_frame()
+        if steps.empty:
+            st.caption("絞り込み条件なし（全行を表示）")
+        else:
+            steps['推定選択率'] = steps['推定選択率'].apply(lambda x: f'{x:.1%}')
+            steps['推定件数'] = steps['推定件数'].apply(lambda x: f'{x:,}')
+            st.dataframe(steps, use_container_width=True, hide_index=True)
+        
+        for key, reason in plan.eliminated:
+            st.caption(f"省略: {FILTER_LABELS.get(key, key)}（{reason}）")
+        
+        st.caption(f"推定件数: {plan.estimated_rows():,}件 / 全体: {plan.n_rows:,}件")
+
+
 def display_filter_summary(filters: dict, filtered_count: int, total_count: int):
     """
     適用されているフィルターのサマリーを表示
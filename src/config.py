@@ -42,6 +42,21 @@ PLOTLY_LAYOUT = {
 AGE_BINS = [0, 20, 30, 40, 50, 60, 70, 100]
 AGE_LABELS = ['10代', '20代', '30代', '40代', '50代', '60代', '70代以上']
 
+# カテゴリー型で保持するカラム
+CATEGORICAL_COLUMNS = ['性別', '地域', '購入カテゴリー', '支払方法']
+
+# フィルター条件のキーと対象のカテゴリーカラム
+CATEGORY_FILTER_COLUMNS = {
+    'regions': '地域',
+    'genders': '性別',
+    'categories': '購入カテゴリー',
+    'payment_methods': '支払方法',
+}
+
+# 曜日の並び順
+WEEKDAY_NAMES = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+WEEKDAY_NAMES_JA = ['月曜日', '火曜日', '水曜日', '木曜日', '金曜日', '土曜日', '日曜日']
+
 # RFM分析のスコア閾値
 RFM_THRESHOLDS = {
     'recency': [30, 60, 90],      # 日数
@@ -58,9 +73,41 @@ CUSTOMER_SEGMENTS = {
     '休眠顧客': {'rfm_score_min': 0, 'color': '#d62728'},
 }
 
-# データファイルパス
+# データファイルパス（年月ごとのCSVを置いたディレクトリも指定可能）
 DATA_PATH = 'data/sample-data.csv'
 
+# 年月ごとのパーティションを読み込む期間（最新のパーティションから遡る月数、Noneの場合は全期間）
+PARTITION_RETENTION_MONTHS = 24
+
+# 列指向スナップショット（Feather）の保存先
+SNAPSHOT_DIR = 'data/.cache'
+
+# このサイズを超えるCSVはチャンク単位のストリーミング取り込みで読み込む
+STREAMING_THRESHOLD_BYTES = 512 * 1024 * 1024
+
+# ストリーミング取り込みの1チャンクあたりの行数
+STREAMING_CHUNK_ROWS = 1_000_000
+
+# 圧縮CSV（.csv.gz/.csv.bz2/.csv.xz）の展開後サイズを見積もる際の圧縮率
+COMPRESSION_RATIO_ESTIMATE = 5
+
+# フィルター結果キャッシュの上限サイズ（保持する行番号配列の合計バイト数）
+FILTER_CACHE_MAX_BYTES = 64 * 1024 * 1024
+
+# 近似顧客数（HyperLogLog）のレジスタ数の指数（レジスタ数2**p、相対標準誤差は1.04/√(2**p)）
+DISTINCT_SKETCH_PRECISION = 12
+
+# 期間比較の期間の種類と、前期間の表示名
+COMPARISON_PERIODS = {
+    'W': '前週',
+    'M': '前月',
+    'Q': '前四半期',
+    'Y': '前年',
+}
+
+# 分析用ストレージ（'pandas': メモリ上のDataFrame, 'sqlite': フィルター・集計をSQLiteで実行）
+STORAGE_BACKEND = 'pandas'
+
 # ページ設定
 PAGE_CONFIG = {
     'page_title': '購買データ分析ダッシュボード - Phase 3',
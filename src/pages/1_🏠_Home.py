@@ -11,8 +11,9 @@ from pathlib import Path
 project_root = Path(__file__).parent.parent.parent
 sys.path.insert(0, str(project_root))
 
-from src.utils.data_loader import load_data
-from src.utils.data_processor import process_data
+from src.config import DATA_PATH
+from src.utils.data_loader import load_data_source, get_date_range
+from src.utils.data_processor import calculate_kpis, slice_date_range
 from src.components.kpi_cards import display_kpi_cards
 import plotly.express as px
 import plotly.graph_objects as go
@@ -66,11 +67,9 @@ with st.sidebar:
     )
 
 # データ読み込み
-@st.cache_data(ttl=300)
 def load_dashboard_data():
     """ダッシュボード用データを読み込み"""
-    df = load_data()
-    df = process_data(df)
+    df = load_data_source(DATA_PATH)
     return df
 
 try:
@@ -79,6 +78,10 @@ try:
     # 概要セクション
     st.header("📈 システム概要")
     
+    min_date, max_date = get_date_range(df)
+    # 全体のKPIはデータの追記分だけで更新される
+    kpis = calculate_kpis(df)
+    
     col1, col2, col3, col4 = st.columns(4)
     
     with col1:
@@ -89,21 +92,21 @@ try:
         )
     
     with col2:
-        latest_date = df['購入日'].max().strftime('%Y-%m-%d')
+        latest_date = max_date.strftime('%Y-%m-%d')
         st.metric(
             label="📅 最新データ日付",
             value=latest_date
         )
     
     with col3:
-        data_range = (df['購入日'].max() - df['購入日'].min()).days
+        data_range = (max_date - min_date).days
         st.metric(
             label="📆 データ期間",
             value=f"{data_range}日"
         )
     
     with col4:
-        unique_customers = df['顧客ID'].nunique()
+        unique_customers = kpis['総顧客数']
         st.metric(
             label="👥 ユニーク顧客数",
             value=f"{unique_customers:,}"
@@ -113,7 +116,7 @@ try:
     
     # KPIカード
     st.header("💡 主要指標")
-    display_kpi_cards(df)
+    display_kpi_cards(kpis)
     
     st.divider()
     
@@ -128,7 +131,7 @@ try:
         # 今月のデータ
         today = datetime.now()
         first_day = today.replace(day=1)
-        current_month = df[df['購入日'] >= first_day]
+        current_month = slice_date_range(df, first_day.date())
         
         if not current_month.empty:
             daily_sales = current_month.groupby(current_month['購入日'].dt.date)['購入金額'].sum().reset_index()
@@ -154,7 +157,7 @@ try:
         st.subheader("🏆 トップカテゴリー")
         
         # カテゴリー別売上トップ5
-        category_sales = df.groupby('購入カテゴリー')['購入金額'].sum().sort_values(ascending=True).tail(5)
+        category_sales = df.groupby('購入カテゴリー', observed=True)['購入金額'].sum().sort_values(ascending=True).tail(5)
         
         fig = px.bar(
             x=category_sales.values,
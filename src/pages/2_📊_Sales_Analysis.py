@@ -11,8 +11,9 @@ from pathlib import Path
 project_root = Path(__file__).parent.parent.parent
 sys.path.insert(0, str(project_root))
 
-from src.utils.data_loader import load_data
-from src.utils.data_processor import filter_data, add_age_group
+from src.config import DATA_PATH
+from src.utils.data_loader import load_data_source
+from src.utils.data_processor import filter_view, add_age_group, group_summary
 from src.components.filters import display_sidebar_filters
 from src.components import charts
 
@@ -35,9 +36,8 @@ st.title("📊 売上分析")
 st.markdown("### 売上データの詳細な可視化と分析")
 
 # データ読み込み
-@st.cache_data(ttl=300)
 def get_data():
-    df = load_data()
+    df = load_data_source(DATA_PATH)
     return df
 
 try:
@@ -47,7 +47,7 @@ try:
     filters = display_sidebar_filters(df)
     
     # データフィルタリング
-    filtered_df = filter_data(df, filters)
+    filtered_df = filter_view(df, filters)
     filtered_df = add_age_group(filtered_df)
     
     # フィルター情報表示
@@ -161,7 +161,7 @@ try:
     # 詳細統計
     st.header("📊 カテゴリー別詳細統計")
     
-    category_stats = filtered_df.groupby('購入カテゴリー').agg({
+    category_stats = group_summary(filtered_df, '購入カテゴリー', {
         '購入金額': ['sum', 'mean', 'count', 'min', 'max']
     }).round(0)
     
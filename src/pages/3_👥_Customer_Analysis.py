@@ -11,8 +11,9 @@ from pathlib import Path
 project_root = Path(__file__).parent.parent.parent
 sys.path.insert(0, str(project_root))
 
-from src.utils.data_loader import load_data
-from src.utils.data_processor import filter_data, add_age_group
+from src.config import DATA_PATH
+from src.utils.data_loader import load_data_source
+from src.utils.data_processor import filter_view, add_age_group, count_customers, get_top_groups, group_summary
 from src.components.filters import display_sidebar_filters
 from src.components import charts
 
@@ -35,9 +36,8 @@ st.title("👥 顧客分析")
 st.markdown("### 顧客行動とセグメンテーションの分析")
 
 # データ読み込み
-@st.cache_data(ttl=300)
 def get_data():
-    df = load_data()
+    df = load_data_source(DATA_PATH)
     return df
 
 try:
@@ -47,7 +47,7 @@ try:
     filters = display_sidebar_filters(df)
     
     # データフィルタリング
-    filtered_df = filter_data(df, filters)
+    filtered_df = filter_view(df, filters)
     filtered_df = add_age_group(filtered_df)
     
     # フィルター情報表示
@@ -60,14 +60,14 @@ try:
     
     col1, col2, col3, col4 = st.columns(4)
     
-    unique_customers = filtered_df['顧客ID'].nunique()
+    unique_customers = count_customers(filtered_df)
     avg_age = filtered_df['年齢'].mean()
     avg_purchase_per_customer = len(filtered_df) / unique_customers if unique_customers > 0 else 0
     
-    # リピート顧客の計算
-    customer_counts = filtered_df.groupby('顧客ID').size()
+    # リピート顧客の計算（顧客ごとの購入回数が必要なため近似モードでも正確に数える）
+    customer_counts = filtered_df['顧客ID'].value_counts(sort=False)
     repeat_customers = (customer_counts > 1).sum()
-    repeat_rate = (repeat_customers / unique_customers * 100) if unique_customers > 0 else 0
+    repeat_rate = (repeat_customers / len(customer_counts) * 100) if len(customer_counts) > 0 else 0
     
     with col1:
         st.metric(
@@ -124,7 +124,7 @@ try:
     
     with col2:
         st.subheader("性別別統計")
-        gender_stats = filtered_df.groupby('性別').agg({
+        gender_stats = group_summary(filtered_df, '性別', {
             '購入金額': ['sum', 'mean', 'count'],
             '顧客ID': 'nunique'
         }).round(0)
@@ -169,12 +169,9 @@ try:
     
     with col1:
         st.subheader("購入金額トップ10顧客")
-        top_customers = filtered_df.groupby('顧客ID').agg({
-            '購入金額': 'sum',
-            '購入日': 'count',
-            '地域': 'first',
-            '性別': 'first'
-        }).sort_values('購入金額', ascending=False).head(10)
+        top_customers = get_top_groups(
+            filtered_df, '顧客ID', '購入金額', 10, rank_by='sum', first_columns=['地域', '性別']
+        )[['合計', '件数', '地域', '性別']]
         
         top_customers.columns = ['総購入金額', '購入回数', '地域', '性別']
         top_customers['平均購入金額'] = (top_customers['総購入金額'] / top_customers['購入回数']).round(0)
@@ -190,12 +187,9 @@ try:
     
     with col2:
         st.subheader("購入回数トップ10顧客")
-        frequent_customers = filtered_df.groupby('顧客ID').agg({
-            '購入日': 'count',
-            '購入金額': 'sum',
-            '地域': 'first',
-            '性別': 'first'
-        }).sort_values('購入日', ascending=False).head(10)
+        frequent_customers = get_top_groups(
+            filtered_df, '顧客ID', '購入金額', 10, rank_by='count', first_columns=['地域', '性別']
+        )[['件数', '合計', '地域', '性別']]
         
         frequent_customers.columns = ['購入回数', '総購入金額', '地域', '性別']
         frequent_customers['平均購入金額'] = (frequent_customers['総購入金額'] / frequent_customers['購入回数']).round(0)
@@ -214,7 +208,7 @@ try:
     # 地域別顧客分析
     st.header("🗺️ 地域別顧客分析")
     
-    region_customer_stats = filtered_df.groupby('地域').agg({
+    region_customer_stats = group_summary(filtered_df, '地域', {
         '顧客ID': 'nunique',
         '購入金額': ['sum', 'mean'],
         '購入日': 'count'
@@ -13,8 +13,9 @@ import plotly.express as px
 project_root = Path(__file__).parent.parent.parent
 sys.path.insert(0, str(project_root))
 
-from src.utils.data_loader import load_data
-from src.utils.data_processor import filter_data
+from src.config import DATA_PATH
+from src.utils.data_loader import load_data_source
+from src.utils.data_processor import filter_view
 from src.components.filters import display_sidebar_filters
 from src.utils.ml_models import (
     predict_sales_simple,
@@ -43,9 +44,8 @@ st.title("🤖 AI予測分析")
 st.markdown("### 機械学習による売上予測と顧客行動分析")
 
 # データ読み込み
-@st.cache_data(ttl=300)
 def get_data():
-    df = load_data()
+    df = load_data_source(DATA_PATH)
     return df
 
 try:
@@ -55,7 +55,7 @@ try:
     filters = display_sidebar_filters(df)
     
     # データフィルタリング
-    filtered_df = filter_data(df, filters)
+    filtered_df = filter_view(df, filters)
     
     # フィルター情報表示
     st.info(f"📊 表示中のデータ: {len(filtered_df):,}件 / 全体: {len(df):,}件")
@@ -11,8 +11,9 @@ from pathlib import Path
 project_root = Path(__file__).parent.parent.parent
 sys.path.insert(0, str(project_root))
 
-from src.utils.data_loader import load_data
-from src.utils.data_processor import filter_data, add_age_group
+from src.config import DATA_PATH
+from src.utils.data_loader import load_data_source
+from src.utils.data_processor import filter_view, add_age_group, aggregate_by_period, group_summary
 from src.components.filters import display_sidebar_filters
 from src.components import charts
 from src.utils.analytics import calculate_rfm, generate_insights
@@ -36,9 +37,8 @@ st.title("📈 トレンド分析")
 st.markdown("### 時系列データの詳細な分析と傾向把握")
 
 # データ読み込み
-@st.cache_data(ttl=300)
 def get_data():
-    df = load_data()
+    df = load_data_source(DATA_PATH)
     return df
 
 try:
@@ -48,7 +48,7 @@ try:
     filters = display_sidebar_filters(df)
     
     # データフィルタリング
-    filtered_df = filter_data(df, filters)
+    filtered_df = filter_view(df, filters)
     filtered_df = add_age_group(filtered_df)
     
     # フィルター情報表示
@@ -75,9 +75,7 @@ try:
     
     with col2:
         # 曜日別統計
-        filtered_df_copy = filtered_df.copy()
-        filtered_df_copy['曜日'] = filtered_df_copy['購入日'].dt.day_name()
-        weekday_stats = filtered_df_copy.groupby('曜日').agg({
+        weekday_stats = group_summary(filtered_df, '曜日', {
             '購入金額': ['sum', 'mean', 'count']
         }).round(0)
         
@@ -174,14 +172,12 @@ try:
     st.header("📊 期間比較分析")
     
     # 月別比較
-    monthly_sales = filtered_df.groupby(filtered_df['購入日'].dt.to_period('M')).agg({
-        '購入金額': 'sum',
-        '顧客ID': 'nunique',
-        '購入日': 'count'
-    }).reset_index()
+    monthly_sales = aggregate_by_period(filtered_df, 'M')
+    monthly_sales = monthly_sales[monthly_sales['取引件数'] > 0].reset_index(drop=True)
     
+    monthly_sales = monthly_sales[['日付', '総売上', '顧客数', '取引件数']]
     monthly_sales.columns = ['月', '売上', '顧客数', '購入件数']
-    monthly_sales['月'] = monthly_sales['月'].astype(str)
+    monthly_sales['月'] = monthly_sales['月'].dt.strftime('%Y-%m')
     
     # 前月比の計算
     if len(monthly_sales) > 1:
@@ -3,6 +3,7 @@ Phase 4 - データ管理ページ
 データの表示、エクスポート、アップロード機能
 """
 
+import os
 import streamlit as st
 import sys
 from pathlib import Path
@@ -11,10 +12,13 @@ from pathlib import Path
 project_root = Path(__file__).parent.parent.parent
 sys.path.insert(0, str(project_root))
 
-from src.utils.data_loader import load_data
-from src.utils.data_processor import filter_data
+from src.config import DATA_PATH
+from src.utils.data_loader import load_data_source, memory_usage_report
+from src.utils.data_processor import filter_view, count_missing
+from src.utils.filtered_view import as_frame
+from src.utils.partitions import manifest_kpis, manifest_summary
 from src.components.filters import display_sidebar_filters
-from src.utils.export import export_to_csv, export_to_excel, create_summary_report
+from src.utils.export import export_to_csv, export_to_excel, prepare_export_data, create_summary_report
 
 # ページ設定
 st.set_page_config(
@@ -35,9 +39,8 @@ st.title("💾 データ管理")
 st.markdown("### データの表示、フィルタリング、エクスポート")
 
 # データ読み込み
-@st.cache_data(ttl=300)
 def get_data():
-    df = load_data()
+    df = load_data_source(DATA_PATH)
     return df
 
 try:
@@ -47,7 +50,7 @@ try:
     filters = display_sidebar_filters(df)
     
     # データフィルタリング
-    filtered_df = filter_data(df, filters)
+    filtered_df = filter_view(df, filters)
     
     # データ情報
     st.header("📊 データ概要")
@@ -69,6 +72,32 @@ try:
     
     st.divider()
     
+    # パーティション情報（年月ごとのパーティションディレクトリの場合）
+    if os.path.isdir(DATA_PATH):
+        st.header("🗂️ パーティション")
+        
+        # 期間に完全に含まれるパーティションはマニフェストの集計値を使い、境界のパーティションだけを読み込む
+        period_kpis = manifest_kpis(DATA_PATH, filters['date_range'])
+        
+        col1, col2, col3, col4 = st.columns(4)
+        
+        with col1:
+            st.metric("期間の総売上", f"¥{period_kpis['総売上']:,.0f}")
+        
+        with col2:
+            st.metric("期間の取引件数", f"{period_kpis['総取引件数']:,}")
+        
+        with col3:
+            st.metric("平均購入金額", f"¥{period_kpis['平均購入金額']:,.0f}")
+        
+        with col4:
+            st.metric("平均年齢", f"{period_kpis['平均年齢']:.1f}歳")
+        
+        st.caption("選択期間のKPIをパーティションのマニフェストから計算（地域などの他の条件は含まない）")
+        st.dataframe(manifest_summary(DATA_PATH), use_container_width=True, hide_index=True)
+        
+        st.divider()
+    
     # データプレビュー
     st.header("👀 データプレビュー")
     
@@ -105,9 +134,9 @@ try:
     else:
         display_df = sorted_df.head(show_rows)
     
-    # データ表示
+    # データ表示（表示する行だけをDataFrameにする）
     st.dataframe(
-        display_df,
+        as_frame(display_df),
         use_container_width=True,
         height=400
     )
@@ -117,7 +146,7 @@ try:
     # データ統計
     st.header("📈 データ統計")
     
-    tab1, tab2, tab3 = st.tabs(["基本統計", "カテゴリー統計", "欠損値"])
+    tab1, tab2, tab3, tab4 = st.tabs(["基本統計", "カテゴリー統計", "欠損値", "メモリ使用量"])
     
     with tab1:
         st.subheader("数値列の基本統計")
@@ -150,7 +179,7 @@ try:
     with tab3:
         st.subheader("欠損値の確認")
         
-        missing_data = filtered_df.isnull().sum()
+        missing_data = count_missing(filtered_df)
         missing_percent = (missing_data / len(filtered_df) * 100).round(2)
         
         missing_df = pd.DataFrame({
@@ -166,6 +195,27 @@ try:
         else:
             st.success("✅ 欠損値はありません")
     
+    with tab4:
+        st.subheader("型定義によるメモリ使用量の比較")
+        
+        memory_report = memory_usage_report(df)
+        
+        if not memory_report.empty:
+            total_row = memory_report.iloc[-1]
+            
+            col1, col2, col3 = st.columns(3)
+            
+            with col1:
+                st.metric("変換前", f"{total_row['変換前(バイト)'] / 1024 ** 2:,.2f} MB")
+            
+            with col2:
+                st.metric("変換後", f"{total_row['変換後(バイト)'] / 1024 ** 2:,.2f} MB")
+            
+            with col3:
+                st.metric("削減率", f"{total_row['削減率(%)']:.1f}%")
+            
+            st.dataframe(memory_report, use_container_width=True, hide_index=True)
+    
     st.divider()
     
     # データエクスポート
@@ -191,7 +241,7 @@ try:
     with col2:
         st.subheader("Excel エクスポート")
         
-        excel_data = export_to_excel(filtered_df)
+        excel_data = export_to_excel(prepare_export_data(filtered_df))
         
         st.download_button(
             label="📥 Excelダウンロード",
@@ -11,6 +11,8 @@ from pathlib import Path
 project_root = Path(__file__).parent.parent.parent
 sys.path.insert(0, str(project_root))
 
+from src.utils.filter_cache import get_filter_cache
+
 # ページ設定
 st.set_page_config(
     page_title="設定 | 購買データ分析ダッシュボード",
@@ -130,8 +132,16 @@ with col2:
         step=60
     )
     
+    filter_cache_stats = get_filter_cache().stats()
+    st.caption(
+        f"フィルター結果キャッシュ: ヒット {filter_cache_stats['ヒット']:,}件 / "
+        f"ミス {filter_cache_stats['ミス']:,}件（ヒット率 {filter_cache_stats['ヒット率(%)']:.1f}%）、"
+        f"{filter_cache_stats['エントリ数']:,}件・{filter_cache_stats['使用量(バイト)'] / 1024 ** 2:,.1f} MB"
+    )
+    
     if st.button("🗑️ キャッシュをクリア", use_container_width=True):
         st.cache_data.clear()
+        st.cache_resource.clear()
         st.success("✅ キャッシュをクリアしました")
 
 st.divider()
@@ -5,6 +5,8 @@ import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
 from src.config import RFM_THRESHOLDS, CUSTOMER_SEGMENTS
+from src.utils.data_processor import group_aggregate, group_summary
+from src.utils.filtered_view import as_frame
 
 
 def calculate_rfm(df: pd.DataFrame, reference_date: datetime = None) -> pd.DataFrame:
@@ -21,6 +23,8 @@ def calculate_rfm(df: pd.DataFrame, reference_date: datetime = None) -> pd.DataF
     if df.empty:
         return pd.DataFrame()
     
+    df = as_frame(df, ['顧客ID', '購入日', '購入金額'])
+    
     # 基準日の設定
     if reference_date is None:
         reference_date = df['購入日'].max()
@@ -89,7 +93,7 @@ def calculate_customer_lifetime_value(df: pd.DataFrame) -> pd.DataFrame:
     if df.empty:
         return pd.DataFrame()
     
-    clv = df.groupby('顧客ID').agg({
+    clv = as_frame(df, ['顧客ID', '購入金額', '購入日']).groupby('顧客ID').agg({
         '購入金額': ['sum', 'mean', 'count'],
         '購入日': ['min', 'max']
     }).reset_index()
@@ -122,8 +126,8 @@ def calculate_cohort_analysis(df: pd.DataFrame) -> pd.DataFrame:
         return pd.DataFrame()
     
     # 顧客の初回購入月を取得
-    df_copy = df.copy()
-    df_copy['購入月'] = df_copy['購入日'].dt.to_period('M')
+    df_copy = as_frame(df, ['顧客ID', '購入日'])
+    df_copy = df_copy.assign(購入月=df_copy['購入日'].dt.to_period('M'))
     
     cohort = df_copy.groupby('顧客ID')['購入日'].min().reset_index()
     cohort.columns = ['顧客ID', '初回購入日']
@@ -163,7 +167,7 @@ def calculate_correlation_matrix(df: pd.DataFrame) -> pd.DataFrame:
     numeric_columns = ['年齢', '購入金額']
     
     if all(col in df.columns for col in numeric_columns):
-        correlation = df[numeric_columns].corr()
+        correlation = as_frame(df, numeric_columns).corr()
         return correlation
     
     return pd.DataFrame()
@@ -184,27 +188,27 @@ def detect_outliers(df: pd.DataFrame, column: str, method: str = 'iqr') -> pd.Da
     if df.empty or column not in df.columns:
         return df
     
-    df_copy = df.copy()
+    values = df[column]
     
     if method == 'iqr':
         # IQR法
-        Q1 = df_copy[column].quantile(0.25)
-        Q3 = df_copy[column].quantile(0.75)
+        Q1 = values.quantile(0.25)
+        Q3 = values.quantile(0.75)
         IQR = Q3 - Q1
         lower_bound = Q1 - 1.5 * IQR
         upper_bound = Q3 + 1.5 * IQR
         
-        df_copy['異常値'] = (df_copy[column] < lower_bound) | (df_copy[column] > upper_bound)
+        return df.assign(異常値=(values < lower_bound) | (values > upper_bound))
         
     elif method == 'zscore':
         # Zスコア法
-        mean = df_copy[column].mean()
-        std = df_copy[column].std()
-        z_scores = np.abs((df_copy[column] - mean) / std)
+        mean = values.mean()
+        std = values.std()
+        z_scores = np.abs((values - mean) / std)
         
-        df_copy['異常値'] = z_scores > 3
+        return df.assign(異常値=z_scores > 3)
     
-    return df_copy
+    return df
 
 
 def calculate_trend(df: pd.DataFrame, date_column: str, value_column: str, periods: int = 30) -> dict:
@@ -223,11 +227,8 @@ def calculate_trend(df: pd.DataFrame, date_column: str, value_column: str, perio
     if df.empty:
         return {}
     
-    df_copy = df.copy()
-    df_copy = df_copy.sort_values(date_column)
-    
-    # 日次集計
-    daily_data = df_copy.groupby(date_column)[value_column].sum().reset_index()
+    # 日次集計（日付順に並ぶ）
+    daily_data = df[value_column].groupby(df[date_column]).sum().reset_index()
     
     # 移動平均（7日、30日）
     daily_data['MA_7'] = daily_data[value_column].rolling(window=7, min_periods=1).mean()
@@ -271,7 +272,7 @@ def calculate_seasonality(df: pd.DataFrame) -> pd.DataFrame:
     if df.empty:
         return pd.DataFrame()
     
-    df_copy = df.copy()
+    df_copy = as_frame(df, ['月', '購入金額', '顧客ID'])
     
     # 月別集計
     monthly_stats = df_copy.groupby('月').agg({
@@ -301,8 +302,7 @@ def calculate_purchase_interval(df: pd.DataFrame) -> pd.DataFrame:
     if df.empty:
         return pd.DataFrame()
     
-    df_copy = df.copy()
-    df_copy = df_copy.sort_values(['顧客ID', '購入日'])
+    df_copy = as_frame(df, ['顧客ID', '購入日']).sort_values(['顧客ID', '購入日'])
     
     # 顧客ごとの購入間隔を計算
     df_copy['前回購入日'] = df_copy.groupby('顧客ID')['購入日'].shift(1)
@@ -335,15 +335,14 @@ def generate_insights(df: pd.DataFrame, rfm_df: pd.DataFrame = None) -> dict:
     insights = {}
     
     # 最も売上が高いカテゴリー
-    category_sales = df.groupby('購入カテゴリー')['購入金額'].sum()
+    category_sales = group_aggregate(df, '購入カテゴリー', '購入金額').set_index('購入カテゴリー')['購入金額']
     insights['top_category'] = category_sales.idxmax()
     insights['top_category_sales'] = category_sales.max()
     
     # 最も購入金額が高い年齢層
-    df_with_age = df.copy()
-    df_with_age['年齢層'] = pd.cut(df_with_age['年齢'], bins=[0, 20, 30, 40, 50, 60, 100],
-                                     labels=['10代', '20代', '30代', '40代', '50代', '60代以上'])
-    age_sales = df_with_age.groupby('年齢層')['購入金額'].sum()
+    age_group = pd.cut(df['年齢'], bins=[0, 20, 30, 40, 50, 60, 100],
+                       labels=['10代', '20代', '30代', '40代', '50代', '60代以上'])
+    age_sales = df['購入金額'].groupby(age_group, observed=True).sum()
     insights['top_age_group'] = age_sales.idxmax()
     insights['top_age_group_sales'] = age_sales.max()
     
@@ -353,12 +352,12 @@ def generate_insights(df: pd.DataFrame, rfm_df: pd.DataFrame = None) -> dict:
     insights['top_payment_count'] = payment_counts.max()
     
     # 売上が最も高い月
-    monthly_sales = df.groupby('年月')['購入金額'].sum()
+    monthly_sales = group_aggregate(df, '年月', '購入金額').set_index('年月')['購入金額']
     insights['top_month'] = monthly_sales.idxmax()
     insights['top_month_sales'] = monthly_sales.max()
     
     # 地域別の特徴
-    region_stats = df.groupby('地域').agg({
+    region_stats = group_summary(df, '地域', {
         '購入金額': ['sum', 'mean'],
         '顧客ID': 'nunique'
     })
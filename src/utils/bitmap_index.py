@@ -0,0 +1,114 @@
+"""
+ビットマップインデックスモジュール - カテゴリー条件を1つの行マスクに解決する
+"""
+import numpy as np
+import pandas as pd
+from src.config import CATEGORICAL_COLUMNS
+
+
+class BitmapIndex:
+    """
+    カテゴリー列の値ごとに、該当行を1ビットで表したビットセットを保持するインデックス
+    
+    ビットセットはnp.packbitsで8行を1バイトに詰めて保持する。
+    フィルター条件は、列内の値はビットOR、列間はビットANDで合成し、
+    最後に1度だけ真偽値の行マスクへ展開する。行範囲を指定すると、
+    その範囲を含むバイトだけを合成・展開する。
+    """
+    
+    def __init__(self, df: pd.DataFrame, columns: list = CATEGORICAL_COLUMNS):
+        self.n_rows = len(df)
+        self.n_bytes = (self.n_rows + 7) // 8
+        self.bitmaps = {}
+        
+        for col in columns:
+            if col not in df.columns or not isinstance(df[col].dtype, pd.CategoricalDtype):
+                continue
+            codes = df[col].cat.codes.to_numpy()
+            self.bitmaps[col] = {
+                value: np.packbits(codes == code)
+                for code, value in enumerate(df[col].cat.categories)
+            }
+    
+    def covers(self, column: str) -> bool:
+        """カラムがインデックス化されているかを判定"""
+        return column in self.bitmaps
+    
+    def column_bits(self, column: str, values, start: int = 0, stop: int = None) -> np.ndarray:
+        """
+        列内の指定値のビットセットをORで合成
+        
+        Args:
+            column: カラム名
+            values: 選択された値
+            start: 対象とする開始行
+            stop: 対象とする終了行（含まない。Noneの場合は末尾まで）
+            
+        Returns:
+            開始行を含むバイトから終了行を含むバイトまでの合成したビットセット
+            （値がすべて選択されている場合はNone）
+        """
+        bitmaps = self.bitmaps[column]
+        selected = [bitmaps[value] for value in set(values) if value in bitmaps]
+        
+        # 全ての値が選択されている条件は絞り込みにならない
+        if len(selected) == len(bitmaps):
+            return None
+        
+        first, last = self._byte_range(start, stop)
+        bits = np.zeros(last - first, dtype=np.uint8)
+        for bitmap in selected:
+            np.bitwise_or(bits, bitmap[first:last], out=bits)
+        return bits
+    
+    def resolve(self, predicates: dict, start: int = 0, stop: int = None):
+        """
+        カラムごとの選択値を、列間ANDで1つのビットセットに合成
+        
+        Args:
+            predicates: {カラム名: 選択された値のリスト}の辞書
+            start: 対象とする開始行
+            stop: 対象とする終了行（含まない。Noneの場合は末尾まで）
+            
+        Returns:
+            合成したビットセット（絞り込みがない場合はNone）
+        """
+        result = None
+        for column, values in predicates.items():
+            bits = self.column_bits(column, values, start, stop)
+            if bits is None:
+                continue
+            if result is None:
+                result = bits
+            else:
+                np.bitwise_and(result, bits, out=result)
+        return result
+    
+    def to_mask(self, bits: np.ndarray, start: int = 0, stop: int = None) -> np.ndarray:
+        """resolveで合成したビットセットを、開始行から終了行までの真偽値マスクに展開"""
+        return unpack_bits(bits, start, self.n_rows if stop is None else stop)
+    
+    def _byte_range(self, start: int, stop: int = None) -> tuple:
+        """行範囲を含むビットセットのバイト範囲を取得"""
+        return byte_range(start, self.n_rows if stop is None else stop)
+
+
+def byte_range(start: int, stop: int) -> tuple:
+    """行範囲[start, stop)を含むビットセットのバイト範囲を取得"""
+    return start // 8, (stop + 7) // 8
+
+
+def unpack_bits(bits: np.ndarray, start: int, stop: int) -> np.ndarray:
+    """
+    行範囲[start, stop)を含むバイト範囲のビットセットを、その行範囲の真偽値マスクに展開
+    
+    Args:
+        bits: byte_range(start, stop)のバイト範囲のビットセット
+        start: 開始行
+        stop: 終了行（含まない）
+        
+    Returns:
+        長さstop - startの真偽値マスク
+    """
+    offset = start - byte_range(start, stop)[0] * 8
+    return np.unpackbits(bits, count=offset + stop - start)[offset:].view(bool)
@@ -0,0 +1,163 @@
+"""
+カレンダーディメンションモジュール - 日付単位の属性を一度だけ計算して共有
+"""
+from functools import lru_cache
+import numpy as np
+import pandas as pd
+from src.config import WEEKDAY_NAMES, WEEKDAY_NAMES_JA
+
+# 日付IDの基準日（日付IDはこの日からの経過日数）
+EPOCH = np.datetime64('1970-01-01', 'D')
+
+# 固定日の祝日（月, 日）
+FIXED_HOLIDAYS = [
+    (1, 1),    # 元日
+    (2, 11),   # 建国記念の日
+    (2, 23),   # 天皇誕生日
+    (4, 29),   # 昭和の日
+    (5, 3),    # 憲法記念日
+    (5, 4),    # みどりの日
+    (5, 5),    # こどもの日
+    (8, 11),   # 山の日
+    (11, 3),   # 文化の日
+    (11, 23),  # 勤労感謝の日
+]
+
+# ハッピーマンデーの祝日（月, 第n月曜日）
+HAPPY_MONDAYS = [
+    (1, 2),    # 成人の日
+    (7, 3),    # 海の日
+    (9, 3),    # 敬老の日
+    (10, 2),   # スポーツの日
+]
+
+# 日区分のカテゴリー（祝日は曜日より優先）
+DAY_TYPES = ['平日', '土日', '祝日']
+
+
+def to_day_id(dates: pd.Series) -> np.ndarray:
+    """
+    日付を日付ID（1970-01-01からの経過日数）に変換
+    
+    Args:
+        dates: datetime型のSeries
+        
+    Returns:
+        日付IDの配列（int32）
+    """
+    return (dates.to_numpy().astype('datetime64[D]') - EPOCH).astype(np.int32)
+
+
+@lru_cache(maxsize=32)
+def build_calendar(first_day_id: int, last_day_id: int) -> pd.DataFrame:
+    """
+    指定範囲の日付ごとに属性を計算したカレンダーを作成
+    
+    1行が1日に対応し、行位置は first_day_id からの経過日数になる。
+    結果はキャッシュして共有するため、呼び出し側で変更しないこと。
+    
+    Args:
+        first_day_id: 開始日の日付ID
+        last_day_id: 終了日の日付ID
+        
+    Returns:
+        カレンダーのDataFrame
+    """
+    day_ids = np.arange(first_day_id, last_day_id + 1, dtype=np.int32)
+    dates = pd.DatetimeIndex(EPOCH + day_ids.astype('timedelta64[D]'))
+    
+    dayofweek = dates.dayofweek.to_numpy()
+    holidays = _japanese_holidays(range(dates.year.min(), dates.year.max() + 1))
+    is_holiday = dates.isin(holidays)
+    day_types = np.where(is_holiday, 2, np.where(dayofweek >= 5, 1, 0))
+    
+    calendar = pd.DataFrame({
+        '日付ID': day_ids,
+        '日付': dates,
+        '年月': pd.Categorical(dates.strftime('%Y-%m')),
+        '年': dates.year.astype('int16'),
+        '月': dates.month.astype('int8'),
+        '四半期': dates.quarter.astype('int8'),
+        '曜日': pd.Categorical.from_codes(dayofweek, categories=WEEKDAY_NAMES, ordered=True),
+        '曜日_日本語': pd.Categorical.from_codes(dayofweek, categories=WEEKDAY_NAMES_JA, ordered=True),
+        '週番号': dates.isocalendar().week.to_numpy().astype('int8'),
+        '祝日': is_holiday,
+        '休日': is_holiday | (dayofweek >= 5),
+        '日区分': pd.Categorical.from_codes(day_types, categories=DAY_TYPES, ordered=True),
+    })
+    
+    return calendar
+
+
+def gather_calendar(day_ids: np.ndarray, columns: list) -> dict:
+    """
+    日付IDからカレンダー属性を行ごとに引き当てる
+    
+    属性は日付ごとに一度だけ計算されており、行ごとの処理は配列の
+    位置参照だけになる。カテゴリー型の属性はコードだけを参照する。
+    
+    Args:
+        day_ids: 日付IDの配列
+        columns: 取得するカレンダー属性のリスト
+        
+    Returns:
+        {属性名: 値}の辞書（値はSeriesにそのまま渡せる配列）
+    """
+    if len(day_ids) == 0:
+        calendar = build_calendar(0, 0)
+        positions = np.empty(0, dtype=np.intp)
+    else:
+        first_day_id = int(day_ids.min())
+        calendar = build_calendar(first_day_id, int(day_ids.max()))
+        positions = day_ids - first_day_id
+    
+    result = {}
+    for col in columns:
+        values = calendar[col]
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            result[col] = pd.Categorical.from_codes(values.cat.codes.to_numpy()[positions], dtype=values.dtype)
+        else:
+            result[col] = values.to_numpy()[positions]
+    
+    return result
+
+
+def _japanese_holidays(years) -> pd.DatetimeIndex:
+    """
+    日本の国民の祝日（振替休日・国民の休日を含む）を計算
+    
+    Args:
+        years: 対象年のイテラブル
+        
+    Returns:
+        祝日のDatetimeIndex
+    """
+    holidays = set()
+    for year in years:
+        for month, day in FIXED_HOLIDAYS:
+            holidays.add(pd.Timestamp(year, month, day))
+        
+        for month, nth in HAPPY_MONDAYS:
+            first = pd.Timestamp(year, month, 1)
+            holidays.add(first + pd.Timedelta(days=(7 - first.dayofweek) % 7 + 7 * (nth - 1)))
+        
+        # 春分の日・秋分の日（1980〜2099年の近似式）
+        leap_adjust = (year - 1980) // 4
+        holidays.add(pd.Timestamp(year, 3, int(20.8431 + 0.242194 * (year - 1980)) - leap_adjust))
+        holidays.add(pd.Timestamp(year, 9, int(23.2488 + 0.242194 * (year - 1980)) - leap_adjust))
+    
+    # 振替休日: 日曜の祝日の後の最初の平日
+    for holiday in sorted(holidays):
+        if holiday.dayofweek == 6:
+            substitute = holiday + pd.Timedelta(days=1)
+            while substitute in holidays:
+                substitute += pd.Timedelta(days=1)
+            holidays.add(substitute)
+    
+    # 国民の休日: 祝日に挟まれた平日
+    for holiday in sorted(holidays):
+        between = holiday + pd.Timedelta(days=1)
+        if between not in holidays and between + pd.Timedelta(days=1) in holidays and between.dayofweek != 6:
+            holidays.add(between)
+    
+    return pd.DatetimeIndex(sorted(holidays))
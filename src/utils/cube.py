@@ -0,0 +1,340 @@
+"""
+売上キューブモジュール - 日付×属性の組み合わせごとに購入金額を事前集計する
+"""
+import numpy as np
+import pandas as pd
+from src.config import AGE_BINS, AGE_LABELS, CATEGORY_FILTER_COLUMNS
+from src.utils.calendar_dim import EPOCH, gather_calendar
+from src.utils.dataset_store import derived
+from src.utils.schema import DERIVED_DATE_COLUMNS
+
+# 集計する値のカラム
+MEASURE_COLUMN = '購入金額'
+
+# 年齢層のカラム（add_age_groupで追加される区分と同じ）
+AGE_GROUP_COLUMN = '年齢層'
+
+# キューブが依存するカラム
+CUBE_COLUMNS = ['購入日', '日付ID', '年齢', MEASURE_COLUMN] + list(CATEGORY_FILTER_COLUMNS.values()) + DERIVED_DATE_COLUMNS
+
+# 日付から決まるグループ化カラム
+DATE_KEYS = ['購入日', '日付ID'] + DERIVED_DATE_COLUMNS
+
+# キューブで計算できる集計関数
+CUBE_AGGS = ('sum', 'mean', 'count', 'size', 'std', 'var')
+
+# 密な配列で数え上げる組み合わせ数の上限（超える場合は組み合わせを並べ替えて集約する）
+MAX_DENSE_CELLS = 1 << 22
+
+
+class SalesCube:
+    """
+    日付×地域×性別×カテゴリー×支払方法×年齢層の組み合わせ（セル）ごとの事前集計
+    
+    各セルに件数・購入金額の合計・二乗和・年齢の合計を保持する。値のあるセルだけを
+    日付順に並べて持つため、サイズは行数ではなく各次元の値の数（と期間の日数）で
+    上限が決まる。期間・カテゴリー条件と、年齢層の境界に揃った年齢条件で絞った
+    結果の、これらの次元と日付属性によるグループ別集計は、行を参照せずにセルの
+    集約だけで求められる。
+    """
+    
+    def __init__(self, df: pd.DataFrame):
+        self.dimensions = list(CATEGORY_FILTER_COLUMNS.values()) + [AGE_GROUP_COLUMN]
+        self.dtypes = {}
+        for column in CATEGORY_FILTER_COLUMNS.values():
+            self.dtypes[column] = df[column].dtype if isinstance(df[column].dtype, pd.CategoricalDtype) else pd.CategoricalDtype(sorted(df[column].dropna().unique()))
+        self.dtypes[AGE_GROUP_COLUMN] = pd.CategoricalDtype(AGE_LABELS, ordered=True)
+        # 欠損値は各次元の最後のコードで表す
+        self.radices = [len(dtype.categories) + 1 for dtype in self.dtypes.values()]
+        
+        day_ids = df['日付ID'].to_numpy()
+        self.first_day = int(day_ids.min()) if len(day_ids) > 0 else 0
+        span = int(day_ids.max()) - self.first_day + 1 if len(day_ids) > 0 else 1
+        cell = self._row_cells(df)
+        ages = df['年齢'].to_numpy()
+        
+        amounts = df[MEASURE_COLUMN].to_numpy().astype(np.float64)
+        n_cells = span * int(np.prod(self.radices))
+        if n_cells <= MAX_DENSE_CELLS:
+            counts = np.bincount(cell, minlength=n_cells)
+            keys = np.flatnonzero(counts)
+            self.count = counts[keys]
+            measure = lambda weights: np.bincount(cell, weights=weights, minlength=n_cells)[keys]
+        else:
+            keys, inverse = np.unique(cell, return_inverse=True)
+            self.count = np.bincount(inverse, minlength=len(keys))
+            measure = lambda weights: np.bincount(inverse, weights=weights, minlength=len(keys))
+        self.sum = measure(amounts)
+        self.sumsq = measure(amounts * amounts)
+        self.age_sum = measure(ages.astype(np.float64))
+        
+        # セル番号を各次元のコードに戻す
+        self.keys = keys
+        self.codes = {}
+        for column, radix in reversed(list(zip(self.dimensions, self.radices))):
+            self.codes[column] = (keys % radix).astype(np.int16)
+            keys = keys // radix
+        self.day = (keys + self.first_day).astype(np.int32)
+        
+        self.n_rows = len(df)
+        self.measure_dtype = df[MEASURE_COLUMN].dtype
+        self.integer_sum = pd.api.types.is_integer_dtype(self.measure_dtype)
+        self.ages = np.unique(ages)
+        self.key_dtypes = {column: df[column].dtype for column in DATE_KEYS}
+        # 購入日が時刻を含まない場合だけ、購入日を日付IDで集約できる
+        dates = df['購入日'].to_numpy()
+        self.daily = bool((dates.astype('datetime64[D]') == dates).all())
+        self.non_null = {column for column in df.columns if not df[column].hasnans}
+    
+    def __len__(self) -> int:
+        return len(self.count)
+    
+    def cell_positions(self, df: pd.DataFrame) -> np.ndarray:
+        """
+        各行が属するセルの位置を取得
+        
+        Args:
+            df: キューブを作成したDataFrame
+            
+        Returns:
+            行ごとのセル位置の配列
+        """
+        return np.searchsorted(self.keys, self._row_cells(df))
+    
+    def select(self, filters: dict):
+        """
+        正規化したフィルター条件（canonical_filtersの値）に一致するセルを取得
+        
+        Args:
+            filters: フィルター条件の辞書
+            
+        Returns:
+            セル位置のsliceまたは配列（年齢条件が年齢層の境界に揃わず、
+            セル単位で判定できない場合はNone）
+        """
+        start, stop = 0, len(self)
+        if filters.get('date_range'):
+            first, last = (_day_id(value) for value in filters['date_range'])
+            start = int(np.searchsorted(self.day, first, 'left'))
+            stop = int(np.searchsorted(self.day, last, 'right'))
+        
+        passes = []
+        for key, column in CATEGORY_FILTER_COLUMNS.items():
+            if filters.get(key):
+                selection = self.dtypes[column].categories.astype(str).isin([str(value) for value in filters[key]])
+                passes.append(np.append(selection, False)[self.codes[column][start:stop]])
+        
+        if filters.get('age_range'):
+            selection = self._age_selection(*filters['age_range'])
+            if selection is None:
+                return None
+            passes.append(selection[self.codes[AGE_GROUP_COLUMN][start:stop]])
+        
+        if not passes:
+            return slice(start, stop)
+        return start + np.flatnonzero(np.logical_and.reduce(passes))
+    
+    def supports(self, keys: list, value: str, agg: str) -> bool:
+        """グループ化カラム・値カラム・集計関数の組をキューブで計算できるかを判定"""
+        if agg not in CUBE_AGGS:
+            return False
+        if value != MEASURE_COLUMN and not (agg in ('count', 'size') and value in self.non_null):
+            return False
+        return all(
+            key in self.dimensions or (key in DATE_KEYS and (key != '購入日' or self.daily))
+            for key in keys
+        )
+    
+    def aggregate(self, cells, keys: list, value: str, agg: str = 'sum') -> pd.DataFrame:
+        """
+        セルをグループ化カラムの値ごとに集約
+        
+        結果は、選択行をgroupby(keys, observed=True)[value].agg(agg)した
+        結果をreset_indexしたものと同じ形式になる。
+        
+        Args:
+            cells: selectで取得したセル位置
+            keys: グループ化するカラムのリスト
+            value: 集計するカラム
+            agg: 集計関数名（sum, mean, count, size, std, var）
+            
+        Returns:
+            グループ化カラムと集計値のDataFrame
+        """
+        valid, inverse, result, n_groups = self._groups(cells, keys)
+        
+        def total(measure):
+            return np.bincount(inverse, weights=measure[cells][valid], minlength=n_groups)
+        
+        count = total(self.count).astype(np.int64)
+        if agg in ('count', 'size'):
+            result[value] = count
+        elif agg == 'sum':
+            amount = total(self.sum)
+            result[value] = _integer_sum(amount, self.measure_dtype) if self.integer_sum else amount
+        elif agg == 'mean':
+            result[value] = total(self.sum) / count
+        else:
+            amount = total(self.sum)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                variance = (total(self.sumsq) - amount * amount / count) / (count - 1)
+            variance = np.where(count > 1, np.maximum(variance, 0.0), np.nan)
+            result[value] = np.sqrt(variance) if agg == 'std' else variance
+        
+        return pd.DataFrame(result)
+    
+    def distinct(self, cells, keys: list, sketches) -> pd.DataFrame:
+        """
+        セルの顧客のHyperLogLogスケッチをグループ化カラムの値ごとに統合し、ユニーク顧客数を推定
+        
+        Args:
+            cells: selectで取得したセル位置
+            keys: グループ化するカラムのリスト
+            sketches: このキューブのセルごとのスケッチ（CellSketches）
+            
+        Returns:
+            グループ化カラムと推定顧客数のDataFrame（aggregateと同じ形式）
+        """
+        valid, inverse, result, n_groups = self._groups(cells, keys)
+        group = np.full(len(valid), -1, dtype=np.int64)
+        group[valid] = inverse
+        result[sketches.column] = sketches.estimate(cells, group, n_groups)
+        return pd.DataFrame(result)
+    
+    def totals(self, cells) -> dict:
+        """
+        セルの件数・購入金額の合計と二乗和・年齢の合計を取得
+        
+        Args:
+            cells: selectで取得したセル位置
+            
+        Returns:
+            {'件数', '合計', '二乗和', '年齢合計'}の辞書
+        """
+        amount = self.sum[cells].sum()
+        return {
+            '件数': int(self.count[cells].sum()),
+            '合計': int(round(amount)) if self.integer_sum else float(amount),
+            '二乗和': float(self.sumsq[cells].sum()),
+            '年齢合計': float(self.age_sum[cells].sum()),
+        }
+    
+    def _row_cells(self, df: pd.DataFrame) -> np.ndarray:
+        """行ごとのセル番号（日付と各次元のコードの混合基数表現）"""
+        cell = (df['日付ID'].to_numpy() - self.first_day).astype(np.int64)
+        for column, radix in zip(self.dimensions, self.radices):
+            if column == AGE_GROUP_COLUMN:
+                codes = _age_bucket(df['年齢'].to_numpy())
+            elif df[column].dtype == self.dtypes[column]:
+                codes = df[column].array.codes
+            else:
+                codes = pd.Categorical(df[column], dtype=self.dtypes[column]).codes
+            cell *= radix
+            cell += np.where(codes < 0, radix - 1, codes)
+        return cell
+    
+    def _groups(self, cells, keys: list) -> tuple:
+        """
+        セルをグループ化カラムの値でグループに分ける
+        
+        Returns:
+            (グループに含めるセルの真偽値, 含めるセルごとのグループ番号,
+            {グループ化カラム: グループごとの値}, グループ数)
+        """
+        key_codes, labels = [], []
+        for key in keys:
+            codes, key_labels = self._key_codes(key, cells)
+            key_codes.append(codes)
+            labels.append(key_labels)
+        
+        # いずれかのキーが欠損値のセルはグループに含めない
+        valid = np.ones(len(self.day[cells]), dtype=bool)
+        for codes, key_labels in zip(key_codes, labels):
+            valid &= codes < len(key_labels)
+        group = np.zeros(int(valid.sum()), dtype=np.int64)
+        for codes, key_labels in zip(key_codes, labels):
+            group *= len(key_labels)
+            group += codes[valid]
+        groups, inverse = np.unique(group, return_inverse=True)
+        n_groups = len(groups)
+        
+        result = {}
+        for key, key_labels in reversed(list(zip(keys, labels))):
+            result[key] = key_labels[groups % len(key_labels)]
+            groups = groups // len(key_labels)
+        result = {key: result[key] for key in keys}
+        return valid, inverse, result, n_groups
+    
+    def _key_codes(self, key: str, cells) -> tuple:
+        """セルごとのグループ化カラムのコードと、コードに対応する値（欠損値はlen(値)）"""
+        if key in self.dimensions:
+            dtype = self.dtypes[key]
+            return self.codes[key][cells], pd.Categorical.from_codes(np.arange(len(dtype.categories)), dtype=dtype)
+        
+        # 日付属性は日付ごとに1度だけ引き当てる
+        days, day_codes = np.unique(self.day[cells], return_inverse=True)
+        dtype = self.key_dtypes[key]
+        if key == '購入日':
+            values = (EPOCH + days.astype('timedelta64[D]')).astype(dtype)
+        elif key == '日付ID':
+            values = days.astype(dtype)
+        else:
+            values = gather_calendar(days, [key])[key]
+        
+        if isinstance(dtype, pd.CategoricalDtype):
+            # カレンダーのカテゴリーはカレンダーの期間ごとに異なるため、値で引き当てる
+            codes = pd.Categorical(np.asarray(values), dtype=dtype).codes.astype(np.int64)
+            codes[codes < 0] = len(dtype.categories)
+            return codes[day_codes], pd.Categorical.from_codes(np.arange(len(dtype.categories)), dtype=dtype)
+        
+        unique, codes = np.unique(np.asarray(values), return_inverse=True)
+        return codes[day_codes], unique.astype(dtype)
+    
+    def _age_selection(self, min_age: int, max_age: int):
+        """年齢範囲を年齢層ごとの真偽値に変換（年齢層の途中で区切られる場合はNone）"""
+        buckets = _age_bucket(self.ages)
+        inside = (self.ages >= min_age) & (self.ages <= max_age)
+        selection = np.zeros(len(AGE_LABELS) + 1, dtype=bool)
+        for bucket in np.unique(buckets):
+            matched = inside[buckets == bucket]
+            if matched.any() and not matched.all():
+                return None
+            selection[bucket] = matched.all()
+        return selection
+
+
+def sales_cube(df: pd.DataFrame):
+    """
+    共有データセットの売上キューブを取得（データセットのバージョンごとに1度だけ作成）
+    
+    Args:
+        df: load_shared_dataで取得したDataFrame
+        
+    Returns:
+        SalesCube（共有データセットのフレームでない場合はNone）
+    """
+    if df.empty or not all(column in df.columns for column in CUBE_COLUMNS):
+        return None
+    return derived(df, 'sales_cube', SalesCube, columns=CUBE_COLUMNS)
+
+
+def _age_bucket(ages: np.ndarray) -> np.ndarray:
+    """年齢を年齢層のコードに変換（pd.cut(include_lowest=True)と同じ区分。範囲外はlen(AGE_LABELS)）"""
+    bucket = np.searchsorted(AGE_BINS, ages, 'left') - 1
+    bucket[ages == AGE_BINS[0]] = 0
+    bucket[(bucket < 0) | (bucket >= len(AGE_LABELS))] = len(AGE_LABELS)
+    return bucket.astype(np.int16)
+
+
+def _integer_sum(amount: np.ndarray, dtype) -> np.ndarray:
+    """整数カラムの合計を、groupbyと同じく元の型に収まればその型、収まらなければint64で返す"""
+    amount = np.rint(amount).astype(np.int64)
+    info = np.iinfo(dtype)
+    if len(amount) == 0 or (amount.min() >= info.min and amount.max() <= info.max):
+        return amount.astype(dtype)
+    return amount
+
+
+def _day_id(value) -> int:
+    """日付を日付IDに変換"""
+    return int((np.datetime64(pd.Timestamp(value).date(), 'D') - EPOCH).astype(np.int64))
@@ -1,9 +1,22 @@
 """
 データ読み込みモジュール
 """
+import glob
+import os
+import sys
+import numpy as np
 import pandas as pd
 import streamlit as st
 from datetime import datetime
+from src.config import PARTITION_RETENTION_MONTHS, STORAGE_BACKEND
+from src.utils.snapshot import read_source, is_source_file
+from src.utils.partitions import load_partitioned, retention_range
+from src.utils.parallel import load_files_parallel
+from src.utils.sqlite_backend import SQLiteSource, get_sqlite_source
+from src.utils.dataset_store import get_shared_dataset, derived
+from src.utils.date_index import build_date_index
+from src.utils.cube import sales_cube
+from src.utils.distinct_sketch import customer_sketches
 
 
 @st.cache_data
@@ -11,38 +24,84 @@ def load_data(file_path: str) -> pd.DataFrame:
     """
     CSVファイルからデータを読み込み、前処理を行う
     
+    前処理済みのスナップショットがあればCSVのパースを省略する。
+    file_pathが年月ごとのパーティションを含むディレクトリの場合は、
+    保持期間（config.PARTITION_RETENTION_MONTHS）内のパーティションを読み込んで連結する。
+    
     Args:
-        file_path: CSVファイルのパス
+        file_path: CSVファイルまたはパーティションディレクトリのパス
         
     Returns:
         前処理済みのDataFrame
     """
     try:
-        df = pd.read_csv(file_path)
-        
-        # 日付型に変換
-        df['購入日'] = pd.to_datetime(df['購入日'])
+        if os.path.isdir(file_path):
+            return load_partitioned(file_path, retention_range(file_path, PARTITION_RETENTION_MONTHS))
         
-        # 年月カラムを追加
-        df['年月'] = df['購入日'].dt.to_period('M').astype(str)
+        return read_source(file_path)
         
-        # 年カラムを追加
-        df['年'] = df['購入日'].dt.year
-        
-        # 月カラムを追加
-        df['月'] = df['購入日'].dt.month
+    except FileNotFoundError:
+        st.error(f"❌ ファイルが見つかりません: {file_path}")
+        return pd.DataFrame()
+    except Exception as e:
+        st.error(f"❌ データ読み込みエラー: {str(e)}")
+        return pd.DataFrame()
+
+
+def load_shared_data(file_path: str) -> pd.DataFrame:
+    """
+    全セッション・全ページで共有するデータセットを取得
+    
+    st.cache_dataと異なりDataFrameを復元（コピー）せず、プロセス内の
+    1つのフレームと列データを共有する浅いコピーを返す。返されたフレームを
+    変更してもCopy-on-Writeにより共有フレームには影響しない。
+    読み込み時に売上キューブ（日付×属性ごとの事前集計）と、そのセルごとの
+    顧客スケッチも作成する。
+    
+    Args:
+        file_path: CSVファイルまたはパーティションディレクトリのパス
         
-        # 曜日カラムを追加
-        df['曜日'] = df['購入日'].dt.day_name()
-        df['曜日_日本語'] = df['購入日'].dt.dayofweek.map({
-            0: '月曜日', 1: '火曜日', 2: '水曜日', 3: '木曜日',
-            4: '金曜日', 5: '土曜日', 6: '日曜日'
-        })
+    Returns:
+        前処理済みのDataFrame
+    """
+    try:
+        df = get_shared_dataset(file_path).get()
+        # 売上キューブと顧客スケッチは読み込み時に作成しておく（データセットのバージョンごとに1度だけ）。
+        # 初回の近似集計で作ると、作成中は派生データのロックで他のセッションが待たされる
+        cube = sales_cube(df)
+        if cube is not None:
+            customer_sketches(df, cube)
+        return df
         
-        # 四半期カラムを追加
-        df['四半期'] = df['購入日'].dt.quarter
+    except FileNotFoundError:
+        st.error(f"❌ ファイルが見つかりません: {file_path}")
+        return pd.DataFrame()
+    except Exception as e:
+        st.error(f"❌ データ読み込みエラー: {str(e)}")
+        return pd.DataFrame()
+
+
+def load_data_source(file_path: str, backend: str = None):
+    """
+    設定されたストレージバックエンドでデータを読み込む
+    
+    'sqlite'の場合はCSVをインデックス付きのSQLiteデータベースに取り込み、
+    全件をメモリに展開せずにSQLiteSourceを返す。filter_dataや集計関数は
+    SQLiteSourceを受け取ると条件と集計をSQLとして実行する。
+    
+    Args:
+        file_path: CSVファイルのパス
+        backend: 'pandas'または'sqlite'（Noneの場合はconfig.STORAGE_BACKEND）
         
-        return df
+    Returns:
+        前処理済みのDataFrame、またはSQLiteSource
+    """
+    # SQLiteへの取り込みは単一のCSVファイルだけが対象
+    if (backend or STORAGE_BACKEND) != 'sqlite' or os.path.isdir(file_path):
+        return load_shared_data(file_path)
+    
+    try:
+        return get_sqlite_source(file_path)
         
     except FileNotFoundError:
         st.error(f"❌ ファイルが見つかりません: {file_path}")
@@ -52,6 +111,99 @@ def load_data(file_path: str) -> pd.DataFrame:
         return pd.DataFrame()
 
 
+def load_data_files(source: str, max_workers: int = None) -> tuple:
+    """
+    ディレクトリまたはglobパターンに一致する複数のCSVを並列に読み込む
+    
+    店舗別・日別などで分割された多数のファイルを、プロセスプールで
+    同時にパースして1つのDataFrameに連結する。
+    
+    Args:
+        source: ディレクトリのパス、またはglobパターン（例: data/*.csv, data/*.csv.gz）
+        max_workers: ワーカープロセス数（Noneの場合はCPU数）
+        
+    Returns:
+        (前処理済みのDataFrame, ファイルごとの読み込み時間のDataFrame)のタプル
+    """
+    if os.path.isdir(source):
+        file_paths = sorted(
+            path for path in glob.glob(os.path.join(source, '*.csv*'))
+            if is_source_file(path)
+        )
+    else:
+        file_paths = sorted(glob.glob(source, recursive=True))
+    
+    try:
+        return load_files_parallel(file_paths, max_workers)
+        
+    except Exception as e:
+        st.error(f"❌ データ読み込みエラー: {str(e)}")
+        return pd.DataFrame(), pd.DataFrame()
+
+
+def memory_usage_report(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    型定義の適用前後でカラムごとのメモリ使用量を比較
+    
+    適用前は、カテゴリー列を文字列オブジェクト、整数列をint64として
+    保持していた従来の読み込み結果を見積もる。列を変換したコピーは作らず、
+    カテゴリー列は値ごとの文字列オブジェクトのサイズを行数で重み付けして求める。
+    
+    Args:
+        df: load_dataで読み込んだDataFrame
+        
+    Returns:
+        カラムごとのメモリ使用量（バイト）と削減率のDataFrame
+    """
+    if df.empty:
+        return pd.DataFrame()
+    
+    before = pd.Series([_untyped_bytes(df[col]) for col in df.columns], index=df.columns)
+    after = df.memory_usage(index=False, deep=True)
+    
+    report = pd.DataFrame({
+        'カラム': df.columns,
+        '変換前の型': [_untyped_dtype(df[col]) for col in df.columns],
+        '変換後の型': [str(df[col].dtype) for col in df.columns],
+        '変換前(バイト)': before.values,
+        '変換後(バイト)': after.values,
+    })
+    
+    total = pd.DataFrame([{
+        'カラム': '合計',
+        '変換前の型': '',
+        '変換後の型': '',
+        '変換前(バイト)': before.sum(),
+        '変換後(バイト)': after.sum(),
+    }])
+    report = pd.concat([report, total], ignore_index=True)
+    report['削減率(%)'] = ((1 - report['変換後(バイト)'] / report['変換前(バイト)']) * 100).round(1)
+    
+    return report
+
+
+def _untyped_dtype(series: pd.Series) -> str:
+    """型定義の適用前のカラムの型名"""
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        return 'object'
+    if pd.api.types.is_integer_dtype(series):
+        return 'int64'
+    return str(series.dtype)
+
+
+def _untyped_bytes(series: pd.Series) -> int:
+    """型定義の適用前のカラムのバイト数（memory_usage(deep=True)と同じ数え方）"""
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        # 文字列オブジェクトの参照（8バイト）と、値ごとのオブジェクトのサイズ（末尾は欠損値のNaN）
+        categories = series.cat.categories.astype(object)
+        sizes = np.array([sys.getsizeof(value) for value in categories] + [sys.getsizeof(np.nan)], dtype=np.int64)
+        counts = np.bincount(series.array.codes % len(sizes), minlength=len(sizes))
+        return int(8 * len(series) + counts @ sizes)
+    if pd.api.types.is_integer_dtype(series):
+        return 8 * len(series)
+    return int(series.memory_usage(index=False, deep=True))
+
+
 def get_date_range(df: pd.DataFrame) -> tuple:
     """
     データの日付範囲を取得
@@ -62,9 +214,19 @@ def get_date_range(df: pd.DataFrame) -> tuple:
     Returns:
         (最小日付, 最大日付)のタプル
     """
+    if isinstance(df, SQLiteSource):
+        if df.empty:
+            return None, None
+        return tuple(pd.Timestamp(value) for value in df.value_range('購入日'))
+    
     if df.empty or '購入日' not in df.columns:
         return None, None
     
+    # 共有データセットは購入日順のため、日付インデックスの両端が最小・最大日付になる
+    date_index = derived(df, 'date_index', build_date_index, columns=['購入日'])
+    if date_index is not None:
+        return date_index.date_range()
+    
     return df['購入日'].min(), df['購入日'].max()
 
 
@@ -79,6 +241,9 @@ def get_unique_values(df: pd.DataFrame, column: str) -> list:
     Returns:
         ユニークな値のリスト
     """
+    if isinstance(df, SQLiteSource):
+        return df.unique_values(column)
+    
     if df.empty or column not in df.columns:
         return []
     
@@ -1,78 +1,253 @@
 """
 データ処理モジュール - フィルタリング、集計、変換など
 """
+import os
 import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
-from src.config import AGE_BINS, AGE_LABELS
+from src.config import AGE_BINS, AGE_LABELS, CATEGORY_FILTER_COLUMNS
+from src.utils.calendar_dim import gather_calendar, to_day_id
+from src.utils.dataset_store import derived, dataset_version
+from src.utils.date_index import build_date_index
+from src.utils.facets import facet_counts
+from src.utils.filter_cache import canonical_filters, get_filter_cache, get_predicate_cache
+from src.utils.filtered_view import FilteredView, as_frame
+from src.utils.kpi_state import KPI_COLUMNS, KPI_STATE_KEY, KPIState
+from src.utils.pivot import PIVOT_AGGS, bincount_pivot
+from src.utils.query_planner import METHOD_CANDIDATES, execute_plan, mask_key, plan_filters
+from src.utils.rollups import daily_rollup
+from src.utils.snapshot import is_streamed, load_streamed_top_customers
+from src.utils.sqlite_backend import SQLiteSource
+from src.utils.top_n import top_n_groups
+
+# filter_dataの結果が依存するカラム
+FILTERED_COLUMNS = ['購入日', '年齢'] + list(CATEGORY_FILTER_COLUMNS.values())
 
 
 def filter_data(df: pd.DataFrame, filters: dict) -> pd.DataFrame:
     """
     フィルター条件に基づいてデータをフィルタリング
     
+    共有データセットでは、正規化したフィルター条件ごとに抽出行の行番号を
+    プロセス内でキャッシュし、同じ条件の再実行や他のセッションと結果を共有する。
+    
     Args:
         df: 元のDataFrame
         filters: フィルター条件の辞書
         
     Returns:
-        フィルタリング済みのDataFrame
+        フィルタリング済みのDataFrame（SQLiteSourceの場合は条件を追加したSQLiteSource）
     """
-    filtered_df = df.copy()
+    if isinstance(df, SQLiteSource):
+        return df.filter(filters)
     
-    # 日付範囲フィルター
-    if 'date_range' in filters and filters['date_range']:
-        start_date, end_date = filters['date_range']
-        filtered_df = filtered_df[
-            (filtered_df['購入日'] >= pd.Timestamp(start_date)) &
-            (filtered_df['購入日'] <= pd.Timestamp(end_date))
-        ]
+    return df.iloc[cached_rows(df, filters)]
+
+
+def filter_view(df: pd.DataFrame, filters: dict):
+    """
+    フィルター条件に基づいて、元データと抽出行の組（FilteredView）を取得
+    
+    filter_dataと同じ行を選択するが、フィルター後のDataFrameは作らない。
+    ページの描画では列単位の参照と集計だけで済むため、こちらを使う。
+    共有データセットでは、行を参照しない集計を売上キューブで計算できるよう
+    正規化したフィルター条件を保持する。filters['approximate']が真の場合は、
+    顧客IDのユニーク数をHyperLogLogスケッチによる推定値で求める。
+    
+    Args:
+        df: 元のDataFrame
+        filters: フィルター条件の辞書
+        
+    Returns:
+        FilteredView（SQLiteSourceの場合は条件を追加したSQLiteSource）
+    """
+    if isinstance(df, SQLiteSource):
+        return df.filter(filters)
+    
+    rows = cached_rows(df, filters)
+    if dataset_version(df, columns=FILTERED_COLUMNS) is None:
+        return FilteredView(df, rows)
+    return FilteredView(
+        df, rows,
+        origin=(df, canonical_filters(df, filters)),
+        approximate=bool(filters.get('approximate'))
+    )
+
+
+def cached_rows(df: pd.DataFrame, filters: dict):
+    """
+    フィルター条件に一致する行の行番号を、フィルター結果キャッシュを通して取得
+    
+    キャッシュにない条件の組み合わせは、このセッションの条件別ビットセットを
+    使って評価し、前回の実行から選択値が変わった条件だけを評価し直す。
     
-    # 地域フィルター
-    if 'regions' in filters and filters['regions']:
-        filtered_df = filtered_df[filtered_df['地域'].isin(filters['regions'])]
+    Args:
+        df: 元のDataFrame
+        filters: フィルター条件の辞書
+        
+    Returns:
+        行番号の配列または行範囲のslice
+    """
+    version = dataset_version(df, columns=FILTERED_COLUMNS)
+    if version is None:
+        return select_rows(df, filters)
+    
+    spec = canonical_filters(df, filters)
+    cache = get_filter_cache()
+    rows = cache.get((version, spec))
+    if rows is None:
+        rows = select_rows(df, dict(spec), masks=get_predicate_cache(version))
+        cache.put((version, spec), rows)
+    
+    return rows
+
+
+def select_rows(df: pd.DataFrame, filters: dict, masks=None):
+    """
+    フィルター条件に一致する行の行番号を取得
+    
+    列の統計から実行計画を作り、全行に一致する条件を除いたうえで、
+    日付範囲を日付インデックスで行範囲に絞り、残りの条件を絞り込みの
+    強い順に、それまでに残った候補行だけで評価する。
     
-    # 性別フィルター
-    if 'genders' in filters and filters['genders']:
-        filtered_df = filtered_df[filtered_df['性別'].isin(filters['genders'])]
+    Args:
+        df: 元のDataFrame
+        filters: フィルター条件の辞書
+        masks: 条件別ビットセットキャッシュ（指定した場合は条件ごとの
+            ビットセットを再利用して合成する）
+        
+    Returns:
+        行番号の配列（日付範囲だけで決まる場合は行範囲のslice）
+    """
+    return execute_plan(df, plan_filters(df, filters), masks)
+
+
+def explain_filters(df, filters: dict):
+    """
+    フィルター条件の実行計画を取得（デバッグ表示用）
     
-    # カテゴリーフィルター
-    if 'categories' in filters and filters['categories']:
-        filtered_df = filtered_df[filtered_df['購入カテゴリー'].isin(filters['categories'])]
+    共有データセットでは、このセッションの条件別ビットセットを再利用できる
+    条件をplan.cachedに記録する。
     
-    # 支払方法フィルター
-    if 'payment_methods' in filters and filters['payment_methods']:
-        filtered_df = filtered_df[filtered_df['支払方法'].isin(filters['payment_methods'])]
+    Args:
+        df: 元のDataFrame
+        filters: フィルター条件の辞書
+        
+    Returns:
+        FilterPlan（SQLiteSourceの場合はNone）
+    """
+    if isinstance(df, SQLiteSource):
+        return None
     
-    # 年齢範囲フィルター
-    if 'age_range' in filters and filters['age_range']:
-        min_age, max_age = filters['age_range']
-        filtered_df = filtered_df[
-            (filtered_df['年齢'] >= min_age) &
-            (filtered_df['年齢'] <= max_age)
+    plan = plan_filters(df, filters)
+    version = dataset_version(df, columns=FILTERED_COLUMNS)
+    if version is not None:
+        masks = get_predicate_cache(version)
+        plan.cached = [
+            predicate.key for predicate in plan.predicates
+            if predicate.method != METHOD_CANDIDATES and masks.get(predicate.key, mask_key(plan, predicate)) is not None
         ]
+    return plan
+
+
+def get_facet_counts(df, filters: dict):
+    """
+    サイドバーの各選択肢について、他のフィルター条件の下で一致する件数を取得
+    
+    Args:
+        df: 元のDataFrame
+        filters: フィルター条件の辞書
+        
+    Returns:
+        {フィルターのキー: {選択肢: 件数}}の辞書（SQLiteSourceの場合はNone）
+    """
+    if isinstance(df, SQLiteSource):
+        return None
+    
+    version = dataset_version(df, columns=FILTERED_COLUMNS)
+    masks = get_predicate_cache(version) if version is not None else None
+    return facet_counts(df, filters, masks)
+
+
+def count_customers(df) -> int:
+    """
+    ユニーク顧客数を取得
+    
+    近似モードのFilteredViewでは、売上キューブのセルごとのHyperLogLogスケッチを
+    統合した推定値になる（相対標準誤差はdistinct_sketch.standard_error()）。
+    
+    Args:
+        df: DataFrameまたはFilteredView
+        
+    Returns:
+        ユニーク顧客数
+    """
+    if isinstance(df, FilteredView):
+        return df.count_distinct('顧客ID')
+    return df['顧客ID'].nunique()
+
+
+def slice_date_range(df: pd.DataFrame, start_date=None, end_date=None) -> pd.DataFrame:
+    """
+    日付範囲で行を抽出
     
-    return filtered_df
+    共有データセットでは日付インデックスの二分探索によるスライスになる。
+    
+    Args:
+        df: DataFrame
+        start_date: 開始日（Noneの場合は先頭から）
+        end_date: 終了日（この日を含む。Noneの場合は末尾まで）
+        
+    Returns:
+        日付範囲内のDataFrame
+    """
+    if isinstance(df, FilteredView):
+        df = df.frame
+    
+    date_index = derived(df, 'date_index', build_date_index, columns=['購入日'])
+    if date_index is not None:
+        start, stop = date_index.slice(start_date, end_date)
+        return df.iloc[start:stop]
+    
+    mask = pd.Series(True, index=df.index)
+    if start_date is not None:
+        mask &= df['購入日'] >= pd.Timestamp(start_date)
+    if end_date is not None:
+        mask &= df['購入日'] <= pd.Timestamp(end_date)
+    return df[mask]
 
 
 def add_age_group(df: pd.DataFrame) -> pd.DataFrame:
     """
     年齢層カラムを追加
     
+    元のデータは変更せず、年齢層カラムを加えたものを返す。
+    
     Args:
-        df: DataFrame
+        df: DataFrameまたはFilteredView
         
     Returns:
-        年齢層カラムが追加されたDataFrame
+        年齢層カラムが追加されたDataFrame（FilteredViewの場合はFilteredView）
     """
-    df_copy = df.copy()
-    df_copy['年齢層'] = pd.cut(
-        df_copy['年齢'],
+    return df.assign(年齢層=age_groups(df['年齢']))
+
+
+def age_groups(ages: pd.Series) -> pd.Series:
+    """
+    年齢を年齢層に区分
+    
+    Args:
+        ages: 年齢のSeries
+        
+    Returns:
+        年齢層のSeries（カテゴリー型）
+    """
+    return pd.cut(
+        ages,
         bins=AGE_BINS,
         labels=AGE_LABELS,
         include_lowest=True
     )
-    return df_copy
 
 
 def calculate_kpis(df: pd.DataFrame) -> dict:
@@ -85,6 +260,9 @@ def calculate_kpis(df: pd.DataFrame) -> dict:
     Returns:
         KPI値の辞書
     """
+    if isinstance(df, SQLiteSource):
+        return df.kpis()
+    
     if df.empty:
         return {
             '総売上': 0,
@@ -95,17 +273,37 @@ def calculate_kpis(df: pd.DataFrame) -> dict:
             'リピート率': 0,
         }
     
-    # 顧客ごとの購入回数を計算
-    customer_purchases = df.groupby('顧客ID').size()
+    # 共有データセット全体のKPIは、追記のたびに更新されるKPIの状態から返す
+    source = df.origin[0] if isinstance(df, FilteredView) and df.origin is not None else df
+    if len(df) == len(source):
+        state = derived(source, KPI_STATE_KEY, KPIState.from_frame, columns=KPI_COLUMNS)
+        if state is not None:
+            return state.to_kpis()
+    
+    # 顧客ごとの購入回数を計算（顧客の重複排除は行を参照する必要がある）
+    customer_purchases = df['顧客ID'].value_counts(sort=False)
     repeat_customers = (customer_purchases > 1).sum()
+    total_customers = len(customer_purchases)
+    
+    # 売上・件数・平均は売上キューブで計算できれば行を参照しない
+    totals = df.totals() if isinstance(df, FilteredView) else None
+    if totals is not None:
+        total_sales = totals['合計']
+        mean_amount = totals['合計'] / totals['件数']
+        mean_age = totals['年齢合計'] / totals['件数']
+    else:
+        amounts = df['購入金額']
+        total_sales = amounts.sum()
+        mean_amount = amounts.mean()
+        mean_age = df['年齢'].mean()
     
     kpis = {
-        '総売上': df['購入金額'].sum(),
-        '総顧客数': df['顧客ID'].nunique(),
-        '平均購入金額': df['購入金額'].mean(),
+        '総売上': total_sales,
+        '総顧客数': total_customers,
+        '平均購入金額': mean_amount,
         '総取引件数': len(df),
-        '平均年齢': df['年齢'].mean(),
-        'リピート率': (repeat_customers / df['顧客ID'].nunique() * 100) if df['顧客ID'].nunique() > 0 else 0,
+        '平均年齢': mean_age,
+        'リピート率': (repeat_customers / total_customers * 100) if total_customers > 0 else 0,
     }
     
     return kpis
@@ -115,27 +313,72 @@ def aggregate_by_period(df: pd.DataFrame, period: str = 'M') -> pd.DataFrame:
     """
     期間ごとに売上を集計
     
+    日別の基本集計（共有データセットではバージョンごとに1度だけ作成）を
+    期間ごとに再集計するため、期間の切り替えは行数でなく日数に比例する。
+    近似モードのフィルター結果では、顧客数をHyperLogLogスケッチから推定する。
+    
     Args:
         df: DataFrame
-        period: 集計期間 ('D': 日, 'W': 週, 'M': 月, 'Q': 四半期, 'Y': 年)
+        period: 集計期間 ('D': 日, 'W': 週, 'M': 月, 'Q': 四半期, 'Y': 年。'ME'などの末尾付きの表記も可)
         
     Returns:
         集計されたDataFrame
     """
+    if isinstance(df, SQLiteSource):
+        return df.aggregate_by_period(period)
+    
     if df.empty:
         return pd.DataFrame()
     
-    df_copy = df.copy()
-    df_copy = df_copy.set_index('購入日')
+    approximate = isinstance(df, FilteredView) and df.approximate
+    return daily_rollup(df).rollup(period, approximate=approximate)
+
+
+def aggregate_by_calendar(df, attribute: str) -> pd.DataFrame:
+    """
+    カレンダー属性（日区分・週番号・祝日など）ごとに売上を集計
+    
+    日別の基本集計（SQLiteSourceの場合は日付ごとのGROUP BY）にカレンダー属性を
+    日付IDで引き当て、日単位の小さな表を再集計する。行ごとの属性は作らない。
+    
+    Args:
+        df: DataFrame、FilteredViewまたはSQLiteSource
+        attribute: カレンダー属性名（build_calendarのカラム）
+    
+    Returns:
+        属性・総売上・取引件数・平均購入金額・日数・1日あたり売上のDataFrame
+        （日数は取引のあった日の数）
+    """
+    columns = [attribute, '総売上', '取引件数', '平均購入金額', '日数', '1日あたり売上']
+    if df.empty:
+        return pd.DataFrame(columns=columns)
     
-    aggregated = df_copy.resample(period).agg({
-        '購入金額': ['sum', 'mean', 'count'],
-        '顧客ID': 'nunique'
-    }).reset_index()
+    if isinstance(df, SQLiteSource):
+        daily = group_summary(df, '購入日', {'購入金額': ['sum', 'count']})
+        day_ids = to_day_id(daily.index.to_series())
+        sums = daily[('購入金額', 'sum')].to_numpy()
+        counts = daily[('購入金額', 'count')].to_numpy()
+    else:
+        rollup = daily_rollup(df)
+        day_ids, sums, counts = rollup.days, rollup.sum, rollup.count
+        if np.issubdtype(rollup.amount_dtype, np.integer):
+            sums = sums.astype(np.int64)
     
-    aggregated.columns = ['日付', '総売上', '平均購入金額', '取引件数', '顧客数']
+    days = pd.DataFrame({
+        attribute: gather_calendar(day_ids, [attribute])[attribute],
+        '日付ID': day_ids,
+        '総売上': sums,
+        '取引件数': counts,
+    })
+    result = days.groupby(attribute, observed=True).agg(
+        総売上=('総売上', 'sum'),
+        取引件数=('取引件数', 'sum'),
+        日数=('日付ID', 'nunique'),
+    ).reset_index()
     
-    return aggregated
+    result['平均購入金額'] = result['総売上'] / result['取引件数']
+    result['1日あたり売上'] = result['総売上'] / result['日数']
+    return result[columns]
 
 
 def calculate_moving_average(df: pd.DataFrame, column: str, window: int = 7) -> pd.Series:
@@ -166,15 +409,144 @@ def get_top_n(df: pd.DataFrame, group_by: str, value_column: str, n: int = 10) -
     Returns:
         上位N件のDataFrame
     """
+    if isinstance(df, SQLiteSource):
+        return df.top_n(group_by, value_column, n)
+    
     if df.empty:
         return pd.DataFrame()
     
-    result = df.groupby(group_by)[value_column].sum().reset_index()
-    result = result.sort_values(value_column, ascending=False).head(n)
+    result = top_n_groups(df[group_by], df[value_column], n)
+    result = result[['合計']].rename(columns={'合計': value_column}).reset_index()
+    
+    return result
+
+
+def get_top_groups(df, group_by: str, value_column: str, n: int = 10, rank_by: str = 'sum', first_columns: list = ()) -> pd.DataFrame:
+    """
+    合計または件数の上位N件のグループを、各グループの最初の行の値とともに取得
+    
+    グループ数が多い場合（顧客IDなど）も、全グループの並べ替えをせずに上位N件を選ぶ。
+    ストリーミング取り込みした共有データセット全体の顧客別の購入金額は、
+    ストアの顧客別統計から明細行を集計せずに選ぶ。
+    
+    Args:
+        df: DataFrameまたはFilteredView
+        group_by: グループ化するカラム
+        value_column: 合計するカラム
+        n: 取得件数
+        rank_by: 順位付けに使う集計（'sum': 合計, 'count': 件数）
+        first_columns: グループごとに最初の行の値を取得するカラム
+        
+    Returns:
+        グループ化カラムをインデックス、合計・件数とfirst_columnsを列とするDataFrame
+    """
+    if df.empty:
+        return pd.DataFrame(columns=['合計', '件数', *first_columns])
+    
+    result = None
+    if group_by == '顧客ID' and value_column == '購入金額':
+        result = _streamed_top_customers(df, n, rank_by)
+    if result is None:
+        result = top_n_groups(df[group_by], df[value_column], n, rank_by)
+    if first_columns:
+        # 上位N件のグループに属する行だけから、グループごとの最初の行を取り出す
+        matched = df[df[group_by].isin(result.index).to_numpy()]
+        first_rows = as_frame(matched, [group_by, *first_columns]).drop_duplicates(group_by)
+        result = result.join(first_rows.set_index(group_by)[list(first_columns)])
     
     return result
 
 
+def _streamed_top_customers(df, n: int, rank_by: str):
+    """
+    共有データセット全体の顧客別の上位N件を、ストリーミング取り込みのストアから取得
+    
+    Returns:
+        top_n_groupsと同じ形式のDataFrame（フィルター結果やストアのないデータの場合はNone）
+    """
+    source = df.origin[0] if isinstance(df, FilteredView) and df.origin is not None else df
+    if len(df) != len(source):
+        return None
+    version = dataset_version(source, columns=['顧客ID', '購入金額'])
+    if version is None or os.path.isdir(version[0]) or not is_streamed(version[0]):
+        return None
+    
+    column = '購入金額合計' if rank_by == 'sum' else '購入回数'
+    customers = load_streamed_top_customers(version[0], n, column)
+    return pd.DataFrame({
+        '合計': customers['購入金額合計'].astype(np.int64),
+        '件数': customers['購入回数'].astype(np.int64),
+    })
+
+
+def group_aggregate(df, by, value: str, agg: str = 'sum') -> pd.DataFrame:
+    """
+    グループごとに値を集計
+    
+    SQLiteSourceの場合はGROUP BYとしてSQLiteで実行され、FilteredViewの場合は
+    選択行のグループ化カラムと値カラムだけで集計する。
+    
+    Args:
+        df: DataFrame、FilteredViewまたはSQLiteSource
+        by: グループ化するカラム（文字列またはリスト）
+        value: 集計するカラム
+        agg: 集計関数名（sum, mean, count, size, nunique, min, max）
+        
+    Returns:
+        グループ化カラムと集計値のDataFrame
+    """
+    if isinstance(df, SQLiteSource):
+        return df.group_aggregate(by, value, agg)
+    if isinstance(df, FilteredView):
+        return df.aggregate(by, value, agg)
+    
+    return df.groupby(by, observed=True)[value].agg(agg).reset_index()
+
+
+def group_summary(df, by, aggregations: dict) -> pd.DataFrame:
+    """
+    グループごとに複数の値カラム・集計関数で集計
+    
+    groupby(by).agg(aggregations)と同じ形式のDataFrameを、集計ごとに
+    group_aggregateで求めて組み立てる。FilteredViewでは各集計がフィルター結果の
+    集計キャッシュを通るため、同じ描画内のチャートや他の表と計算を共有する。
+    
+    Args:
+        df: DataFrame、FilteredViewまたはSQLiteSource
+        by: グループ化するカラム（文字列またはリスト）
+        aggregations: {値カラム: 集計関数名または集計関数名のリスト}
+        
+    Returns:
+        グループ化カラムをインデックス、(値カラム, 集計関数名)を列とするDataFrame
+    """
+    keys = [by] if isinstance(by, str) else list(by)
+    columns = {}
+    for value, aggs in aggregations.items():
+        for agg in ([aggs] if isinstance(aggs, str) else aggs):
+            columns[(value, agg)] = group_aggregate(df, keys, value, agg).set_index(keys)[value]
+    return pd.concat(columns, axis=1)
+
+
+def count_missing(df) -> pd.Series:
+    """
+    カラムごとの欠損値の数を取得（df.isnull().sum()と同じ形式）
+    
+    FilteredViewではカラムを1つずつ取り出して数え、SQLiteSourceでは
+    SQLで数えるため、フィルター結果のDataFrame全体は作らない。
+    
+    Args:
+        df: DataFrame、FilteredViewまたはSQLiteSource
+        
+    Returns:
+        カラム名をインデックスとする欠損数のSeries
+    """
+    if isinstance(df, SQLiteSource):
+        return df.count_missing()
+    if isinstance(df, FilteredView):
+        return pd.Series({col: int(df[col].isna().sum()) for col in df.columns}, index=df.columns, dtype='int64')
+    return df.isnull().sum()
+
+
 def calculate_growth_rate(df: pd.DataFrame, period_column: str, value_column: str) -> pd.DataFrame:
     """
     成長率を計算
@@ -190,18 +562,22 @@ def calculate_growth_rate(df: pd.DataFrame, period_column: str, value_column: st
     if df.empty:
         return pd.DataFrame()
     
-    df_copy = df.copy()
-    df_copy = df_copy.sort_values(period_column)
-    df_copy['前期比'] = df_copy[value_column].pct_change() * 100
-    df_copy['前期差'] = df_copy[value_column].diff()
+    result = df.sort_values(period_column)
+    result['前期比'] = result[value_column].pct_change() * 100
+    result['前期差'] = result[value_column].diff()
     
-    return df_copy
+    return result
 
 
 def create_pivot_table(df: pd.DataFrame, index: str, columns: str, values: str, aggfunc: str = 'sum') -> pd.DataFrame:
     """
     ピボットテーブルを作成
     
+    フィルター条件から作られたFilteredViewでは、group_aggregateで集計してから
+    行・列に展開するため、売上キューブや集計キャッシュで計算できる集計はそこから
+    求める。それ以外で集計関数がsum・count・meanの場合は、行・列のコードを
+    組み合わせたbincountで作成する（pivot_tableのfill_value=0と同じ結果）。
+    
     Args:
         df: DataFrame
         index: 行のカラム
@@ -215,14 +591,16 @@ def create_pivot_table(df: pd.DataFrame, index: str, columns: str, values: str,
     if df.empty:
         return pd.DataFrame()
     
-    pivot = pd.pivot_table(
-        df,
-        index=index,
-        columns=columns,
-        values=values,
-        aggfunc=aggfunc,
-        fill_value=0
-    )
+    cached = isinstance(df, FilteredView) and df.fingerprint([index, columns, values]) is not None
+    if not cached and not isinstance(df, SQLiteSource) and aggfunc in PIVOT_AGGS:
+        return bincount_pivot(df[index], df[columns], df[values], aggfunc, fill_value=0)
+    
+    grouped = group_aggregate(df, [index, columns], values, aggfunc)
+    pivot = grouped.pivot(index=index, columns=columns, values=values).sort_index().sort_index(axis=1)
+    
+    # 該当データのない組み合わせは0にする（pivot_tableのfill_value=0と同じ）
+    if pivot.isna().any().any():
+        pivot = pivot.fillna(0).astype(grouped[values].dtype)
     
     return pivot
 
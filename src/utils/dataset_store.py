@@ -0,0 +1,286 @@
+"""
+共有データセットモジュール - 全セッション・全ページで1つのDataFrameを共有する
+"""
+import os
+import threading
+from collections import OrderedDict
+import weakref
+import numpy as np
+import pandas as pd
+import streamlit as st
+from src.config import PARTITION_RETENTION_MONTHS
+from src.utils.incremental import get_incremental_loader
+from src.utils.kpi_state import KPI_STATE_KEY, KPIState
+from src.utils.partitions import list_partitions, load_partitioned, retention_range
+
+
+class SharedDataset:
+    """
+    プロセス内で共有する読み取り専用のデータセット
+    
+    st.cache_dataはセッションごと・再実行ごとにDataFrameを復元（コピー）するが、
+    このクラスは1つのDataFrameを保持し、各呼び出し元には列データを共有する
+    浅いコピーを渡す。Copy-on-Writeにより、呼び出し元での列の追加や値の
+    書き換えはそのコピーにだけ反映され、共有フレームは変更されない
+    （Copy-on-Writeが常に有効なpandas 3.0以降が前提）。
+    """
+    
+    def __init__(self, file_path: str):
+        self.file_path = file_path
+        self.frame = None
+        self.version = 0
+        self._signature = None
+        self._derived = {}
+        self._lock = threading.Lock()
+    
+    def get(self) -> pd.DataFrame:
+        """
+        ソースの変更を取り込み、共有フレームのコピーを返す
+        
+        Returns:
+            前処理済みのDataFrame
+        """
+        with self._lock:
+            frame, appended = self._load()
+            if frame is not self.frame:
+                kpi_state = self._derived.get(KPI_STATE_KEY)
+                self.frame = frame
+                self.version += 1
+                self._derived = {}
+                # 追記だけの場合は、KPIの状態を追記分で更新して新しいバージョンに引き継ぐ
+                if kpi_state is not None and appended is not None and kpi_state.update(appended):
+                    self._derived[KPI_STATE_KEY] = kpi_state
+                elif appended is None:
+                    # ストリーミング取り込みで読み込み直した場合は、チャンクごとの部分集計からKPIの状態を作る
+                    kpi_state = self._streamed_kpi_state()
+                    if kpi_state is not None:
+                        self._derived[KPI_STATE_KEY] = kpi_state
+            
+            handout = self.frame.copy(deep=False)
+            _register(handout, self, self.version, self.frame)
+            return handout
+    
+    def derived(self, version: int, key: str, builder):
+        """
+        共有フレームから作る派生データ（インデックス等）をバージョンごとに1度だけ作成
+        
+        Args:
+            version: 呼び出し元のフレームを配布した時点のバージョン
+            key: 派生データの名前
+            builder: 共有フレームを受け取り派生データを返す関数
+            
+        Returns:
+            派生データ（versionが古い場合はNone）
+        """
+        with self._lock:
+            if version != self.version:
+                return None
+            if key not in self._derived:
+                self._derived[key] = builder(self.frame)
+            return self._derived[key]
+    
+    def _streamed_kpi_state(self):
+        """ストリーミング取り込みの部分集計から作ったKPIの状態（部分集計がない場合はNone）"""
+        if os.path.isdir(self.file_path):
+            return None
+        aggregates = get_incremental_loader(self.file_path).aggregates
+        return KPIState.from_aggregates(aggregates) if aggregates is not None else None
+    
+    def _load(self) -> tuple:
+        """
+        ソースが変更されていれば読み込み直したフレームを、変更がなければ現在のフレームを返す
+        
+        Returns:
+            (フレーム, 追記分のDataFrame)のタプル。追記以外の変更で
+            読み込み直した場合、追記分はNone
+        """
+        if not os.path.isdir(self.file_path):
+            # 増分ローダーは変更がなければ同じフレームを返す
+            return get_incremental_loader(self.file_path).refresh()
+        
+        signature = tuple(
+            (path, stat.st_size, stat.st_mtime_ns)
+            for path, stat in ((path, os.stat(path)) for _, path in list_partitions(self.file_path))
+        )
+        if self.frame is None or signature != self._signature:
+            self._signature = signature
+            # 保持期間外の月のパーティションは読み込まない
+            date_range = retention_range(self.file_path, PARTITION_RETENTION_MONTHS)
+            return load_partitioned(self.file_path, date_range), None
+        
+        return self.frame, None
+
+
+@st.cache_resource
+def get_shared_dataset(file_path: str) -> SharedDataset:
+    """
+    ファイルパスに対応する共有データセットを取得
+    
+    Args:
+        file_path: CSVファイルまたはパーティションディレクトリのパス
+    
+    Returns:
+        SharedDataset
+    """
+    return SharedDataset(file_path)
+
+
+# 配布したフレームのid -> (弱参照, SharedDataset, バージョン, 配布時点の列データを参照するフレーム)
+_handouts = {}
+_handouts_lock = threading.Lock()
+
+
+def _register(frame: pd.DataFrame, dataset: SharedDataset, version: int, reference: pd.DataFrame) -> None:
+    """配布したフレームと共有データセットの対応を記録（フレームの破棄時に削除）"""
+    key = id(frame)
+    
+    def _discard(ref):
+        with _handouts_lock:
+            if _handouts.get(key, (None,))[0] is ref:
+                del _handouts[key]
+    
+    with _handouts_lock:
+        _handouts[key] = (weakref.ref(frame, _discard), dataset, version, reference)
+
+
+def derived(df: pd.DataFrame, key: str, builder, columns: list = ()):
+    """
+    共有データセットから配布されたフレームについて、派生データを共有して取得
+    
+    ビットマップインデックスなど行位置に依存する派生データは、データセットの
+    バージョンごとに1度だけ作成し全セッションで共有する。呼び出し元のフレームが
+    行の並び替え・削除や、columnsの列の置き換えで共有フレームと食い違っている
+    場合は使えないためNoneを返す。
+    
+    Args:
+        df: load_shared_dataで取得したDataFrame
+        key: 派生データの名前
+        builder: 共有フレームを受け取り派生データを返す関数
+        columns: 派生データが依存するカラム
+        
+    Returns:
+        派生データ（共有データセットのフレームでない場合はNone）
+    """
+    entry = _lookup(df, columns)
+    if entry is None:
+        return None
+    
+    dataset, version = entry
+    return dataset.derived(version, key, builder)
+
+
+def dataset_version(df: pd.DataFrame, columns: list = ()):
+    """
+    共有データセットから配布されたフレームの、データセットとバージョンの識別子を取得
+    
+    行位置を単位とするキャッシュのキーに使う。条件はderivedと同じ。
+    
+    Args:
+        df: load_shared_dataで取得したDataFrame
+        columns: キャッシュする値が依存するカラム
+        
+    Returns:
+        (ファイルパス, バージョン)のタプル（共有データセットのフレームでない場合はNone）
+    """
+    entry = _lookup(df, columns)
+    if entry is None:
+        return None
+    
+    dataset, version = entry
+    return dataset.file_path, version
+
+
+class BoundedCache:
+    """
+    派生データとして全セッションで共有する、上限のある結果のキャッシュ
+    
+    フィルター条件ごとの集計結果など、派生データの中に後から登録していく値を保持する。
+    複数のセッションのスレッドから同時に参照・登録されるため、操作はロックで保護し、
+    件数がmax_entriesを、またはsizeofで求めた合計バイト数がmax_bytesを超えたら
+    最も古く使われたものから破棄する。値のサイズは登録後に増えることがあるため
+    （遅延して作る配列など）、合計バイト数は登録のたびに数え直す。
+    """
+    
+    def __init__(self, max_entries: int = None, max_bytes: int = None, sizeof=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+    
+    def get(self, key):
+        """登録された値を取得（ない場合はNone）"""
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+    
+    def put(self, key, value):
+        """
+        値を登録し、上限を超えた分を古いものから破棄
+        
+        他のスレッドが同じキーを先に登録していた場合は、登録済みの値を残して返す
+        （同じキーの値は同じ結果になるため、呼び出し元はどちらを使ってもよい）。
+        1つでmax_bytesを超える値は登録しない。
+        
+        Args:
+            key: キー
+            value: 登録する値
+            
+        Returns:
+            キーに登録されている値（登録しなかった場合はvalue）
+        """
+        if self.max_bytes is not None and self.sizeof(value) > self.max_bytes:
+            return value
+        
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key]
+            self._entries[key] = value
+            while self.max_entries is not None and len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            if self.max_bytes is not None:
+                total = sum(self.sizeof(entry) for entry in self._entries.values())
+                while total > self.max_bytes:
+                    _, evicted = self._entries.popitem(last=False)
+                    total -= self.sizeof(evicted)
+            return value
+
+
+def _lookup(df: pd.DataFrame, columns: list):
+    """配布したフレームが現在の共有フレームと一致していれば(SharedDataset, バージョン)を返す"""
+    with _handouts_lock:
+        entry = _handouts.get(id(df))
+    if entry is None or entry[0]() is not df:
+        return None
+    
+    _, dataset, version, reference = entry
+    if (
+        dataset.frame is None
+        or version != dataset.version
+        or len(df) != len(reference)
+        or not isinstance(df.index, pd.RangeIndex)
+        or not df.index.equals(reference.index)
+        or not all(_shares_column(df, reference, col) for col in columns)
+    ):
+        return None
+    
+    return dataset, version
+
+
+def _shares_column(df: pd.DataFrame, shared: pd.DataFrame, column: str) -> bool:
+    """カラムが共有フレームと同じデータを参照しているかを判定"""
+    if column not in df.columns:
+        return False
+    if isinstance(df[column].dtype, pd.CategoricalDtype):
+        if df[column].dtype != shared[column].dtype:
+            return False
+        # cat.codesはSeries作成時にコピーされるため、Categoricalのコード配列を直接比較する
+        return np.may_share_memory(df[column].array.codes, shared[column].array.codes)
+    return np.may_share_memory(df[column].to_numpy(), shared[column].to_numpy())
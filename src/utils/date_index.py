@@ -0,0 +1,55 @@
+"""
+日付インデックスモジュール - 購入日順のデータセットを二分探索で切り出す
+"""
+import numpy as np
+import pandas as pd
+from src.utils.calendar_dim import EPOCH, to_day_id
+
+
+class DateIndex:
+    """
+    購入日順に並んだデータセットの、日付から行位置への索引
+    
+    日付ごとの先頭行位置を保持し、日付範囲を二分探索で(開始行, 終了行)に
+    変換する。範囲の切り出しはilocのスライス（コピーなし）で済む。
+    """
+    
+    def __init__(self, df: pd.DataFrame):
+        day_ids = df['日付ID'].to_numpy() if '日付ID' in df.columns else to_day_id(df['購入日'])
+        self.n_rows = len(df)
+        self.days, offsets = np.unique(day_ids, return_index=True)
+        # 末尾に行数を加え、範囲の終端を同じ配列で引けるようにする
+        self.bounds = np.append(offsets, self.n_rows)
+    
+    def slice(self, start_date=None, end_date=None) -> tuple:
+        """
+        日付範囲に対応する行位置の範囲を取得
+        
+        Args:
+            start_date: 開始日（Noneの場合は先頭から）
+            end_date: 終了日（この日を含む。Noneの場合は末尾まで）
+        
+        Returns:
+            (開始行, 終了行)のタプル（終了行は含まない）
+        """
+        start = 0 if start_date is None else self.bounds[np.searchsorted(self.days, _day_id(start_date), 'left')]
+        stop = self.n_rows if end_date is None else self.bounds[np.searchsorted(self.days, _day_id(end_date), 'right')]
+        return int(start), int(max(start, stop))
+    
+    def date_range(self) -> tuple:
+        """データの(最小日付, 最大日付)を取得"""
+        if self.n_rows == 0:
+            return None, None
+        return tuple(pd.Timestamp(EPOCH + np.timedelta64(int(day), 'D')) for day in (self.days[0], self.days[-1]))
+
+
+def build_date_index(df: pd.DataFrame):
+    """購入日順のデータセットであれば日付インデックスを作成（並んでいなければNone）"""
+    if df.empty or not df['購入日'].is_monotonic_increasing:
+        return None
+    return DateIndex(df)
+
+
+def _day_id(value) -> int:
+    """日付を日付IDに変換"""
+    return int((np.datetime64(pd.Timestamp(value).date(), 'D') - EPOCH).astype(np.int64))
@@ -0,0 +1,170 @@
+"""
+近似ユニーク数モジュール - HyperLogLogスケッチを売上キューブのセルごとに保持して統合する
+"""
+import numpy as np
+import pandas as pd
+from src.config import DISTINCT_SKETCH_PRECISION
+from src.utils.cube import CUBE_COLUMNS
+from src.utils.dataset_store import derived
+
+# ハッシュ値のビット数
+HASH_BITS = 64
+
+
+class CellSketches:
+    """
+    売上キューブのセルごとの、顧客IDのHyperLogLogスケッチ
+    
+    各行の顧客IDのハッシュ値から(レジスタ番号, 先頭の0の数+1)を求め、セルと
+    レジスタの組ごとに最大値だけを残す。エントリの多いセルはレジスタを密な配列で、
+    それ以外のセルは(レジスタ番号, ランク)の疎な形でセル順に保持する。
+    スケッチはレジスタごとの最大値で統合できるため、日付・地域・カテゴリーなど
+    任意のセルの集合の、任意のグループ分けについて、顧客IDのハッシュ集合を
+    作らずにユニーク顧客数を推定できる。
+    """
+    
+    def __init__(self, df: pd.DataFrame, cube, column: str = '顧客ID', precision: int = DISTINCT_SKETCH_PRECISION):
+        self.column = column
+        self.precision = precision
+        self.n_registers = 1 << precision
+        
+        registers, ranks = register_ranks(hash_values(df[column]), precision)
+        positions = cube.cell_positions(df).astype(np.int64)
+        # (セル位置, レジスタ番号, ランク)を1つの整数にして並べ替え、
+        # 同じセル・レジスタの組では最大のランクだけを残す
+        packed = np.sort((positions << (precision + 6)) | (registers.astype(np.int64) << 6) | ranks)
+        slots = packed >> 6
+        packed = packed[np.append(slots[1:] != slots[:-1], True)]
+        
+        cell_of_entry = packed >> (precision + 6)
+        entry_registers = ((packed >> 6) & (self.n_registers - 1)).astype(np.uint16)
+        entry_ranks = (packed & 63).astype(np.uint8)
+        entry_counts = np.bincount(cell_of_entry, minlength=len(cube))
+        
+        # 疎な形（1エントリ3バイト）より小さくなるセルは、レジスタを密な配列で持つ
+        dense_cells = np.flatnonzero(3 * entry_counts >= self.n_registers)
+        self.dense_rows = np.full(len(cube), -1, dtype=np.int32)
+        self.dense_rows[dense_cells] = np.arange(len(dense_cells), dtype=np.int32)
+        self.dense = np.zeros((len(dense_cells), self.n_registers), dtype=np.uint8)
+        in_dense = self.dense_rows[cell_of_entry] >= 0
+        self.dense[self.dense_rows[cell_of_entry[in_dense]], entry_registers[in_dense]] = entry_ranks[in_dense]
+        
+        sparse = ~in_dense
+        self.offsets = np.searchsorted(cell_of_entry[sparse], np.arange(len(cube) + 1))
+        self.registers = entry_registers[sparse]
+        self.ranks = entry_ranks[sparse]
+    
+    def estimate(self, cells, groups: np.ndarray, n_groups: int) -> np.ndarray:
+        """
+        セルのスケッチをグループごとに統合し、ユニーク数を推定
+        
+        密なセルはグループごとにnp.maximum.reduceatでレジスタを統合し、疎なセルは
+        選択したセルのエントリだけを統合するため、計算量は選択したセル数に比例する。
+        
+        Args:
+            cells: キューブのセル位置（sliceまたは配列）
+            groups: セルごとのグループ番号（-1のセルは含めない）
+            n_groups: グループ数
+            
+        Returns:
+            グループごとの推定ユニーク数（int64）
+        """
+        if isinstance(cells, slice):
+            start, stop, _ = cells.indices(len(self.offsets) - 1)
+            cells = np.arange(start, stop)
+        cells = np.asarray(cells)
+        groups = np.asarray(groups, dtype=np.int32)
+        if (groups < 0).any():
+            cells, groups = cells[groups >= 0], groups[groups >= 0]
+        
+        merged = np.zeros((n_groups, self.n_registers), dtype=np.uint8)
+        
+        # 密なセル: グループ順に並べ、グループごとの連続範囲をレジスタ単位の最大値で統合
+        rows = self.dense_rows[cells]
+        is_dense = rows >= 0
+        if is_dense.any():
+            order = np.argsort(groups[is_dense], kind='stable')
+            dense_groups = groups[is_dense][order]
+            starts = np.flatnonzero(np.append(True, dense_groups[1:] != dense_groups[:-1]))
+            reduced = np.maximum.reduceat(self.dense[rows[is_dense][order]], starts, axis=0)
+            merged[dense_groups[starts]] = reduced
+        
+        # 疎なセル: 各セルのエントリ範囲を連結して、(グループ, レジスタ)ごとに統合
+        starts = self.offsets[cells]
+        counts = self.offsets[cells + 1] - starts
+        if counts.sum() > 0:
+            entries = np.arange(counts.sum()) + np.repeat(starts - (np.cumsum(counts) - counts), counts)
+            slots = np.repeat(groups, counts) * self.n_registers + self.registers[entries]
+            np.maximum.at(merged.reshape(-1), slots, self.ranks[entries])
+        
+        return np.rint(estimate_cardinality(merged)).astype(np.int64)
+
+
+def customer_sketches(df: pd.DataFrame, cube):
+    """
+    共有データセットの、売上キューブのセルごとの顧客スケッチを取得
+    （load_shared_dataでの読み込み時に、データセットのバージョンごとに1度だけ作成）
+    
+    Args:
+        df: load_shared_dataで取得したDataFrame
+        cube: dfの売上キューブ
+        
+    Returns:
+        CellSketches（共有データセットのフレームでない場合はNone）
+    """
+    return derived(df, 'customer_sketches', lambda frame: CellSketches(frame, cube), columns=CUBE_COLUMNS + ['顧客ID'])
+
+
+def hash_values(values: pd.Series) -> np.ndarray:
+    """値を64ビットのハッシュ値に変換"""
+    return pd.util.hash_array(values.to_numpy())
+
+
+def register_ranks(hashes: np.ndarray, precision: int) -> tuple:
+    """
+    ハッシュ値をレジスタ番号と、残りのビットの先頭の0の数+1（ランク）に分解
+    
+    Args:
+        hashes: 64ビットのハッシュ値の配列
+        precision: レジスタ数の指数（レジスタ番号に使う上位ビット数）
+        
+    Returns:
+        (レジスタ番号の配列, ランクの配列)
+    """
+    registers = (hashes >> np.uint64(HASH_BITS - precision)).astype(np.uint16)
+    rest = hashes & np.uint64((1 << (HASH_BITS - precision)) - 1)
+    
+    # 残りのビットのビット長（浮動小数点の指数から求め、丸めで1大きくなった分を補正）
+    _, bit_length = np.frexp(rest.astype(np.float64))
+    bit_length = bit_length.astype(np.int64)
+    shifted = np.right_shift(rest, np.maximum(bit_length - 1, 0).astype(np.uint64))
+    bit_length -= (bit_length > 0) & (shifted == 0)
+    
+    ranks = (HASH_BITS - precision) - bit_length + 1
+    return registers, ranks.astype(np.uint8)
+
+
+def estimate_cardinality(registers: np.ndarray) -> np.ndarray:
+    """
+    HyperLogLogのレジスタからユニーク数を推定
+    
+    Args:
+        registers: (グループ数, レジスタ数)のレジスタ値
+        
+    Returns:
+        グループごとの推定値
+    """
+    n_registers = registers.shape[1]
+    alpha = 0.7213 / (1 + 1.079 / n_registers)
+    raw = alpha * n_registers ** 2 / np.ldexp(1.0, -registers.astype(np.int32)).sum(axis=1)
+    
+    # 推定値が小さい範囲は、値が0のレジスタの割合から推定する（Linear Counting）
+    zeros = (registers == 0).sum(axis=1)
+    with np.errstate(divide='ignore'):
+        linear = n_registers * np.log(n_registers / np.maximum(zeros, 1))
+    return np.where((raw <= 2.5 * n_registers) & (zeros > 0), linear, raw)
+
+
+def standard_error(precision: int = DISTINCT_SKETCH_PRECISION) -> float:
+    """推定値の相対標準誤差（1.04 / √レジスタ数）"""
+    return 1.04 / np.sqrt(1 << precision)
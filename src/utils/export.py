@@ -5,6 +5,8 @@ import pandas as pd
 import io
 from datetime import datetime
 from src.config import EXPORT_CONFIG
+from src.utils.data_processor import group_summary
+from src.utils.filtered_view import as_frame
 
 
 def export_to_csv(df: pd.DataFrame, filename: str = None) -> bytes:
@@ -12,7 +14,7 @@ def export_to_csv(df: pd.DataFrame, filename: str = None) -> bytes:
     DataFrameをCSVにエクスポート
     
     Args:
-        df: DataFrame
+        df: DataFrame、FilteredViewまたはSQLiteSource
         filename: ファイル名（省略時は自動生成）
         
     Returns:
@@ -21,7 +23,7 @@ def export_to_csv(df: pd.DataFrame, filename: str = None) -> bytes:
     if filename is None:
         filename = f"export_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
     
-    csv_data = df.to_csv(index=False, encoding=EXPORT_CONFIG['csv_encoding'])
+    csv_data = as_frame(df).to_csv(index=False, encoding=EXPORT_CONFIG['csv_encoding'])
     return csv_data.encode(EXPORT_CONFIG['csv_encoding'])
 
 
@@ -112,11 +114,12 @@ def prepare_export_data(df: pd.DataFrame, include_analysis: bool = True) -> dict
     export_dict = {}
     
     # メインデータ
-    export_dict['購入データ'] = df.copy()
+    export_dict['購入データ'] = as_frame(df)
     
     if include_analysis:
+        # 集計はフィルター結果の集計キャッシュを通し、画面のチャート・表と共有する
         # カテゴリー別集計
-        category_summary = df.groupby('購入カテゴリー').agg({
+        category_summary = group_summary(df, '購入カテゴリー', {
             '購入金額': ['sum', 'mean', 'count'],
             '顧客ID': 'nunique'
         }).reset_index()
@@ -124,7 +127,7 @@ def prepare_export_data(df: pd.DataFrame, include_analysis: bool = True) -> dict
         export_dict['カテゴリー別集計'] = category_summary
         
         # 地域別集計
-        region_summary = df.groupby('地域').agg({
+        region_summary = group_summary(df, '地域', {
             '購入金額': ['sum', 'mean', 'count'],
             '顧客ID': 'nunique'
         }).reset_index()
@@ -133,7 +136,7 @@ def prepare_export_data(df: pd.DataFrame, include_analysis: bool = True) -> dict
         
         # 月別集計
         if '年月' in df.columns:
-            monthly_summary = df.groupby('年月').agg({
+            monthly_summary = group_summary(df, '年月', {
                 '購入金額': ['sum', 'mean', 'count'],
                 '顧客ID': 'nunique'
             }).reset_index()
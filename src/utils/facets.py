@@ -0,0 +1,131 @@
+"""
+ファセット集計モジュール - フィルターの各選択肢に一致する件数を1回の集計で求める
+"""
+import numpy as np
+import pandas as pd
+from src.config import CATEGORY_FILTER_COLUMNS
+from src.utils.dataset_store import derived
+from src.utils.query_planner import execute_plan, plan_filters
+
+# 組み合わせコードで扱う組み合わせ数の上限（超える場合は列ごとに数える）
+MAX_JOINT_CELLS = 1 << 20
+
+# 件数の絞り込みに使う、ファセット以外の条件
+BASE_FILTER_KEYS = ('date_range', 'age_range')
+
+
+class JointCodes:
+    """
+    フィルター列（地域・性別・カテゴリー・支払方法）のコードを1つの整数にまとめた列
+    
+    各行の値の組み合わせを混合基数の1つのコードで表すため、1回のbincountで
+    全ての組み合わせの件数（小さな多次元の度数表）が得られる。
+    """
+    
+    def __init__(self, df: pd.DataFrame):
+        self.keys = list(CATEGORY_FILTER_COLUMNS)
+        self.categories = {}
+        codes = []
+        for key, column in CATEGORY_FILTER_COLUMNS.items():
+            column_codes, categories = _codes(df[column])
+            self.categories[key] = categories
+            codes.append(column_codes)
+        
+        self.shape = tuple(len(self.categories[key]) for key in self.keys)
+        cells = int(np.prod(self.shape))
+        dtype = np.int16 if cells <= np.iinfo(np.int16).max else np.int32
+        if cells > MAX_JOINT_CELLS:
+            self.codes = None
+            self.column_codes = dict(zip(self.keys, codes))
+            return
+        
+        joint = np.zeros(len(df), dtype=dtype)
+        for column_codes, size in zip(codes, self.shape):
+            joint *= size
+            joint += column_codes
+        # 欠損値を含む行はどの選択肢にも数えない
+        joint[np.any([column_codes < 0 for column_codes in codes], axis=0)] = cells
+        self.codes = joint
+        self.column_codes = None
+
+
+def facet_counts(df: pd.DataFrame, filters: dict, masks=None) -> dict:
+    """
+    フィルターの各選択肢について、他のフィルター条件の下で一致する行数を集計
+    
+    期間・年齢の条件を満たす行の組み合わせコードを1回のbincountで数え、
+    得られた度数表を、選択肢ごとに他のカテゴリー条件の選択値で絞って合計する。
+    行ごとの処理は組み合わせコードの数え上げ1回だけで、選択肢やフィルターの
+    数に比例しない。
+    
+    Args:
+        df: 元のDataFrame
+        filters: フィルター条件の辞書
+        masks: 条件別ビットセットキャッシュ（期間・年齢の条件の評価に使う）
+        
+    Returns:
+        {フィルターのキー: {選択肢: 件数}}の辞書
+    """
+    joint = derived(df, 'joint_codes', JointCodes, columns=list(CATEGORY_FILTER_COLUMNS.values())) or JointCodes(df)
+    rows = _base_rows(df, filters, masks)
+    
+    if joint.codes is None:
+        return _column_facet_counts(joint, filters, rows)
+    
+    codes = joint.codes[rows]
+    cells = int(np.prod(joint.shape))
+    table = np.bincount(codes, minlength=cells + 1)[:cells].reshape(joint.shape)
+    
+    selected = [_selected(joint.categories[key], filters.get(key)) for key in joint.keys]
+    result = {}
+    for axis, key in enumerate(joint.keys):
+        weighted = table
+        for other, selection in enumerate(selected):
+            if other != axis and selection is not None:
+                weighted = np.compress(selection, weighted, axis=other)
+        counts = weighted.sum(axis=tuple(other for other in range(len(joint.keys)) if other != axis))
+        result[key] = dict(zip(joint.categories[key], counts.tolist()))
+    
+    return result
+
+
+def _base_rows(df: pd.DataFrame, filters: dict, masks=None):
+    """期間・年齢の条件を満たす行（sliceまたは行番号の配列）"""
+    plan = plan_filters(df, {key: filters[key] for key in BASE_FILTER_KEYS if filters.get(key)})
+    return execute_plan(df, plan, masks)
+
+
+def _column_facet_counts(joint: JointCodes, filters: dict, rows) -> dict:
+    """組み合わせ数が多い場合の、列ごとのbincountによる集計"""
+    passes = {}
+    for key in joint.keys:
+        selection = _selected(joint.categories[key], filters.get(key))
+        if selection is not None:
+            codes = joint.column_codes[key][rows]
+            passes[key] = np.append(selection, False)[codes]
+    
+    result = {}
+    for key in joint.keys:
+        codes = joint.column_codes[key][rows]
+        others = [passed for other, passed in passes.items() if other != key]
+        mask = np.logical_and.reduce(others) if others else np.ones(len(codes), dtype=bool)
+        mask &= codes >= 0
+        counts = np.bincount(codes[mask], minlength=len(joint.categories[key]))
+        result[key] = dict(zip(joint.categories[key], counts.tolist()))
+    return result
+
+
+def _selected(categories: pd.Index, values):
+    """選択値を選択肢ごとの真偽値に変換（未選択・全選択の場合はNone）"""
+    if not values:
+        return None
+    selection = categories.isin(values)
+    return None if selection.all() else selection
+
+
+def _codes(series: pd.Series) -> tuple:
+    """列の値のコードと選択肢を取得（カテゴリー型以外は値を並べ替えてコード化）"""
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        return series.array.codes, series.cat.categories
+    codes, categories = pd.factorize(series, sort=True)
+    return codes, categories
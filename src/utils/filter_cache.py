@@ -0,0 +1,273 @@
+"""
+フィルター結果キャッシュモジュール - 正規化したフィルター条件ごとに抽出行を共有する
+"""
+import threading
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+import streamlit as st
+from src.config import CATEGORY_FILTER_COLUMNS, FILTER_CACHE_MAX_BYTES
+from src.utils.dataset_store import derived
+from src.utils.date_index import build_date_index
+
+# 行範囲（slice）で表せる結果のサイズとして数えるバイト数
+SLICE_ENTRY_BYTES = 64
+
+# 条件別ビットセットキャッシュを保持するセッションステートのキー
+PREDICATE_CACHE_KEY = '_predicate_masks'
+
+# 集計キャッシュを保持するセッションステートのキー
+AGGREGATE_CACHE_KEY = '_aggregates'
+
+
+class FilterCache:
+    """
+    フィルター結果の行番号をLRUで保持するキャッシュ
+    
+    値はDataFrameではなく行番号の配列（または行範囲のslice）で保持し、
+    合計バイト数がmax_bytesを超えたら最も古く使われたものから破棄する。
+    """
+    
+    def __init__(self, max_bytes: int = FILTER_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, key):
+        """キャッシュされた行番号を取得（ない場合はNone）"""
+        with self._lock:
+            rows = self._entries.get(key)
+            if rows is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return rows
+    
+    def put(self, key, rows) -> None:
+        """行番号を登録し、上限を超えた分を古いものから破棄"""
+        size = _entry_bytes(rows)
+        if size > self.max_bytes:
+            return
+        
+        # 全セッションで共有するため書き換えを禁止する
+        if isinstance(rows, np.ndarray):
+            rows.flags.writeable = False
+        
+        with self._lock:
+            if key in self._entries:
+                self.total_bytes -= _entry_bytes(self._entries.pop(key))
+            self._entries[key] = rows
+            self.total_bytes += size
+            
+            while self.total_bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.total_bytes -= _entry_bytes(evicted)
+    
+    def clear(self) -> None:
+        """全エントリと統計を破棄"""
+        with self._lock:
+            self._entries.clear()
+            self.total_bytes = 0
+            self.hits = 0
+            self.misses = 0
+    
+    def stats(self) -> dict:
+        """ヒット数・ミス数・エントリ数・使用バイト数を取得"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'ヒット': self.hits,
+                'ミス': self.misses,
+                'ヒット率(%)': (self.hits / total * 100) if total > 0 else 0,
+                'エントリ数': len(self._entries),
+                '使用量(バイト)': self.total_bytes,
+            }
+
+
+class PredicateMaskCache:
+    """
+    セッション内で、フィルター条件ごとの一致行のビットセットを保持するキャッシュ
+    
+    条件（日付範囲・地域・性別・カテゴリー・支払方法・年齢範囲）ごとに、直近の
+    選択値とビットセット（np.packbits）を1つずつ保持する。ビットマップ条件は
+    全行分、行範囲を走査する条件は日付範囲内のビットセットになる
+    （query_planner.mask_keyを参照）。
+    サイドバーで1つの条件を変えた再実行では、変わった条件だけを評価し直し、
+    他の条件は保持したビットセットをANDで合成するだけで済む。
+    """
+    
+    def __init__(self):
+        self.version = None
+        self._masks = {}
+    
+    def bind(self, version) -> 'PredicateMaskCache':
+        """データセットのバージョンが変わっていれば保持したビットセットを破棄"""
+        if version != self.version:
+            self.version = version
+            self._masks = {}
+        return self
+    
+    def get(self, key: str, value):
+        """条件のビットセットを取得（選択値が変わっている場合はNone）"""
+        entry = self._masks.get(key)
+        if entry is None or entry[0] != value:
+            return None
+        return entry[1]
+    
+    def put(self, key: str, value, bits: np.ndarray) -> None:
+        """条件のビットセットを登録（同じ条件の以前の選択値のものは置き換える）"""
+        bits.flags.writeable = False
+        self._masks[key] = (value, bits)
+    
+    def keys(self) -> list:
+        """ビットセットを保持している条件"""
+        return list(self._masks)
+
+
+class AggregateCache:
+    """
+    セッション内で、1つのフィルター結果に対するグループ別集計の結果を保持するキャッシュ
+    
+    フィルター結果の識別子（データセットのバージョンと正規化したフィルター条件）に
+    結び付け、(グループ化カラム, 値カラム, 集計関数)ごとに結果を1つずつ保持する。
+    同じ描画の中で複数のチャート・表・エクスポートが同じ集計を求めても計算は1度になる。
+    識別子が変わった（フィルター条件やデータが変わった）時点で全て破棄する。
+    """
+    
+    def __init__(self):
+        self.fingerprint = None
+        self.hits = 0
+        self.misses = 0
+        self._results = {}
+    
+    def bind(self, fingerprint) -> 'AggregateCache':
+        """フィルター結果の識別子が変わっていれば保持した集計結果を破棄"""
+        if fingerprint != self.fingerprint:
+            self.fingerprint = fingerprint
+            self._results = {}
+        return self
+    
+    def get(self, key):
+        """集計結果を取得（ない場合はNone）"""
+        result = self._results.get(key)
+        if result is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        # 呼び出し元での列の追加・変更が保持した結果に波及しないよう浅いコピーを返す
+        return result.copy(deep=False)
+    
+    def put(self, key, result: pd.DataFrame) -> None:
+        """集計結果を登録"""
+        self._results[key] = result.copy(deep=False)
+
+
+@st.cache_resource
+def get_filter_cache() -> FilterCache:
+    """プロセス内で共有するフィルター結果キャッシュを取得"""
+    return FilterCache()
+
+
+def get_predicate_cache(version) -> PredicateMaskCache:
+    """
+    このセッションの条件別ビットセットキャッシュを取得
+    
+    Args:
+        version: 共有データセットのバージョン（dataset_versionの値）
+        
+    Returns:
+        PredicateMaskCache
+    """
+    if PREDICATE_CACHE_KEY not in st.session_state:
+        st.session_state[PREDICATE_CACHE_KEY] = PredicateMaskCache()
+    return st.session_state[PREDICATE_CACHE_KEY].bind(version)
+
+
+def get_aggregate_cache(fingerprint) -> AggregateCache:
+    """
+    このセッションの集計キャッシュを取得
+    
+    Args:
+        fingerprint: フィルター結果の識別子（FilteredView.fingerprintの値）
+        
+    Returns:
+        AggregateCache
+    """
+    if AGGREGATE_CACHE_KEY not in st.session_state:
+        st.session_state[AGGREGATE_CACHE_KEY] = AggregateCache()
+    return st.session_state[AGGREGATE_CACHE_KEY].bind(fingerprint)
+
+
+def canonical_filters(df: pd.DataFrame, filters: dict) -> tuple:
+    """
+    フィルター条件を正規化し、キャッシュのキーに使えるタプルに変換
+    
+    選択値は重複を除いて並べ替え、日付は日単位に揃えてデータの範囲に収める。
+    全ての値を選択したカテゴリー条件や、データ全体を含む日付・年齢の範囲は
+    絞り込みにならないため除く。
+    
+    Args:
+        df: 元のDataFrame
+        filters: フィルター条件の辞書
+        
+    Returns:
+        (キー, 値)のタプルのタプル（dictに戻すとfilter_dataの条件として使える）
+    """
+    spec = []
+    
+    for key, column in CATEGORY_FILTER_COLUMNS.items():
+        values = filters.get(key)
+        if not values:
+            continue
+        selected = tuple(sorted({str(value) for value in values}))
+        if isinstance(df[column].dtype, pd.CategoricalDtype) and set(df[column].cat.categories.astype(str)) <= set(selected):
+            continue
+        spec.append((key, selected))
+    
+    if filters.get('date_range'):
+        start, end = (pd.Timestamp(value).normalize() for value in filters['date_range'])
+        min_date, max_date = _date_bounds(df)
+        if min_date is not None:
+            start, end = max(start, min_date), min(end, max_date)
+        if min_date is None or start > min_date or end < max_date:
+            spec.append(('date_range', (start.strftime('%Y-%m-%d'), end.strftime('%Y-%m-%d'))))
+    
+    if filters.get('age_range'):
+        min_age, max_age = (int(value) for value in filters['age_range'])
+        lowest, highest = _age_bounds(df)
+        if lowest is None or min_age > lowest or max_age < highest:
+            spec.append(('age_range', (min_age, max_age)))
+    
+    return tuple(spec)
+
+
+def _date_bounds(df: pd.DataFrame) -> tuple:
+    """データの(最小日付, 最大日付)を取得"""
+    date_index = derived(df, 'date_index', build_date_index, columns=['購入日'])
+    if date_index is not None:
+        return date_index.date_range()
+    if df.empty:
+        return None, None
+    return df['購入日'].min().normalize(), df['購入日'].max().normalize()
+
+
+def _age_bounds(df: pd.DataFrame) -> tuple:
+    """データの(最小年齢, 最大年齢)を取得"""
+    bounds = derived(df, 'age_bounds', _compute_age_bounds, columns=['年齢'])
+    return bounds if bounds is not None else _compute_age_bounds(df)
+
+
+def _compute_age_bounds(df: pd.DataFrame) -> tuple:
+    """年齢の最小値・最大値を計算"""
+    if df.empty:
+        return None, None
+    return int(df['年齢'].min()), int(df['年齢'].max())
+
+
+def _entry_bytes(rows) -> int:
+    """エントリのサイズ（バイト）"""
+    return rows.nbytes if isinstance(rows, np.ndarray) else SLICE_ENTRY_BYTES
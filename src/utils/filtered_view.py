@@ -0,0 +1,308 @@
+"""
+フィルタービューモジュール - 元データと行選択の組でフィルター結果を表す
+"""
+import logging
+import numpy as np
+import pandas as pd
+from src.utils.cube import AGE_GROUP_COLUMN, sales_cube
+from src.utils.dataset_store import dataset_version
+from src.utils.distinct_sketch import customer_sketches
+from src.utils.filter_cache import get_aggregate_cache
+
+logger = logging.getLogger(__name__)
+
+
+class FilteredView:
+    """
+    元のDataFrameと行選択（slice または行番号の配列）を保持するフィルター結果
+    
+    列の取り出しや集計は選択行の必要な列だけを対象に行い、フィルター結果の
+    DataFrame全体は作らない。並べ替え・先頭行・基本統計もビューのまま扱う。
+    DataFrameとして扱われた場合（frameや、FilteredViewにない属性へのアクセス）に
+    限り、1度だけ作成して使い回す。属性アクセスによる作成は警告をログに出す。
+    フィルター条件から作られた場合は、行を参照しない集計を売上キューブで行い、
+    集計結果をフィルター結果ごとの集計キャッシュで共有する。近似モードでは、
+    顧客IDのユニーク数をキューブのセルごとのHyperLogLogスケッチから推定する。
+    """
+    
+    def __init__(self, base: pd.DataFrame, rows=None, extra: dict = None, origin: tuple = None, approximate: bool = False):
+        self.base = base
+        self.rows = slice(0, len(base)) if rows is None else rows
+        # assignで追加したカラム（選択行に揃えたSeries）
+        self.extra = extra or {}
+        # (共有データセットのフレーム, 正規化したフィルター条件)。行の選択がフィルター条件で
+        # 決まる場合だけ保持し、売上キューブでの集計に使う
+        self.origin = origin
+        # 顧客IDのユニーク数（nunique）を近似値で求めるか
+        self.approximate = approximate
+        self._frame = None
+        self._cube = None
+    
+    def __len__(self) -> int:
+        if isinstance(self.rows, slice):
+            return len(range(*self.rows.indices(len(self.base))))
+        return len(self.rows)
+    
+    @property
+    def empty(self) -> bool:
+        return len(self) == 0 or len(self.columns) == 0
+    
+    @property
+    def columns(self) -> pd.Index:
+        return self.base.columns.append(pd.Index([name for name in self.extra if name not in self.base.columns]))
+    
+    @property
+    def index(self) -> pd.Index:
+        return self.base.index[self.rows]
+    
+    def __contains__(self, column) -> bool:
+        return column in self.columns
+    
+    def __getitem__(self, key):
+        """
+        カラム名なら選択行のSeries、カラム名のリストならその列だけのFilteredView、
+        選択行と同じ長さの真偽値マスクなら行をさらに絞り込んだFilteredViewを返す
+        
+        それ以外はDataFrameとして評価する。
+        """
+        if isinstance(key, str):
+            if key in self.extra:
+                return self.extra[key]
+            return self.base[key].iloc[self.rows]
+        if isinstance(key, list) and all(isinstance(col, str) for col in key):
+            return self.select(key)
+        if isinstance(key, (pd.Series, np.ndarray)) and key.dtype == bool and len(key) == len(self):
+            return self.narrow(np.asarray(key))
+        return self._fallback_frame(f"[{type(key).__name__}]")[key]
+    
+    def __getattr__(self, name):
+        # FilteredViewにない属性はDataFrameとして解決する（既存コードとの互換用）
+        if name.startswith('_') or name in ('base', 'rows', 'extra', 'origin', 'approximate'):
+            raise AttributeError(name)
+        return getattr(self._fallback_frame(name), name)
+    
+    def _fallback_frame(self, accessor: str) -> pd.DataFrame:
+        """FilteredViewにない操作のためにframeを取得（作成する場合は警告をログに出す）"""
+        if self._frame is None:
+            logger.warning("FilteredView.%s: 選択行%d件のDataFrame全体を作成します", accessor, len(self))
+        return self.frame
+    
+    def positions(self) -> np.ndarray:
+        """選択行の元のDataFrameでの行番号"""
+        if isinstance(self.rows, slice):
+            return np.arange(len(self.base))[self.rows]
+        return np.asarray(self.rows)
+    
+    def select(self, columns: list) -> 'FilteredView':
+        """指定カラムだけを持つFilteredViewを返す"""
+        base_columns = [col for col in columns if col not in self.extra]
+        extra = {col: self.extra[col] for col in columns if col in self.extra}
+        return FilteredView(self.base[base_columns], self.rows, extra, self.origin, self.approximate)
+    
+    def narrow(self, mask: np.ndarray) -> 'FilteredView':
+        """選択行のうちマスクが真の行だけを持つFilteredViewを返す"""
+        extra = {name: values[mask] for name, values in self.extra.items()}
+        return FilteredView(self.base, self.positions()[mask], extra)
+    
+    def take(self, order: np.ndarray) -> 'FilteredView':
+        """選択行のうちorder（選択行内の位置）の行を、その順に並べたFilteredViewを返す"""
+        extra = {name: values.iloc[order] for name, values in self.extra.items()}
+        return FilteredView(self.base, self.positions()[order], extra)
+    
+    def sort_values(self, by, ascending: bool = True) -> 'FilteredView':
+        """
+        並べ替えた行順のFilteredViewを返す（DataFrame.sort_valuesと同じ順序）
+        
+        並べ替えのキーのカラムだけを取り出して行順を求める。
+        
+        Args:
+            by: 並べ替えのキーのカラム（文字列またはリスト）
+            ascending: 昇順か
+            
+        Returns:
+            FilteredView
+        """
+        keys = [by] if isinstance(by, str) else list(by)
+        order = self.to_frame(keys).reset_index(drop=True).sort_values(keys, ascending=ascending).index.to_numpy()
+        return self.take(order)
+    
+    def head(self, n: int = 5) -> 'FilteredView':
+        """先頭n行のFilteredViewを返す"""
+        return self.take(np.arange(min(max(n, 0), len(self))))
+    
+    def describe(self) -> pd.DataFrame:
+        """
+        DataFrame.describe()と同じ基本統計（対象になるカラムだけを取り出して計算）
+        
+        Returns:
+            基本統計のDataFrame
+        """
+        template = pd.DataFrame({
+            col: self.extra[col].iloc[:0] if col in self.extra else self.base[col].iloc[:0]
+            for col in self.columns
+        })
+        return self.to_frame(list(template.describe().columns)).describe()
+    
+    def assign(self, **columns) -> 'FilteredView':
+        """
+        カラムを追加したFilteredViewを返す（元のDataFrameは変更しない）
+        
+        Args:
+            columns: {カラム名: 選択行と同じ長さのSeriesまたは配列}
+            
+        Returns:
+            FilteredView
+        """
+        index = self.index
+        extra = dict(self.extra)
+        for name, values in columns.items():
+            extra[name] = values.rename(name) if isinstance(values, pd.Series) else pd.Series(values, index=index, name=name)
+        return FilteredView(self.base, self.rows, extra, self.origin, self.approximate)
+    
+    def to_frame(self, columns: list = None) -> pd.DataFrame:
+        """
+        選択行をDataFrameとして取得
+        
+        Args:
+            columns: 取得するカラム（Noneの場合は全カラム）
+            
+        Returns:
+            DataFrame
+        """
+        if columns is None:
+            return self.frame
+        return pd.DataFrame({col: self[col] for col in columns}, index=self.index)
+    
+    @property
+    def frame(self) -> pd.DataFrame:
+        """選択行の全カラムのDataFrame（初回アクセス時に1度だけ作成）"""
+        if self._frame is None:
+            frame = self.base.iloc[self.rows]
+            if self.extra:
+                frame = frame.assign(**self.extra)
+            self._frame = frame
+        return self._frame
+    
+    def aggregate(self, by, value: str, agg: str = 'sum') -> pd.DataFrame:
+        """
+        選択行のグループ別集計
+        
+        フィルター結果の集計キャッシュにあればそれを返す。売上キューブで
+        計算できる集計はセルの集約で求め、それ以外はグループ化カラムと
+        値カラムだけを取り出して集計する。
+        
+        Args:
+            by: グループ化するカラム（文字列またはリスト）
+            value: 集計するカラム
+            agg: 集計関数名
+            
+        Returns:
+            グループ化カラムと集計値のDataFrame
+        """
+        keys = [by] if isinstance(by, str) else list(by)
+        approximate = self.approximate and agg == 'nunique'
+        cache_key = (tuple(keys), value, 'approx_nunique' if approximate else agg)
+        
+        fingerprint = self.fingerprint(keys + [value])
+        cache = get_aggregate_cache(fingerprint) if fingerprint is not None else None
+        if cache is not None:
+            result = cache.get(cache_key)
+            if result is not None:
+                return result
+        
+        result = None
+        query = self._cube_query()
+        if query is not None and all(key in self.columns and (key not in self.extra or key == AGE_GROUP_COLUMN) for key in keys):
+            cube, cells = query
+            if approximate and cube.supports(keys, '購入金額', 'count'):
+                sketches = customer_sketches(self.origin[0], cube)
+                if sketches is not None and sketches.column == value:
+                    result = cube.distinct(cells, keys, sketches)
+            elif cube.supports(keys, value, agg):
+                result = cube.aggregate(cells, keys, value, agg)
+        if result is None:
+            result = self[value].groupby([self[key] for key in keys], observed=True).agg(agg).reset_index()
+        
+        if cache is not None:
+            cache.put(cache_key, result)
+        return result
+    
+    def count_distinct(self, column: str) -> int:
+        """
+        選択行の値のユニーク数（近似モードではHyperLogLogによる推定値）
+        
+        Args:
+            column: カラム名
+            
+        Returns:
+            ユニーク数
+        """
+        query = self._cube_query() if self.approximate else None
+        if query is not None:
+            cube, cells = query
+            sketches = customer_sketches(self.origin[0], cube)
+            if sketches is not None and sketches.column == column:
+                return int(cube.distinct(cells, [], sketches)[column].sum())
+        return self[column].nunique()
+    
+    def fingerprint(self, columns: list = ()):
+        """
+        フィルター結果の識別子（データセットのバージョンと正規化したフィルター条件）
+        
+        Args:
+            columns: 集計で参照するカラム（共有データセットと同じデータであることを確認する）
+            
+        Returns:
+            識別子のタプル（フィルター条件から作られていない場合や、assignで
+            年齢層以外のカラムを追加・置き換えている場合はNone）
+        """
+        if self.origin is None or any(name != AGE_GROUP_COLUMN for name in self.extra):
+            return None
+        source, spec = self.origin
+        version = dataset_version(source, columns=[col for col in columns if col not in self.extra])
+        return None if version is None else (version, spec)
+    
+    def totals(self):
+        """
+        選択行の件数・購入金額の合計と二乗和・年齢の合計を売上キューブから取得
+        
+        Returns:
+            SalesCube.totalsの辞書（キューブで計算できない場合はNone）
+        """
+        query = self._cube_query()
+        if query is None:
+            return None
+        cube, cells = query
+        return cube.totals(cells)
+    
+    def _cube_query(self):
+        """売上キューブと、フィルター条件に一致するセル（キューブで計算できない場合はNone）"""
+        if self.origin is None or len(self) == 0:
+            return None
+        if self._cube is None:
+            source, spec = self.origin
+            cube = sales_cube(source)
+            cells = cube.select(dict(spec)) if cube is not None else None
+            self._cube = (cube, cells) if cells is not None else False
+        return self._cube or None
+
+
+def as_frame(data, columns: list = None) -> pd.DataFrame:
+    """
+    DataFrame、FilteredViewまたはSQLiteSourceをDataFrameとして取得
+    
+    FilteredView・SQLiteSourceの場合、columnsを指定すればその列だけを作成する。
+    
+    Args:
+        data: DataFrame、FilteredViewまたはSQLiteSource
+        columns: 必要なカラム（Noneの場合は全カラム）
+        
+    Returns:
+        DataFrame
+    """
+    if not isinstance(data, pd.DataFrame):
+        return data.to_frame(columns)
+    if columns is None:
+        return data
+    return data[columns]
+
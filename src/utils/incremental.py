@@ -0,0 +1,179 @@
+"""
+増分読み込みモジュール - 追記されたCSVの末尾だけを取り込む
+"""
+import hashlib
+import io
+import os
+import threading
+import pandas as pd
+from src.utils.schema import CSV_DTYPES, add_derived_columns, append_by_date, sort_by_date
+from src.utils.snapshot import read_source, is_compressed, is_streamed, load_partial_aggregates
+
+# 書き換え検知に使う先頭・境界ブロックのサイズ
+BOUNDARY_BLOCK_SIZE = 64 * 1024
+
+# 全体読み込み中に追記が続いた場合の再試行回数
+MAX_RELOAD_RETRIES = 3
+
+
+class IncrementalLoader:
+    """
+    CSVファイルの読み込み済み位置を記憶し、追記分だけを取り込むローダー
+    
+    前回読み込んだ位置（バイトオフセット）と、先頭ブロック・オフセット直前の
+    ブロックのハッシュを保持する。ファイルが追記されただけであれば末尾だけを
+    パースして連結し、書き換えられていれば全体を読み込み直す。
+    圧縮ファイル（.csv.gz等）は変更があれば常に全体を読み込み直す。
+    ストリーミング取り込みで全体を読み込んだ場合は、チャンクごとの部分集計を
+    aggregatesに保持する（追記を取り込んだ時点で破棄する）。
+    """
+    
+    def __init__(self, file_path: str):
+        self.file_path = file_path
+        self.frame = None
+        self.aggregates = None
+        self.offset = 0
+        self.mtime_ns = None
+        self.head_hash = None
+        self.boundary_hash = None
+        self._lock = threading.Lock()
+    
+    def refresh(self) -> tuple:
+        """
+        ファイルの変更を確認し、最新のDataFrameを返す
+        
+        Returns:
+            (DataFrame, 追記分のDataFrame)のタプル。
+            全体を読み込み直した場合、追記分はNone
+        """
+        with self._lock:
+            stat = os.stat(self.file_path)
+            
+            if self.frame is not None and stat.st_size == self.offset and stat.st_mtime_ns == self.mtime_ns:
+                return self.frame, self.frame.iloc[0:0]
+            
+            # 圧縮ファイルはバイト位置から途中を展開できないため、変更時は全体を読み直す
+            if self.frame is not None and not is_compressed(self.file_path) and self._is_append(stat.st_size):
+                appended = self._read_tail(stat)
+                self.aggregates = None
+                # 追記分が過去の日付を含む場合だけ、その日付以降の末尾を並べ替える
+                self.frame = append_by_date(self.frame, appended)
+                return self.frame, appended
+            
+            self._full_reload()
+            return self.frame, None
+    
+    def _is_append(self, size: int) -> bool:
+        """前回の読み込み範囲が変わらず、末尾に追記されただけかを判定"""
+        if size < self.offset:
+            return False
+        
+        with open(self.file_path, 'rb') as f:
+            head, boundary, last_byte = _read_markers(f, self.offset)
+        
+        # 最終行が改行で終わっていなければ、追記が同じ行に連結されている可能性がある
+        if last_byte != b'\n':
+            return False
+        
+        return _digest(head) == self.head_hash and _digest(boundary) == self.boundary_hash
+    
+    def _read_tail(self, stat: os.stat_result) -> pd.DataFrame:
+        """オフセット以降の完結した行だけをパース"""
+        with open(self.file_path, 'rb') as f:
+            f.seek(self.offset)
+            data = f.read(stat.st_size - self.offset)
+        
+        # 書き込み途中の最終行は次回に回す
+        end = data.rfind(b'\n') + 1
+        complete = end == len(data)
+        
+        if end > 0:
+            tail = pd.read_csv(
+                io.BytesIO(data[:end]),
+                header=None,
+                names=self.columns,
+                dtype=CSV_DTYPES
+            )
+            tail = add_derived_columns(tail)
+        else:
+            tail = self.frame.iloc[0:0]
+        
+        self._mark(self.offset + end, stat.st_mtime_ns if complete else None)
+        return tail
+    
+    def _full_reload(self) -> None:
+        """ファイル全体を読み込み直し、読み込み位置を記録"""
+        self.columns = pd.read_csv(self.file_path, nrows=0).columns.tolist()
+        
+        for _ in range(MAX_RELOAD_RETRIES):
+            before = os.stat(self.file_path)
+            frame = read_source(self.file_path)
+            aggregates = load_partial_aggregates(self.file_path) if is_streamed(self.file_path) else None
+            after = os.stat(self.file_path)
+            # 読み込み中に追記された場合は、読み込み位置が確定しないため読み直す
+            if (before.st_size, before.st_mtime_ns) == (after.st_size, after.st_mtime_ns):
+                self.frame = frame
+                self.aggregates = aggregates
+                self._mark(after.st_size, after.st_mtime_ns)
+                return
+        
+        self.aggregates = None
+        if is_compressed(self.file_path):
+            # 圧縮ファイルは途中までの展開ができないため、最後に読み込めた内容を使う
+            self.frame = frame
+            self._mark(after.st_size, None)
+            return
+        
+        # 追記が続いている場合は、その時点の完結した行までを直接パースする
+        with open(self.file_path, 'rb') as f:
+            data = f.read(after.st_size)
+        end = data.rfind(b'\n') + 1
+        self.frame = sort_by_date(add_derived_columns(pd.read_csv(io.BytesIO(data[:end]), dtype=CSV_DTYPES)))
+        self._mark(end, None)
+    
+    def _mark(self, offset: int, mtime_ns) -> None:
+        """読み込み位置と書き換え検知用のハッシュを記録"""
+        with open(self.file_path, 'rb') as f:
+            head, boundary, _ = _read_markers(f, offset)
+        self.offset = offset
+        self.mtime_ns = mtime_ns
+        self.head_hash = _digest(head)
+        self.boundary_hash = _digest(boundary)
+
+
+def _read_markers(f, offset: int) -> tuple:
+    """先頭ブロック、オフセット直前のブロック、オフセット直前の1バイトを読み込む"""
+    f.seek(0)
+    head = f.read(min(BOUNDARY_BLOCK_SIZE, offset))
+    
+    start = max(0, offset - BOUNDARY_BLOCK_SIZE)
+    f.seek(start)
+    boundary = f.read(offset - start)
+    
+    return head, boundary, boundary[-1:]
+
+
+def _digest(data: bytes) -> str:
+    """ブロックのハッシュを計算"""
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+_loaders = {}
+_loaders_lock = threading.Lock()
+
+
+def get_incremental_loader(file_path: str) -> IncrementalLoader:
+    """
+    ファイルごとに1つのIncrementalLoaderをプロセス内で共有して返す
+    
+    Args:
+        file_path: CSVファイルのパス
+        
+    Returns:
+        IncrementalLoader
+    """
+    key = os.path.abspath(file_path)
+    with _loaders_lock:
+        if key not in _loaders:
+            _loaders[key] = IncrementalLoader(file_path)
+        return _loaders[key]
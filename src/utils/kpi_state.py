@@ -0,0 +1,184 @@
+"""
+KPI状態モジュール - 追記分だけで更新でき、分割して作っても結合できるKPIの集計状態
+"""
+from dataclasses import dataclass, field
+import numpy as np
+import pandas as pd
+
+# 共有データセットの派生データとして保持する名前
+KPI_STATE_KEY = 'kpi_state'
+
+# KPIの状態が依存するカラム
+KPI_COLUMNS = ['顧客ID', '購入金額', '年齢']
+
+# 顧客IDを配列の位置として使える値の範囲（行数に対する倍率と、小さなデータ向けの下限）
+CUSTOMER_ID_SPAN_FACTOR = 4
+MIN_CUSTOMER_ID_SPAN = 1 << 20
+
+
+@dataclass
+class KPIState:
+    """
+    calculate_kpisのKPIを、合計・件数と顧客ごとの購入回数で表した集計状態
+    
+    顧客IDを位置とする購入回数の配列に加え、購入のある顧客数と2回以上購入した
+    顧客数を保持する。追記された行はupdateで追記行数に比例する時間で反映でき、
+    日別やパーティション別に作った状態はmergeで結合順序に依存せず結合できる。
+    顧客IDが0以上の整数で、値の範囲が行数に比べて大きすぎない場合に使える。
+    """
+    row_count: int = 0
+    total_amount: int = 0
+    amount_sum_sq: float = 0.0
+    age_sum: int = 0
+    customer_count: int = 0
+    repeat_count: int = 0
+    purchase_counts: np.ndarray = field(default_factory=lambda: np.zeros(0, dtype=np.int32))
+    
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame):
+        """
+        DataFrameからKPIの状態を作成
+        
+        Args:
+            df: 前処理済みのDataFrame
+            
+        Returns:
+            KPIState（顧客IDを配列の位置として使えない場合はNone）
+        """
+        state = cls()
+        return state if state.update(df) else None
+    
+    @classmethod
+    def from_aggregates(cls, aggregates):
+        """
+        ストリーミング取り込みの部分集計（PartialAggregates）からKPIの状態を作成
+        
+        顧客別統計の購入回数を使うため、明細データを参照しない。
+        
+        Args:
+            aggregates: 全チャンクを結合したPartialAggregates
+            
+        Returns:
+            KPIState（顧客IDを配列の位置として使えない場合はNone）
+        """
+        state = cls()
+        customer_ids = aggregates.customers.index.to_numpy()
+        if len(customer_ids) == 0:
+            return state
+        if not state._fits(customer_ids, aggregates.row_count):
+            return None
+        
+        purchase_counts = aggregates.customers['購入回数'].to_numpy()
+        state._reserve(int(customer_ids.max()) + 1)
+        state.purchase_counts[customer_ids] = purchase_counts
+        state.row_count = aggregates.row_count
+        state.total_amount = aggregates.total_amount
+        state.amount_sum_sq = aggregates.amount_sum_sq
+        state.age_sum = aggregates.age_sum
+        state.customer_count = len(customer_ids)
+        state.repeat_count = int((purchase_counts > 1).sum())
+        return state
+    
+    def update(self, df: pd.DataFrame) -> bool:
+        """
+        追記された行を状態に反映（追記行数に比例する時間で、状態をその場で更新）
+        
+        Args:
+            df: 追記された行のDataFrame
+            
+        Returns:
+            反映できたか（顧客IDを配列の位置として使えない場合はFalseで、状態は変更しない）
+        """
+        if df.empty:
+            return True
+        
+        customer_ids = df['顧客ID'].to_numpy()
+        if not self._fits(customer_ids, self.row_count + len(df)):
+            return False
+        
+        if self.row_count == 0:
+            # 初回は全行を数えるため、並べ替えずに顧客IDごとの件数を数える
+            all_counts = np.bincount(customer_ids)
+            ids = np.flatnonzero(all_counts)
+            counts = all_counts[ids]
+        else:
+            ids, counts = np.unique(customer_ids, return_counts=True)
+        self._reserve(int(ids[-1]) + 1)
+        before = self.purchase_counts[ids]
+        after = before + counts
+        self.purchase_counts[ids] = after
+        
+        amount = df['購入金額'].to_numpy(dtype=np.int64)
+        self.row_count += len(df)
+        self.total_amount += int(amount.sum())
+        self.amount_sum_sq += float(np.square(amount, dtype=np.float64).sum())
+        self.age_sum += int(df['年齢'].sum())
+        self.customer_count += int((before == 0).sum())
+        self.repeat_count += int(((before <= 1) & (after > 1)).sum())
+        return True
+    
+    def merge(self, other: 'KPIState') -> 'KPIState':
+        """
+        2つの状態を結合（日別・パーティション別に作った状態の統合用）
+        
+        Args:
+            other: 結合する状態
+            
+        Returns:
+            結合後のKPIState
+        """
+        size = max(len(self.purchase_counts), len(other.purchase_counts))
+        purchase_counts = np.zeros(size, dtype=np.int32)
+        purchase_counts[:len(self.purchase_counts)] += self.purchase_counts
+        purchase_counts[:len(other.purchase_counts)] += other.purchase_counts
+        
+        return KPIState(
+            row_count=self.row_count + other.row_count,
+            total_amount=self.total_amount + other.total_amount,
+            amount_sum_sq=self.amount_sum_sq + other.amount_sum_sq,
+            age_sum=self.age_sum + other.age_sum,
+            customer_count=int(np.count_nonzero(purchase_counts)),
+            repeat_count=int((purchase_counts > 1).sum()),
+            purchase_counts=purchase_counts,
+        )
+    
+    def to_kpis(self) -> dict:
+        """
+        calculate_kpisと同じ形式のKPI辞書に変換
+        
+        Returns:
+            KPI値の辞書
+        """
+        if self.row_count == 0:
+            return {
+                '総売上': 0,
+                '総顧客数': 0,
+                '平均購入金額': 0,
+                '総取引件数': 0,
+                '平均年齢': 0,
+                'リピート率': 0,
+            }
+        
+        return {
+            '総売上': self.total_amount,
+            '総顧客数': self.customer_count,
+            '平均購入金額': self.total_amount / self.row_count,
+            '総取引件数': self.row_count,
+            '平均年齢': self.age_sum / self.row_count,
+            'リピート率': (self.repeat_count / self.customer_count * 100) if self.customer_count > 0 else 0,
+        }
+    
+    def _fits(self, customer_ids: np.ndarray, n_rows: int) -> bool:
+        """顧客IDを購入回数の配列の位置として使えるかを判定"""
+        if not np.issubdtype(customer_ids.dtype, np.integer):
+            return False
+        span = max(MIN_CUSTOMER_ID_SPAN, CUSTOMER_ID_SPAN_FACTOR * n_rows)
+        return customer_ids.min() >= 0 and customer_ids.max() < span
+    
+    def _reserve(self, size: int) -> None:
+        """購入回数の配列を、size以上の長さに拡張（追記のたびに作り直さないよう倍々で確保）"""
+        if size <= len(self.purchase_counts):
+            return
+        purchase_counts = np.zeros(max(size, 2 * len(self.purchase_counts)), dtype=np.int32)
+        purchase_counts[:len(self.purchase_counts)] = self.purchase_counts
+        self.purchase_counts = purchase_counts
@@ -6,6 +6,7 @@ import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
 import streamlit as st
+from src.utils.filtered_view import as_frame
 
 def predict_sales_simple(df, days=30):
     """
@@ -24,7 +25,7 @@ def predict_sales_simple(df, days=30):
     """
     try:
         # 日別売上を集計
-        daily_sales = df.groupby(df['購入日'].dt.date)['購入金額'].sum().reset_index()
+        daily_sales = df['購入金額'].groupby(df['購入日'].dt.date).sum().reset_index()
         daily_sales.columns = ['日付', '売上']
         daily_sales['日付'] = pd.to_datetime(daily_sales['日付'])
         daily_sales = daily_sales.sort_values('日付')
@@ -100,12 +101,11 @@ def get_weekday_factor(df, weekday):
     float : 曜日係数
     """
     try:
-        df_copy = df.copy()
-        df_copy['曜日'] = df_copy['購入日'].dt.weekday
+        amounts = df['購入金額']
         
         # 曜日別の平均売上
-        weekday_avg = df_copy.groupby('曜日')['購入金額'].mean()
-        overall_avg = df_copy['購入金額'].mean()
+        weekday_avg = amounts.groupby(df['購入日'].dt.weekday).mean()
+        overall_avg = amounts.mean()
         
         if weekday in weekday_avg.index and overall_avg > 0:
             return weekday_avg[weekday] / overall_avg
@@ -179,7 +179,7 @@ def predict_customer_segment(df):
     """
     try:
         # 顧客ごとの集計
-        customer_stats = df.groupby('顧客ID').agg({
+        customer_stats = as_frame(df, ['顧客ID', '購入金額', '購入日']).groupby('顧客ID').agg({
             '購入金額': ['sum', 'mean', 'count'],
             '購入日': ['min', 'max']
         }).reset_index()
@@ -251,7 +251,7 @@ def calculate_churn_probability(df):
     """
     try:
         # 顧客ごとの統計
-        customer_stats = df.groupby('顧客ID').agg({
+        customer_stats = as_frame(df, ['顧客ID', '購入日', '購入金額']).groupby('顧客ID').agg({
             '購入日': ['min', 'max', 'count'],
             '購入金額': 'sum'
         }).reset_index()
@@ -308,6 +308,8 @@ def recommend_products(df, customer_id=None, top_n=5):
     DataFrame : 推奨商品リスト
     """
     try:
+        df = as_frame(df, ['顧客ID', '購入カテゴリー', '購入金額'])
+        
         if customer_id:
             # 特定顧客の購入履歴
             customer_purchases = df[df['顧客ID'] == customer_id]['購入カテゴリー'].unique()
@@ -323,7 +325,7 @@ def recommend_products(df, customer_id=None, top_n=5):
             recommendations = df
         
         # カテゴリー別の人気度
-        category_popularity = recommendations.groupby('購入カテゴリー').agg({
+        category_popularity = recommendations.groupby('購入カテゴリー', observed=True).agg({
             '購入金額': ['sum', 'count', 'mean']
         }).reset_index()
         
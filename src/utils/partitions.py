@@ -0,0 +1,214 @@
+"""
+パーティションモジュール - 年月単位で分割されたデータセットの管理
+"""
+import json
+import os
+import re
+import pandas as pd
+from src.utils.schema import concat_frames, sort_by_date
+from src.utils.snapshot import read_source, is_source_file, write_json_atomic
+from src.utils.streaming import PartialAggregates
+
+# パーティションファイル名から年月を取り出すパターン（例: 2024-05.csv, 年月=2024-05.csv, 2024-05.csv.gz）
+PARTITION_PATTERN = re.compile(r'(\d{4})-(\d{2})')
+
+# マニフェストのファイル名
+MANIFEST_FILE = '_manifest.json'
+
+
+def list_partitions(dir_path: str) -> list:
+    """
+    ディレクトリ内のパーティションファイルを年月順に列挙
+    
+    Args:
+        dir_path: データセットのディレクトリ
+        
+    Returns:
+        (年月, ファイルパス)のタプルのリスト
+    """
+    partitions = []
+    for name in os.listdir(dir_path):
+        match = PARTITION_PATTERN.search(name)
+        if match and is_source_file(name):
+            partitions.append((f"{match.group(1)}-{match.group(2)}", os.path.join(dir_path, name)))
+    
+    return sorted(partitions)
+
+
+def load_manifest(dir_path: str) -> dict:
+    """
+    パーティションのマニフェストを読み込み、変更のあったパーティションだけ更新
+    
+    マニフェストには行数・日付範囲・売上合計などのパーティション単位の
+    集計を保持する。サイズと更新時刻が変わっていないパーティションは
+    読み込まずに前回の値を再利用する。
+    
+    Args:
+        dir_path: データセットのディレクトリ
+        
+    Returns:
+        マニフェストの辞書
+    """
+    manifest_path = os.path.join(dir_path, MANIFEST_FILE)
+    try:
+        with open(manifest_path, encoding='utf-8') as f:
+            previous = {entry['file']: entry for entry in json.load(f)['partitions']}
+    except (OSError, ValueError, KeyError):
+        previous = {}
+    
+    entries = []
+    changed = False
+    for year_month, path in list_partitions(dir_path):
+        stat = os.stat(path)
+        name = os.path.basename(path)
+        entry = previous.get(name)
+        
+        if entry is None or entry['size'] != stat.st_size or entry['mtime_ns'] != stat.st_mtime_ns:
+            df = read_source(path)
+            entry = {
+                'file': name,
+                '年月': year_month,
+                'size': stat.st_size,
+                'mtime_ns': stat.st_mtime_ns,
+                **PartialAggregates.from_frame(df).to_dict(),
+            }
+            changed = True
+        
+        entries.append(entry)
+    
+    manifest = {'partitions': entries}
+    
+    if changed or len(entries) != len(previous):
+        try:
+            write_json_atomic(manifest_path, manifest)
+        except OSError:
+            pass
+    
+    return manifest
+
+
+def prune_partitions(manifest: dict, date_range: tuple = None) -> list:
+    """
+    日付範囲と重なるパーティションだけを選択
+    
+    Args:
+        manifest: マニフェストの辞書
+        date_range: (開始日, 終了日)のタプル（Noneの場合は全パーティション）
+        
+    Returns:
+        パーティション情報のリスト
+    """
+    entries = [entry for entry in manifest['partitions'] if entry['row_count'] > 0]
+    if not date_range:
+        return entries
+    
+    start, end = _normalize_range(date_range)
+    return [
+        entry for entry in entries
+        if pd.Timestamp(entry['min_date']) <= end and pd.Timestamp(entry['max_date']) >= start
+    ]
+
+
+def retention_range(dir_path: str, months: int = None) -> tuple:
+    """
+    最新のパーティションから遡ってmonthsか月分の日付範囲を取得
+    
+    Args:
+        dir_path: データセットのディレクトリ
+        months: 読み込む月数（Noneの場合は全期間）
+        
+    Returns:
+        (開始日, 終了日)のタプル（全期間を読み込む場合はNone）
+    """
+    partitions = list_partitions(dir_path)
+    if not months or len(partitions) <= months:
+        return None
+    
+    latest = pd.Period(partitions[-1][0], freq='M')
+    return (latest - (months - 1)).start_time, latest.end_time.normalize()
+
+
+def load_partitioned(dir_path: str, date_range: tuple = None) -> pd.DataFrame:
+    """
+    日付範囲と重なるパーティションだけを読み込み連結
+    
+    Args:
+        dir_path: データセットのディレクトリ
+        date_range: (開始日, 終了日)のタプル（Noneの場合は全期間）
+        
+    Returns:
+        前処理済みのDataFrame
+    """
+    manifest = load_manifest(dir_path)
+    frames = [
+        read_source(os.path.join(dir_path, entry['file']))
+        for entry in prune_partitions(manifest, date_range)
+    ]
+    return sort_by_date(concat_frames(frames))
+
+
+def manifest_kpis(dir_path: str, date_range: tuple = None) -> dict:
+    """
+    マニフェストを使って加算可能なKPIを計算
+    
+    日付範囲に完全に含まれるパーティションはマニフェストの集計値を使い、
+    境界をまたぐパーティションだけを読み込んで該当行を集計する。
+    顧客数・リピート率のように加算できない指標は含まない。
+    
+    Args:
+        dir_path: データセットのディレクトリ
+        date_range: (開始日, 終了日)のタプル（Noneの場合は全期間）
+        
+    Returns:
+        KPI値の辞書（総売上、平均購入金額、総取引件数、平均年齢）
+    """
+    manifest = load_manifest(dir_path)
+    start, end = _normalize_range(date_range) if date_range else (None, None)
+    
+    partials = []
+    for entry in prune_partitions(manifest, date_range):
+        if start is None or (pd.Timestamp(entry['min_date']) >= start and pd.Timestamp(entry['max_date']) <= end):
+            partial = PartialAggregates.from_dict(entry)
+        else:
+            df = read_source(os.path.join(dir_path, entry['file']))
+            df = df[(df['購入日'] >= start) & (df['購入日'] <= end)]
+            partial = PartialAggregates.from_frame(df)
+        partials.append(partial)
+    
+    totals = PartialAggregates.combine(partials)
+    if totals.row_count == 0:
+        return {'総売上': 0, '平均購入金額': 0, '総取引件数': 0, '平均年齢': 0}
+    
+    return {
+        '総売上': totals.total_amount,
+        '平均購入金額': totals.total_amount / totals.row_count,
+        '総取引件数': totals.row_count,
+        '平均年齢': totals.age_sum / totals.row_count,
+    }
+
+
+def manifest_summary(dir_path: str) -> pd.DataFrame:
+    """
+    マニフェストのパーティションごとの集計を表として取得（パーティションは読み込まない）
+    
+    Args:
+        dir_path: データセットのディレクトリ
+        
+    Returns:
+        年月・ファイル・行数・開始日・終了日・売上合計のDataFrame
+    """
+    entries = load_manifest(dir_path)['partitions']
+    return pd.DataFrame({
+        '年月': [entry['年月'] for entry in entries],
+        'ファイル': [entry['file'] for entry in entries],
+        '行数': [entry['row_count'] for entry in entries],
+        '開始日': [pd.Timestamp(entry['min_date']).date() if entry['min_date'] else None for entry in entries],
+        '終了日': [pd.Timestamp(entry['max_date']).date() if entry['max_date'] else None for entry in entries],
+        '売上合計': [entry['total_amount'] for entry in entries],
+    })
+
+
+def _normalize_range(date_range: tuple) -> tuple:
+    """日付範囲を終了日の終わりまで含むTimestampの組に変換"""
+    start, end = date_range
+    return pd.Timestamp(start), pd.Timestamp(end) + pd.Timedelta(days=1) - pd.Timedelta(1, unit='ns')
@@ -0,0 +1,191 @@
+"""
+期間比較モジュール - 直近の期間と前期間のKPIを1回のグループ集計で求めて比較する
+"""
+import numpy as np
+import pandas as pd
+from src.config import COMPARISON_PERIODS
+from src.utils.dataset_store import BoundedCache, dataset_version, derived
+from src.utils.filtered_view import FilteredView
+from src.utils.kpi_state import CUSTOMER_ID_SPAN_FACTOR, MIN_CUSTOMER_ID_SPAN
+
+# 期間の種類ごとの期間の長さ
+PERIOD_OFFSETS = {
+    'W': pd.DateOffset(weeks=1),
+    'M': pd.DateOffset(months=1),
+    'Q': pd.DateOffset(months=3),
+    'Y': pd.DateOffset(years=1),
+}
+
+# 期間比較の結果が依存するカラム
+COMPARISON_COLUMNS = ['購入日', '顧客ID', '購入金額', '年齢']
+
+# データセットのバージョンごとに保持する比較結果の上限数
+COMPARISON_CACHE_SIZE = 128
+
+# 比較するKPI
+COMPARED_KPIS = ['総売上', '総顧客数', '平均購入金額', '総取引件数', '平均年齢', 'リピート率']
+
+# 期間番号
+PREVIOUS_PERIOD = 0
+CURRENT_PERIOD = 1
+
+
+def compare_periods(df, period='M', end=None) -> dict:
+    """
+    直近の期間と、その直前の同じ長さの期間のKPIを比較
+    
+    直近の期間はend（省略時はデータの最終日）を末日とする期間の長さ分の日付、
+    前期間はその直前の同じ長さの日付とする。各行の期間番号を日付から1回で求め、
+    期間ごとの合計・件数と顧客ごとの購入回数を1回のグループ集計で計算する。
+    共有データセット（またはそのフィルター結果）の場合、結果はデータセットの
+    バージョンごとに保持し、同じ条件の再計算や他のセッションと共有する。
+    
+    Args:
+        df: DataFrameまたはFilteredView
+        period: 期間の種類（'W', 'M', 'Q', 'Y'）、またはpd.DateOffset・日数などの期間の長さ
+        end: 直近の期間の末日（省略時はデータの最終日）
+        
+    Returns:
+        比較結果の辞書（データがない場合はNone）
+        - 'current', 'previous': calculate_kpisと同じ形式の各期間のKPI
+          （display_kpi_cardsのkpis, comparison_kpisにそのまま渡せる）
+        - 'deltas': KPIごとの{'差分', '変化率'}（前期間が0の場合、変化率はNone）
+        - 'current_range', 'previous_range': 各期間の(初日, 末日)
+        - 'period_name': 前期間の表示名（display_comparison_metricsのperiod_name）
+    """
+    if df.empty:
+        return None
+    
+    # 最終日はバージョンとフィルター条件で決まるため、キャッシュのキーには指定値のまま使う
+    cache, fingerprint = _comparison_cache(df)
+    key = (fingerprint, period, None if end is None else pd.Timestamp(end))
+    cached = cache.get(key) if cache is not None else None
+    if cached is not None:
+        return cached
+    
+    last_day = (df['購入日'].max() if end is None else pd.Timestamp(end)).normalize()
+    result = _compare(df, period_bounds(last_day, period))
+    result['period_name'] = COMPARISON_PERIODS.get(period, '前期間') if isinstance(period, str) else '前期間'
+    
+    if cache is not None:
+        result = cache.put(key, result)
+    return result
+
+
+def period_bounds(last_day: pd.Timestamp, period) -> tuple:
+    """
+    前期間の初日・直近の期間の初日・直近の期間の翌日を求める
+    
+    Args:
+        last_day: 直近の期間の末日
+        period: 期間の種類、または期間の長さ
+        
+    Returns:
+        (前期間の初日, 直近の期間の初日, 直近の期間の翌日)のタプル
+    """
+    offset = _period_offset(period)
+    stop = last_day + pd.Timedelta(days=1)
+    current_start = stop - offset
+    previous_start = current_start - offset
+    return previous_start, current_start, stop
+
+
+def _period_offset(period):
+    """期間の種類・日数・文字列の頻度を期間の長さに変換"""
+    if isinstance(period, str):
+        if period in PERIOD_OFFSETS:
+            return PERIOD_OFFSETS[period]
+        return pd.tseries.frequencies.to_offset(period)
+    if isinstance(period, (int, np.integer)):
+        return pd.Timedelta(days=int(period))
+    return period
+
+
+def _compare(df, bounds: tuple) -> dict:
+    """日付で求めた期間番号ごとにKPIを集計し、比較結果を作成"""
+    dates = df['購入日'].to_numpy()
+    previous_start, current_start, stop = np.array(bounds, dtype=dates.dtype)
+    in_window = (dates >= previous_start) & (dates < stop)
+    # 期間番号（PREVIOUS_PERIOD, CURRENT_PERIOD）
+    periods = (dates[in_window] >= current_start).astype(np.int64)
+    
+    # 期間ごとの件数・合計（購入金額・年齢）
+    counts = np.bincount(periods, minlength=2)
+    amounts = df['購入金額'].to_numpy()[in_window]
+    amount_sums = np.bincount(periods, weights=amounts, minlength=2)
+    age_sums = np.bincount(periods, weights=df['年齢'].to_numpy()[in_window], minlength=2)
+    
+    # (顧客, 期間)ごとの購入回数から、期間ごとの顧客数とリピート顧客数（並べ替えずに数える）
+    customer_codes = _customer_codes(df['顧客ID'].to_numpy()[in_window])
+    n_codes = int(customer_codes.max()) + 1 if len(customer_codes) else 0
+    purchases = np.bincount(customer_codes * 2 + periods, minlength=2 * n_codes).reshape(n_codes, 2)
+    customer_counts = (purchases > 0).sum(axis=0)
+    repeat_counts = (purchases > 1).sum(axis=0)
+    
+    kpis = {}
+    for number in (PREVIOUS_PERIOD, CURRENT_PERIOD):
+        n_rows = int(counts[number])
+        if n_rows == 0:
+            kpis[number] = dict.fromkeys(COMPARED_KPIS, 0)
+            continue
+        total = amount_sums[number]
+        customers, repeaters = int(customer_counts[number]), int(repeat_counts[number])
+        kpis[number] = {
+            '総売上': int(round(total)) if np.issubdtype(amounts.dtype, np.integer) else total,
+            '総顧客数': customers,
+            '平均購入金額': total / n_rows,
+            '総取引件数': n_rows,
+            '平均年齢': age_sums[number] / n_rows,
+            'リピート率': (repeaters / customers * 100) if customers > 0 else 0,
+        }
+    
+    current, previous = kpis[CURRENT_PERIOD], kpis[PREVIOUS_PERIOD]
+    deltas = {}
+    for name in COMPARED_KPIS:
+        change = current[name] - previous[name]
+        deltas[name] = {
+            '差分': change,
+            '変化率': (change / previous[name] * 100) if previous[name] > 0 else None,
+        }
+    
+    previous_start, current_start, stop = bounds
+    one_day = pd.Timedelta(days=1)
+    return {
+        'current': current,
+        'previous': previous,
+        'deltas': deltas,
+        'current_range': (current_start, stop - one_day),
+        'previous_range': (previous_start, current_start - one_day),
+    }
+
+
+def _customer_codes(customer_ids: np.ndarray) -> np.ndarray:
+    """
+    顧客IDを0以上の整数のコードに変換（値の範囲が行数に比べて小さい整数IDはそのまま使う）
+    """
+    if np.issubdtype(customer_ids.dtype, np.integer) and len(customer_ids):
+        span = max(MIN_CUSTOMER_ID_SPAN, CUSTOMER_ID_SPAN_FACTOR * len(customer_ids))
+        if customer_ids.min() >= 0 and customer_ids.max() < span:
+            return customer_ids.astype(np.int64)
+    codes, _ = pd.factorize(customer_ids)
+    return codes.astype(np.int64)
+
+
+def _comparison_cache(df) -> tuple:
+    """
+    共有データセットのバージョンごとの比較結果のキャッシュ（BoundedCache）と、フィルター結果の識別子
+    （共有データセットでない場合は(None, None)）
+    """
+    if isinstance(df, FilteredView):
+        fingerprint = df.fingerprint(COMPARISON_COLUMNS)
+        source = df.origin[0] if fingerprint is not None else None
+    else:
+        fingerprint = dataset_version(df, COMPARISON_COLUMNS)
+        source = df
+    if fingerprint is None:
+        return None, None
+    
+    comparisons = derived(
+        source, 'period_comparisons', lambda frame: BoundedCache(COMPARISON_CACHE_SIZE), columns=COMPARISON_COLUMNS
+    )
+    return comparisons, fingerprint
@@ -0,0 +1,428 @@
+"""
+クエリプランナーモジュール - フィルター条件の評価順序を列の統計から決める
+"""
+from dataclasses import dataclass, field
+import numpy as np
+import pandas as pd
+from src.config import CATEGORY_FILTER_COLUMNS
+from src.utils.bitmap_index import BitmapIndex, byte_range, unpack_bits
+from src.utils.dataset_store import derived
+from src.utils.date_index import build_date_index
+
+# プランの統計が依存するカラム
+PLANNED_COLUMNS = ['購入日', '年齢'] + list(CATEGORY_FILTER_COLUMNS.values())
+
+# 残る行の推定割合がこれを下回ったら、以降の条件は候補行だけで評価する
+SPARSE_FRACTION = 1 / 64
+
+# 条件の評価方式
+METHOD_BITMAP = 'ビットマップ'
+METHOD_SCAN = '行範囲を走査'
+METHOD_CANDIDATES = '候補行だけ評価'
+METHOD_REUSED = 'キャッシュを再利用'
+
+# フィルターのキーごとの表示名
+FILTER_LABELS = {
+    'date_range': '期間',
+    'regions': '地域',
+    'genders': '性別',
+    'categories': '購入カテゴリー',
+    'payment_methods': '支払方法',
+    'age_range': '年齢',
+}
+
+
+class ColumnStats:
+    """
+    プランの作成に使う列の統計（カテゴリー列・年齢の値ごとの件数、日付の範囲）
+    
+    プランは再実行のたびに作るため、件数は辞書と累積件数の配列で保持し、
+    選択率をpandasの処理を介さずに求められるようにする。
+    """
+    
+    def __init__(self, df: pd.DataFrame):
+        self.n_rows = len(df)
+        # {カラム名: {値: 件数}}（件数0の値は含まない）
+        self.value_counts = {column: _value_counts(df[column]) for column in CATEGORY_FILTER_COLUMNS.values()}
+        ages = df['年齢'].value_counts().sort_index()
+        self.ages = ages.index.to_numpy()
+        self.age_cumulative = np.concatenate([[0], np.cumsum(ages.to_numpy())])
+        self.date_bounds = (df['購入日'].min(), df['購入日'].max()) if self.n_rows > 0 else (None, None)
+    
+    def age_rows(self, min_age: int, max_age: int) -> int:
+        """年齢が範囲内の行数"""
+        lower = np.searchsorted(self.ages, min_age, 'left')
+        upper = np.searchsorted(self.ages, max_age, 'right')
+        return int(self.age_cumulative[upper] - self.age_cumulative[lower])
+
+
+@dataclass
+class Predicate:
+    """評価する1つのフィルター条件"""
+    key: str
+    column: str
+    value: tuple
+    selectivity: float
+    method: str = ''
+
+
+@dataclass
+class FilterPlan:
+    """
+    フィルター条件の実行計画
+    
+    日付範囲は日付インデックスで行範囲（window）に変換する。残りの条件は、
+    ビットセットのまま合成できるビットマップ条件を先に、それ以外の条件を
+    後に、それぞれ推定選択率の小さい順（絞り込みの強い順）に評価する。
+    """
+    n_rows: int
+    window: tuple
+    predicates: list = field(default_factory=list)
+    eliminated: list = field(default_factory=list)
+    is_empty: bool = False
+    # 条件別ビットセットキャッシュから再利用できる条件のキー
+    cached: list = field(default_factory=list)
+    # execute_planが実際に評価した(条件のキー, 方式)（キャッシュを再利用した条件はMETHOD_REUSED）
+    executed: list = field(default_factory=list)
+    
+    @property
+    def window_rows(self) -> int:
+        """日付範囲の行数"""
+        return self.window[1] - self.window[0]
+    
+    def estimated_rows(self) -> int:
+        """結果の推定行数（条件間の独立を仮定）"""
+        if self.is_empty:
+            return 0
+        return int(round(self.window_rows * np.prod([predicate.selectivity for predicate in self.predicates])))
+    
+    def to_frame(self) -> pd.DataFrame:
+        """
+        評価順の各段階を表にまとめる（デバッグ表示用）
+        
+        Returns:
+            順序・条件・方式・推定選択率・推定件数・再利用のDataFrame
+        """
+        steps = []
+        if self.window_rows < self.n_rows or self.is_empty:
+            steps.append({
+                '順序': 1,
+                '条件': FILTER_LABELS['date_range'],
+                '方式': '日付インデックス（二分探索）',
+                '推定選択率': self.window_rows / self.n_rows if self.n_rows > 0 else 0.0,
+                '推定件数': self.window_rows,
+                '再利用': '',
+            })
+        
+        remaining = self.window_rows
+        for predicate in self.predicates:
+            remaining *= predicate.selectivity
+            steps.append({
+                '順序': len(steps) + 1,
+                '条件': FILTER_LABELS.get(predicate.key, predicate.key),
+                '方式': predicate.method,
+                '推定選択率': predicate.selectivity,
+                '推定件数': int(round(remaining)),
+                '再利用': '✓' if predicate.key in self.cached else '',
+            })
+        
+        return pd.DataFrame(steps, columns=['順序', '条件', '方式', '推定選択率', '推定件数', '再利用'])
+
+
+def plan_filters(df: pd.DataFrame, filters: dict) -> FilterPlan:
+    """
+    フィルター条件の実行計画を作成
+    
+    列の統計から、全行に一致する条件（全ての値を選択したカテゴリー条件や
+    データ全体を含む範囲）を除き、一致する行がない条件があれば結果を空とする。
+    残った条件は評価方式ごとに推定選択率の小さい順に並べ、残る行の推定割合が
+    SPARSE_FRACTIONを下回った後の条件は候補行だけで評価する。
+    
+    Args:
+        df: 元のDataFrame
+        filters: フィルター条件の辞書
+        
+    Returns:
+        FilterPlan
+    """
+    stats = derived(df, 'column_stats', ColumnStats, columns=PLANNED_COLUMNS) or ColumnStats(df)
+    n_rows = stats.n_rows
+    plan = FilterPlan(n_rows=n_rows, window=(0, n_rows))
+    
+    if filters.get('date_range'):
+        _plan_date_range(df, plan, stats, filters['date_range'])
+    
+    for key, column in CATEGORY_FILTER_COLUMNS.items():
+        if not filters.get(key):
+            continue
+        counts = stats.value_counts[column]
+        selected = tuple(sorted(set(filters[key]), key=str))
+        matched = sum(counts.get(value, 0) for value in selected)
+        if all(value in selected for value in counts):
+            plan.eliminated.append((key, '全ての値を選択'))
+        elif matched == 0:
+            plan.eliminated.append((key, '一致する値なし'))
+            plan.is_empty = True
+        else:
+            plan.predicates.append(Predicate(key, column, selected, matched / n_rows))
+    
+    if filters.get('age_range'):
+        min_age, max_age = (int(value) for value in filters['age_range'])
+        ages = stats.ages
+        if len(ages) == 0 or (min_age <= ages[0] and max_age >= ages[-1]):
+            plan.eliminated.append(('age_range', 'データ全体の範囲'))
+        else:
+            matched = stats.age_rows(min_age, max_age)
+            if matched == 0:
+                plan.eliminated.append(('age_range', '範囲内のデータなし'))
+                plan.is_empty = True
+            else:
+                plan.predicates.append(Predicate('age_range', '年齢', (min_age, max_age), matched / n_rows))
+    
+    plan.is_empty = plan.is_empty or plan.window_rows == 0
+    
+    index = derived(df, 'bitmap_index', BitmapIndex, columns=list(CATEGORY_FILTER_COLUMNS.values()))
+    for predicate in plan.predicates:
+        if index is not None and index.covers(predicate.column):
+            predicate.method = METHOD_BITMAP
+    plan.predicates.sort(key=lambda predicate: (predicate.method != METHOD_BITMAP, predicate.selectivity))
+    
+    remaining = 1.0
+    for predicate in plan.predicates:
+        if predicate.method != METHOD_BITMAP:
+            predicate.method = METHOD_CANDIDATES if remaining < SPARSE_FRACTION else METHOD_SCAN
+        remaining *= predicate.selectivity
+    
+    return plan
+
+
+def execute_plan(df: pd.DataFrame, plan: FilterPlan, masks=None):
+    """
+    実行計画に沿って条件を評価し、一致する行の行番号を取得
+    
+    ビットマップ条件はビットセットのまま列間ANDで合成し、他の条件は日付範囲の
+    行範囲を走査して真偽値マスクに合成する。候補行だけで評価する条件に
+    達したら、マスクを行番号に変換して以降はその行だけを評価する。
+    どの段階でも候補行がなくなった時点で打ち切る。
+    
+    masksを指定した場合は、条件ごとの全行分のビットセットをキャッシュから
+    取り出して合成し、キャッシュにない（選択値が変わった）条件だけを評価する。
+    
+    Args:
+        df: 元のDataFrame
+        plan: plan_filtersで作成した実行計画
+        masks: 条件別ビットセットキャッシュ（PredicateMaskCache）
+        
+    Returns:
+        行番号の配列（日付範囲だけで決まる場合は行範囲のslice）
+    """
+    start, stop = plan.window
+    dtype = np.int32 if len(df) <= np.iinfo(np.int32).max else np.int64
+    empty = np.empty(0, dtype=dtype)
+    
+    if plan.is_empty:
+        return empty
+    if not plan.predicates:
+        return slice(start, stop)
+    if masks is not None:
+        return _execute_with_masks(df, plan, masks, dtype)
+    
+    index = None
+    bits = None
+    mask = None
+    rows = None
+    
+    for predicate in plan.predicates:
+        if predicate.method == METHOD_BITMAP:
+            index = index or derived(df, 'bitmap_index', BitmapIndex, columns=[predicate.column])
+            column_bits = index.column_bits(predicate.column, predicate.value, start, stop)
+            plan.executed.append((predicate.key, predicate.method))
+            if column_bits is None:
+                continue
+            if bits is None:
+                bits = column_bits
+            else:
+                np.bitwise_and(bits, column_bits, out=bits)
+            if not bits.any():
+                return empty
+            continue
+        
+        if bits is not None:
+            mask = index.to_mask(bits, start, stop)
+            bits = None
+        
+        plan.executed.append((predicate.key, predicate.method))
+        if predicate.method == METHOD_CANDIDATES:
+            if rows is None:
+                rows = _positions(mask, start, stop, dtype)
+                mask = None
+            rows = rows[_evaluate(df, predicate, rows)]
+            if len(rows) == 0:
+                return empty
+        else:
+            column_mask = _evaluate(df, predicate, slice(start, stop))
+            mask = column_mask if mask is None else np.logical_and(mask, column_mask, out=mask)
+            if not mask.any():
+                return empty
+    
+    if rows is not None:
+        return rows
+    if bits is not None:
+        mask = index.to_mask(bits, start, stop)
+    return _positions(mask, start, stop, dtype)
+
+
+def _execute_with_masks(df: pd.DataFrame, plan: FilterPlan, masks, dtype) -> np.ndarray:
+    """
+    条件別ビットセットキャッシュを使って実行計画を評価
+    
+    ビットマップ条件は全行分のビットセットを、行範囲を走査する条件は日付範囲を
+    含むバイト範囲のビットセットをキャッシュに登録して再利用する。候補行だけで
+    評価する条件は、キャッシュを使わずにそれまでに残った行だけで評価する。
+    """
+    start, stop = plan.window
+    first, last = byte_range(start, stop)
+    empty = np.empty(0, dtype=dtype)
+    bits = None
+    rows = None
+    
+    for predicate in plan.predicates:
+        if predicate.method == METHOD_CANDIDATES:
+            if rows is None:
+                rows = _positions(None if bits is None else unpack_bits(bits, start, stop), start, stop, dtype)
+                bits = None
+            rows = rows[_evaluate(df, predicate, rows)]
+            plan.executed.append((predicate.key, predicate.method))
+            if len(rows) == 0:
+                return empty
+            continue
+        
+        key = mask_key(plan, predicate)
+        column_bits = masks.get(predicate.key, key)
+        if column_bits is None:
+            column_bits = _predicate_bits(df, predicate, first, last)
+            masks.put(predicate.key, key, column_bits)
+            plan.executed.append((predicate.key, predicate.method))
+        else:
+            plan.executed.append((predicate.key, METHOD_REUSED))
+        
+        # ビットマップ条件のビットセットは全行分のため、日付範囲のバイト範囲を取り出す
+        if predicate.method == METHOD_BITMAP:
+            column_bits = column_bits[first:last]
+        if bits is None:
+            bits = column_bits.copy()
+        else:
+            np.bitwise_and(bits, column_bits, out=bits)
+        if not bits.any():
+            return empty
+    
+    if rows is not None:
+        return rows
+    return _positions(unpack_bits(bits, start, stop), start, stop, dtype)
+
+
+def mask_key(plan: FilterPlan, predicate: Predicate):
+    """
+    条件別ビットセットキャッシュで条件のビットセットを識別する値
+    
+    ビットマップ条件のビットセットは全行分のため選択値だけで識別し、日付範囲が
+    変わっても再利用する。行範囲を走査する条件は日付範囲内だけを評価するため、
+    選択値と日付範囲の組で識別する。
+    
+    Args:
+        plan: 実行計画
+        predicate: 計画内の条件
+        
+    Returns:
+        キャッシュのキーに使う値
+    """
+    if predicate.method == METHOD_BITMAP:
+        return predicate.value
+    return predicate.value, plan.window
+
+
+def _predicate_bits(df: pd.DataFrame, predicate: Predicate, first: int, last: int) -> np.ndarray:
+    """
+    条件に一致する行のビットセット
+    
+    ビットマップ条件は全行分、それ以外の条件はバイト範囲[first, last)に
+    含まれる行だけを評価したビットセットを返す。
+    """
+    if predicate.method == METHOD_BITMAP:
+        index = derived(df, 'bitmap_index', BitmapIndex, columns=[predicate.column])
+        if index is not None:
+            bits = index.column_bits(predicate.column, predicate.value)
+            if bits is not None:
+                return bits
+        return np.packbits(_evaluate(df, predicate, slice(0, len(df))))
+    return np.packbits(_evaluate(df, predicate, slice(first * 8, min(last * 8, len(df)))))
+
+
+def _positions(mask, start: int, stop: int, dtype) -> np.ndarray:
+    """行範囲[start, stop)のマスクを行番号の配列に変換（マスクがNoneの場合は範囲全体）"""
+    if mask is None:
+        return np.arange(start, stop, dtype=dtype)
+    rows = np.flatnonzero(mask).astype(dtype, copy=False)
+    if start:
+        rows += start
+    return rows
+
+
+def _plan_date_range(df: pd.DataFrame, plan: FilterPlan, stats: ColumnStats, date_range) -> None:
+    """日付範囲を行範囲または比較条件として計画に加える"""
+    start_date, end_date = (pd.Timestamp(value) for value in date_range)
+    min_date, max_date = stats.date_bounds
+    
+    if min_date is None or (start_date <= min_date.normalize() and end_date >= max_date.normalize()):
+        plan.eliminated.append(('date_range', 'データ全体の期間'))
+        return
+    
+    date_index = derived(df, 'date_index', build_date_index, columns=['購入日'])
+    if date_index is not None:
+        plan.window = date_index.slice(start_date, end_date)
+        return
+    
+    # 日付順でないフレームは期間の長さの比から選択率を見積もる
+    span = (max_date - min_date).days + 1
+    covered = (min(end_date, max_date) - max(start_date, min_date)).days + 1
+    if end_date < min_date.normalize() or start_date > max_date:
+        plan.eliminated.append(('date_range', '期間内のデータなし'))
+        plan.is_empty = True
+        return
+    plan.predicates.append(Predicate(
+        'date_range', '購入日', (start_date, end_date),
+        min(max(covered / span, 0.0), 1.0)
+    ))
+
+
+def _evaluate(df: pd.DataFrame, predicate: Predicate, rows) -> np.ndarray:
+    """指定行（sliceまたは行番号の配列）で条件を評価した真偽値マスク"""
+    series = df[predicate.column]
+    
+    if predicate.key == 'date_range':
+        dates = series.to_numpy()[rows]
+        start_date, end_date = predicate.value
+        return (dates >= start_date.to_datetime64()) & (dates <= end_date.to_datetime64())
+    
+    if predicate.key == 'age_range':
+        ages = series.to_numpy()[rows]
+        min_age, max_age = predicate.value
+        return (ages >= min_age) & (ages <= max_age)
+    
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        # コード→選択有無の表を引く（末尾の要素は欠損値のコード-1に対応）
+        categories = series.cat.categories
+        allowed = np.zeros(len(categories) + 1, dtype=bool)
+        allowed[:-1] = categories.isin(predicate.value)
+        return allowed[series.array.codes[rows]]
+    
+    return series.iloc[rows].isin(predicate.value).to_numpy()
+
+
+def _value_counts(series: pd.Series) -> dict:
+    """値ごとの件数（カテゴリー型はコードのbincountで数える）"""
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        codes = series.array.codes
+        counts = np.bincount(codes[codes >= 0], minlength=len(series.cat.categories))
+        return {value: int(count) for value, count in zip(series.cat.categories, counts) if count > 0}
+    return {value: int(count) for value, count in series.value_counts().items()}
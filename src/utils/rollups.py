@@ -0,0 +1,224 @@
+"""
+期間ロールアップモジュール - 日別の基本集計から週・月・四半期・年の集計を作る
+"""
+import threading
+import numpy as np
+import pandas as pd
+from src.config import DISTINCT_SKETCH_PRECISION
+from src.utils.calendar_dim import EPOCH, to_day_id
+from src.utils.dataset_store import BoundedCache, derived
+from src.utils.distinct_sketch import estimate_cardinality, hash_values, register_ranks
+from src.utils.filtered_view import FilteredView
+
+# 日別の基本集計が依存するカラム
+ROLLUP_COLUMNS = ['購入日', '購入金額', '顧客ID']
+
+# 期間の種類ごとの(Periodの頻度, resampleの頻度)。ラベルはresampleと同じく各期間の末日
+PERIOD_FREQUENCIES = {
+    'D': ('D', 'D'),
+    'W': ('W-SUN', 'W-SUN'),
+    'M': ('M', 'ME'),
+    'Q': ('Q-DEC', 'QE-DEC'),
+    'Y': ('Y-DEC', 'YE-DEC'),
+}
+
+# データセットのバージョンごとに保持するフィルター結果の日別集計の上限サイズ（合計バイト数）
+ROLLUP_CACHE_MAX_BYTES = 64 * 1024 * 1024
+
+
+class DailyRollup:
+    """
+    日別の基本集計（件数・購入金額の合計と二乗和・顧客数）
+    
+    日ごとの集計値に加え、日・顧客の組を重複なく日付順に並べた顧客コードを保持する。
+    週・月・四半期・年の集計は日付順に連続する日の範囲の再集計になるため、期間の
+    切り替えは日数に比例する時間で済む。正確な顧客数は期間の種類ごとに1度だけ
+    日・顧客の組から数えて保持し、近似モードでは日ごとの顧客IDのHyperLogLog
+    スケッチの統合で推定する。スケッチは近似モードで初めて使う時に日・顧客の組から作る。
+    """
+    
+    def __init__(self, df: pd.DataFrame, precision: int = DISTINCT_SKETCH_PRECISION):
+        # 日付IDの値の範囲は狭いため、並べ替えずに日の番号を求める
+        day_ids = to_day_id(df['購入日'])
+        first_day = int(day_ids.min()) if len(day_ids) else 0
+        offsets = day_ids - first_day
+        present = np.bincount(offsets) > 0
+        self.days = np.flatnonzero(present).astype(np.int32) + first_day
+        day_index = (np.cumsum(present) - 1)[offsets]
+        n_days = len(self.days)
+        
+        amounts = df['購入金額'].to_numpy()
+        self.amount_dtype = amounts.dtype
+        self.count = np.bincount(day_index, minlength=n_days)
+        self.sum = np.bincount(day_index, weights=amounts, minlength=n_days)
+        self.sumsq = np.bincount(day_index, weights=np.square(amounts, dtype=np.float64), minlength=n_days)
+        
+        # 日・顧客の組を重複なく日付順に並べる
+        customer_codes, self.customer_ids = pd.factorize(df['顧客ID'])
+        self.n_customers = int(customer_codes.max()) + 1 if len(customer_codes) else 0
+        pairs = _distinct(day_index.astype(np.int64) * max(self.n_customers, 1) + customer_codes)
+        self.customer_codes = (pairs % max(self.n_customers, 1)).astype(np.int32)
+        self.customers = np.bincount(pairs // max(self.n_customers, 1), minlength=n_days)
+        
+        self.precision = precision
+        self.n_registers = 1 << precision
+        
+        # 期間の種類ごとの正確な顧客数と日ごとのスケッチ（全セッションで共有するためロックで保護する）
+        self._exact_customers = {}
+        self._registers = None
+        self._lock = threading.Lock()
+    
+    @property
+    def nbytes(self) -> int:
+        """保持している配列の合計バイト数（作成済みのスケッチ・顧客数を含む）"""
+        arrays = [self.days, self.count, self.sum, self.sumsq, self.customer_codes, self.customers]
+        with self._lock:
+            arrays += list(self._exact_customers.values())
+            if self._registers is not None:
+                arrays.append(self._registers)
+        return sum(array.nbytes for array in arrays) + self.customer_ids.nbytes
+    
+    @property
+    def registers(self) -> np.ndarray:
+        """
+        日ごとの顧客IDのHyperLogLogスケッチ（(日数, レジスタ数)の配列）
+        
+        初回の参照時に、重複を除いた日・顧客の組から作る（行から作る場合と同じレジスタになる）。
+        """
+        with self._lock:
+            registers = self._registers
+        if registers is None:
+            customer_registers, customer_ranks = register_ranks(hash_values(self.customer_ids), self.precision)
+            pair_days = np.repeat(np.arange(len(self.days)), self.customers)
+            registers = np.zeros((len(self.days), self.n_registers), dtype=np.uint8)
+            np.maximum.at(
+                registers, (pair_days, customer_registers[self.customer_codes]), customer_ranks[self.customer_codes]
+            )
+            registers.flags.writeable = False
+            with self._lock:
+                if self._registers is None:
+                    self._registers = registers
+                registers = self._registers
+        return registers
+    
+    def rollup(self, period: str = 'M', approximate: bool = False) -> pd.DataFrame:
+        """
+        期間ごとの集計（aggregate_by_periodと同じ形式）
+        
+        Args:
+            period: 集計期間（'D', 'W', 'M'/'ME', 'Q'/'QE', 'Y'/'YE'）
+            approximate: 顧客数をスケッチから推定するか
+            
+        Returns:
+            日付・総売上・平均購入金額・取引件数・顧客数のDataFrame（取引のない期間も含む）
+        """
+        key = period[0].upper()
+        period_freq = PERIOD_FREQUENCIES[key][0]
+        if len(self.days) == 0:
+            return pd.DataFrame(columns=['日付', '総売上', '平均購入金額', '取引件数', '顧客数'])
+        
+        # 日付順に並んだ日を期間ごとの連続範囲に分ける
+        dates = pd.DatetimeIndex(EPOCH + self.days.astype('timedelta64[D]'))
+        labels = dates.to_period(period_freq).end_time.normalize()
+        starts = np.flatnonzero(np.append(True, labels[1:] != labels[:-1]))
+        
+        counts = np.add.reduceat(self.count, starts)
+        sums = np.add.reduceat(self.sum, starts)
+        if approximate and key != 'D':
+            customers = np.rint(estimate_cardinality(np.maximum.reduceat(self.registers, starts, axis=0))).astype(np.int64)
+        else:
+            customers = self._customers(key, starts)
+        
+        result = pd.DataFrame({
+            '日付': labels[starts],
+            '総売上': sums.astype(np.int64) if np.issubdtype(self.amount_dtype, np.integer) else sums,
+            '平均購入金額': sums / counts,
+            '取引件数': counts.astype(np.int64),
+            '顧客数': customers.astype(np.int64),
+        })
+        
+        return fill_empty_periods(result, period)
+    
+    def _customers(self, key: str, starts: np.ndarray) -> np.ndarray:
+        """期間ごとの正確な顧客数（期間の種類ごとに1度だけ数える）"""
+        if key == 'D':
+            return self.customers
+        with self._lock:
+            customers = self._exact_customers.get(key)
+        if customers is None:
+            # 各期間に属する日・顧客の組から、期間・顧客の組を重複なく数える
+            day_periods = np.repeat(np.arange(len(starts)), np.diff(np.append(starts, len(self.days))))
+            pair_periods = np.repeat(day_periods, self.customers)
+            keys = _distinct(pair_periods.astype(np.int64) * max(self.n_customers, 1) + self.customer_codes)
+            customers = np.bincount(keys // max(self.n_customers, 1), minlength=len(starts))
+            customers.flags.writeable = False
+            with self._lock:
+                customers = self._exact_customers.setdefault(key, customers)
+        return customers
+
+
+def fill_empty_periods(result: pd.DataFrame, period: str) -> pd.DataFrame:
+    """
+    期間別集計に、取引のない期間を0件の行として補う（resampleと同じ）
+    
+    Args:
+        result: 日付（各期間の末日）の昇順に並んだaggregate_by_period形式のDataFrame
+        period: 集計期間（'D', 'W', 'M'/'ME', 'Q'/'QE', 'Y'/'YE'）
+        
+    Returns:
+        先頭から末尾までの全期間を含むDataFrame（平均購入金額は取引のない期間でNaN）
+    """
+    if result.empty:
+        return result
+    
+    resample_freq = PERIOD_FREQUENCIES[period[0].upper()][1]
+    full_range = pd.date_range(result['日付'].iloc[0], result['日付'].iloc[-1], freq=resample_freq)
+    if len(full_range) == len(result):
+        return result
+    
+    result = result.set_index('日付').reindex(full_range).rename_axis('日付').reset_index()
+    for column in ['総売上', '取引件数', '顧客数']:
+        result[column] = result[column].fillna(0).astype(np.int64)
+    return result
+
+
+def _distinct(values: np.ndarray) -> np.ndarray:
+    """整数の配列を並べ替えて重複を除く"""
+    values = np.sort(values)
+    return values[np.append(True, values[1:] != values[:-1])] if len(values) else values
+
+
+def daily_rollup(df) -> DailyRollup:
+    """
+    日別の基本集計を取得
+    
+    共有データセットではバージョンごとに1度だけ作成し、全セッションで共有する。
+    フィルター結果はデータセットのバージョンごとに、フィルター条件ごとに保持する。
+    
+    Args:
+        df: DataFrameまたはFilteredView
+        
+    Returns:
+        DailyRollup
+    """
+    if isinstance(df, FilteredView):
+        fingerprint = df.fingerprint(ROLLUP_COLUMNS)
+        if fingerprint is None:
+            return DailyRollup(df[ROLLUP_COLUMNS])
+        if len(df) < len(df.origin[0]):
+            rollups = derived(
+                df.origin[0], 'daily_rollups',
+                lambda frame: BoundedCache(max_bytes=ROLLUP_CACHE_MAX_BYTES, sizeof=lambda rollup: rollup.nbytes),
+                columns=ROLLUP_COLUMNS,
+            )
+            rollup = rollups.get(fingerprint) if rollups is not None else None
+            if rollup is None:
+                rollup = DailyRollup(df[ROLLUP_COLUMNS])
+                if rollups is not None:
+                    rollup = rollups.put(fingerprint, rollup)
+            return rollup
+        # 全行を選択したフィルター結果は、共有データセットの日別集計を使う
+        df = df.origin[0]
+    
+    rollup = derived(df, 'daily_rollup', DailyRollup, columns=ROLLUP_COLUMNS)
+    return rollup if rollup is not None else DailyRollup(df)
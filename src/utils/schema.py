@@ -0,0 +1,144 @@
+"""
+データスキーマモジュール - カラム型定義と派生カラムの計算
+"""
+import numpy as np
+import pandas as pd
+from src.config import CATEGORICAL_COLUMNS
+from src.utils.calendar_dim import to_day_id, gather_calendar
+
+# CSV読み込み時のカラム型
+CSV_DTYPES = {
+    **{col: 'category' for col in CATEGORICAL_COLUMNS},
+    '年齢': 'int8',
+}
+
+# カレンダーから引き当てて保持する日付属性
+DERIVED_DATE_COLUMNS = ['年月', '年', '月', '曜日', '曜日_日本語', '四半期']
+
+
+def add_derived_columns(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    購入日から日付関連の派生カラムを追加し、カラム型を整える
+    
+    日付属性はカレンダーディメンションで日付ごとに一度だけ計算し、
+    各行には日付IDを保持して属性を引き当てる。文字列の派生カラムは
+    カテゴリー型、数値カラムは値域に合わせてダウンキャストする。
+    
+    Args:
+        df: 読み込み直後のDataFrame
+        
+    Returns:
+        派生カラムが追加されたDataFrame
+    """
+    # 日付型に変換
+    df['購入日'] = pd.to_datetime(df['購入日'])
+    
+    # 購入金額は値域に応じてint32またはint64
+    df['購入金額'] = _downcast_amount(df['購入金額'])
+    
+    # 日付IDを追加し、年月・年・月・曜日・四半期をカレンダーから引き当てる
+    df['日付ID'] = to_day_id(df['購入日'])
+    attributes = gather_calendar(df['日付ID'].to_numpy(), DERIVED_DATE_COLUMNS)
+    for col in DERIVED_DATE_COLUMNS:
+        df[col] = attributes[col]
+    
+    return df
+
+
+def _downcast_amount(series: pd.Series) -> pd.Series:
+    """
+    購入金額をint32に収まればint32、収まらなければint64に変換
+    
+    Args:
+        series: 購入金額のSeries
+        
+    Returns:
+        変換後のSeries
+    """
+    int32_info = np.iinfo(np.int32)
+    if series.empty or (series.min() >= int32_info.min and series.max() <= int32_info.max):
+        return series.astype('int32')
+    return series.astype('int64')
+
+
+def sort_by_date(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    購入日の昇順に並べ替え
+    
+    日付範囲を二分探索で切り出せるよう、データセットは購入日順に保持する。
+    既に並んでいる場合は並べ替えずにそのまま返す。
+    
+    Args:
+        df: DataFrame
+        
+    Returns:
+        購入日順のDataFrame
+    """
+    if df.empty or df['購入日'].is_monotonic_increasing:
+        return df
+    return df.sort_values('購入日', kind='stable', ignore_index=True)
+
+
+def append_by_date(df: pd.DataFrame, appended: pd.DataFrame) -> pd.DataFrame:
+    """
+    購入日順のDataFrameに追記分を連結し、購入日順を保つ
+    
+    追記分が既存の最終日以降だけであれば並べ替えずに連結する。過去の日付を
+    含む場合も、追記分の最も古い日付より後の既存の行と追記分だけをマージし、
+    それより前の行は並べ替えない。同じ日付では既存の行を先に並べる。
+    
+    Args:
+        df: 購入日順のDataFrame
+        appended: 追記分のDataFrame
+        
+    Returns:
+        購入日順のDataFrame
+    """
+    if appended.empty:
+        return df
+    if df.empty:
+        return sort_by_date(appended)
+    
+    appended = sort_by_date(appended)
+    start = int(df['購入日'].searchsorted(appended['購入日'].iloc[0], side='right'))
+    if start == len(df):
+        return concat_frames([df, appended])
+    
+    # 既存の末尾と追記分はそれぞれ整列済みのため、安定ソートは2つの区間のマージになる
+    tail = sort_by_date(concat_frames([df.iloc[start:], appended]))
+    return concat_frames([df.iloc[:start], tail])
+
+
+def concat_frames(frames: list) -> pd.DataFrame:
+    """
+    カテゴリー型を保ったまま複数のDataFrameを連結
+    
+    チャンクやファイルごとにカテゴリーの値集合が異なるため、
+    連結前にカテゴリーを和集合へ揃える（順序付きカテゴリーは順序を維持）。
+    
+    Args:
+        frames: DataFrameのリスト
+        
+    Returns:
+        連結したDataFrame
+    """
+    frames = [frame for frame in frames if not frame.empty]
+    if not frames:
+        return pd.DataFrame()
+    if len(frames) == 1:
+        return frames[0]
+    
+    unified = {}
+    for col, dtype in frames[0].dtypes.items():
+        if not isinstance(dtype, pd.CategoricalDtype):
+            continue
+        if dtype.ordered:
+            unified[col] = dtype
+        else:
+            categories = pd.Index([])
+            for frame in frames:
+                categories = categories.union(frame[col].cat.categories)
+            unified[col] = pd.CategoricalDtype(categories=categories.sort_values())
+    
+    frames = [frame.astype(unified) for frame in frames]
+    return pd.concat(frames, ignore_index=True)
@@ -0,0 +1,324 @@
+"""
+スナップショットモジュール - 前処理済みデータの列指向キャッシュ
+"""
+import hashlib
+import json
+import os
+import shutil
+import pandas as pd
+from datetime import datetime
+from src.config import (
+    SNAPSHOT_DIR, STREAMING_THRESHOLD_BYTES, STREAMING_CHUNK_ROWS, COMPRESSION_RATIO_ESTIMATE
+)
+from src.utils.schema import CSV_DTYPES, add_derived_columns, sort_by_date
+from src.utils.streaming import stream_ingest, load_store, load_aggregates, load_top_customers, PartialAggregates
+
+try:
+    import pyarrow.feather as feather
+except ImportError:  # pyarrow未導入の場合はスナップショットを使わない
+    feather = None
+
+# スナップショットの形式バージョン（派生カラムの仕様を変えたら更新する）
+SNAPSHOT_FORMAT_VERSION = 4
+
+# 内容ハッシュ計算時の読み込みブロックサイズ
+HASH_BLOCK_SIZE = 1024 * 1024
+
+# 展開せずに直接読み込める圧縮形式の拡張子（pandasが拡張子から展開方式を判定する）
+COMPRESSED_EXTENSIONS = ('.gz', '.bz2', '.xz')
+
+# 読み込み対象とするソースファイルの拡張子
+SOURCE_EXTENSIONS = ('.csv',) + tuple(f'.csv{ext}' for ext in COMPRESSED_EXTENSIONS)
+
+
+def read_source(file_path: str) -> pd.DataFrame:
+    """
+    CSVファイルを前処理済みのDataFrameとして読み込む
+    
+    派生カラム計算済みの列指向スナップショットが有効であればそれを
+    メモリマップで読み込み、CSVのパースを省略する。
+    STREAMING_THRESHOLD_BYTESを超えるCSVはチャンク単位で取り込み、
+    元のCSV全体をメモリに載せない（部分集計はload_partial_aggregatesで取得できる）。
+    .csv.gz/.csv.bz2/.csv.xzは
+    ディスクに展開せず、読み込みながら展開する。
+    結果は購入日順に並べ替えて返す（スナップショットも購入日順で保存する）。
+    
+    Args:
+        file_path: CSVファイル（圧縮可）のパス
+        
+    Returns:
+        前処理済みのDataFrame
+    """
+    df = _load_snapshot(file_path)
+    if df is not None:
+        return df
+    
+    if is_streamed(file_path):
+        # ストアの各パーティションは購入日順のため、並べ替えは整列済みの区間のマージで済む
+        return sort_by_date(load_store(_ensure_store(file_path)))
+    
+    # 読み込み中の書き換えを検知できるよう、パース前に識別情報を取得
+    fingerprint = get_file_fingerprint(file_path) if feather is not None else None
+    
+    df = pd.read_csv(file_path, dtype=CSV_DTYPES)
+    df = sort_by_date(add_derived_columns(df))
+    
+    _write_snapshot(df, fingerprint)
+    
+    return df
+
+
+def is_streamed(file_path: str) -> bool:
+    """チャンク単位のストリーミング取り込みで読み込むCSVかどうかを判定"""
+    return feather is not None and estimate_csv_size(file_path) > STREAMING_THRESHOLD_BYTES
+
+
+def is_compressed(file_path: str) -> bool:
+    """ソースファイルが圧縮形式かどうかを判定"""
+    return file_path.lower().endswith(COMPRESSED_EXTENSIONS)
+
+
+def is_source_file(file_path: str) -> bool:
+    """読み込み対象のCSV（圧縮形式を含む）かどうかを判定"""
+    return file_path.lower().endswith(SOURCE_EXTENSIONS)
+
+
+def estimate_csv_size(file_path: str) -> int:
+    """
+    展開後のCSVのサイズを見積もる
+    
+    圧縮ファイルはファイルサイズにCOMPRESSION_RATIO_ESTIMATEを掛けた値とする。
+    
+    Args:
+        file_path: CSVファイル（圧縮可）のパス
+        
+    Returns:
+        見積もりサイズ（バイト）
+    """
+    size = os.path.getsize(file_path)
+    return size * COMPRESSION_RATIO_ESTIMATE if is_compressed(file_path) else size
+
+
+def get_file_fingerprint(file_path: str, with_hash: bool = True) -> dict:
+    """
+    ソースファイルの識別情報（パス・サイズ・更新時刻・内容ハッシュ）を取得
+    
+    Args:
+        file_path: ファイルのパス
+        with_hash: 内容ハッシュを計算するかどうか
+        
+    Returns:
+        識別情報の辞書
+    """
+    stat = os.stat(file_path)
+    fingerprint = {
+        'path': os.path.abspath(file_path),
+        'size': stat.st_size,
+        'mtime_ns': stat.st_mtime_ns,
+    }
+    if with_hash:
+        fingerprint['content_hash'] = _content_hash(file_path)
+    return fingerprint
+
+
+def _content_hash(file_path: str) -> str:
+    """ファイル内容のハッシュをブロック単位で計算"""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _snapshot_paths(file_path: str) -> tuple:
+    """
+    ソースファイルに対応するスナップショットとメタデータのパスを取得
+    
+    Args:
+        file_path: ソースファイルのパス
+        
+    Returns:
+        (スナップショットのパス, メタデータのパス)のタプル
+    """
+    base = cache_base(file_path)
+    return f"{base}.feather", f"{base}.json"
+
+
+def cache_base(file_path: str) -> str:
+    """
+    ソースファイルに対応するキャッシュファイルの共通パス（拡張子なし）を取得
+    
+    同じファイル名の別ディレクトリのソースが衝突しないよう、絶対パスの
+    ハッシュをファイル名に含める。
+    
+    Args:
+        file_path: ソースファイルのパス
+        
+    Returns:
+        SNAPSHOT_DIR内のパス
+    """
+    key = hashlib.sha1(os.path.abspath(file_path).encode('utf-8')).hexdigest()[:16]
+    return os.path.join(SNAPSHOT_DIR, f"{os.path.basename(file_path)}.{key}")
+
+
+def _load_snapshot(file_path: str):
+    """
+    有効なスナップショットがあればメモリマップで読み込む
+    
+    Args:
+        file_path: ソースファイルのパス
+        
+    Returns:
+        DataFrame（有効なスナップショットがない場合はNone）
+    """
+    if feather is None:
+        return None
+    
+    snapshot_path, meta_path = _snapshot_paths(file_path)
+    if read_fresh_meta(meta_path, file_path) is None:
+        return None
+    
+    try:
+        table = feather.read_table(snapshot_path, memory_map=True)
+    except (OSError, ValueError):
+        return None
+    
+    return table.to_pandas()
+
+
+def read_fresh_meta(meta_path: str, file_path: str):
+    """
+    キャッシュのメタデータを読み込み、ソースファイルと一致するか確認
+    
+    サイズと更新時刻が一致すれば内容ハッシュの再計算は省略する。
+    更新時刻だけが変わった場合は内容ハッシュで同一性を確認する。
+    
+    Args:
+        meta_path: メタデータ（JSON）のパス
+        file_path: ソースファイルのパス
+        
+    Returns:
+        メタデータの辞書（キャッシュが無効な場合はNone）
+    """
+    try:
+        with open(meta_path, encoding='utf-8') as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+    
+    if meta.get('format_version') != SNAPSHOT_FORMAT_VERSION:
+        return None
+    
+    current = get_file_fingerprint(file_path, with_hash=False)
+    cached = meta.get('source', {})
+    if current['path'] != cached.get('path') or current['size'] != cached.get('size'):
+        return None
+    
+    if current['mtime_ns'] != cached.get('mtime_ns'):
+        # 更新時刻のみ変化（touch等）の場合は内容で判定し、一致すれば記録を更新
+        if _content_hash(file_path) != cached.get('content_hash'):
+            return None
+        meta['source']['mtime_ns'] = current['mtime_ns']
+        write_json_atomic(meta_path, meta)
+    
+    return meta
+
+
+def _ensure_store(file_path: str) -> str:
+    """
+    ストリーミング取り込みのストアが最新であることを保証
+    
+    ソースファイルが変わっていればストアを作り直す。
+    
+    Args:
+        file_path: ソースファイルのパス
+        
+    Returns:
+        ストアのディレクトリ
+    """
+    snapshot_path, _ = _snapshot_paths(file_path)
+    store_dir = snapshot_path.replace('.feather', '.store')
+    meta_path = os.path.join(store_dir, 'store.json')
+    
+    if read_fresh_meta(meta_path, file_path) is not None:
+        return store_dir
+    
+    shutil.rmtree(store_dir, ignore_errors=True)
+    fingerprint = get_file_fingerprint(file_path)
+    aggregates = stream_ingest(file_path, store_dir, STREAMING_CHUNK_ROWS)
+    write_json_atomic(meta_path, {
+        'format_version': SNAPSHOT_FORMAT_VERSION,
+        'source': fingerprint,
+        'rows': aggregates.row_count,
+        'created_at': datetime.now().isoformat(),
+    })
+    
+    return store_dir
+
+
+def load_partial_aggregates(file_path: str) -> PartialAggregates:
+    """
+    明細データを読み込まずに部分集計だけを取得
+    
+    ストアがなければストリーミング取り込みで作成する。
+    
+    Args:
+        file_path: CSVファイルのパス
+        
+    Returns:
+        PartialAggregates
+    """
+    return load_aggregates(_ensure_store(file_path))
+
+
+def load_streamed_top_customers(file_path: str, n: int, column: str) -> pd.DataFrame:
+    """
+    ストリーミング取り込みのストアの顧客別統計から、上位N件の顧客を取得
+    
+    Args:
+        file_path: CSVファイルのパス
+        n: 取得件数
+        column: 順位付けに使う顧客別統計のカラム（'購入金額合計'または'購入回数'）
+        
+    Returns:
+        顧客IDをインデックス、顧客別統計を列とする上位N件のDataFrame
+    """
+    return load_top_customers(_ensure_store(file_path), n, column)
+
+
+def _write_snapshot(df: pd.DataFrame, fingerprint: dict) -> None:
+    """
+    前処理済みDataFrameをスナップショットとして保存
+    
+    保存に失敗してもデータ読み込み自体は継続する。
+    
+    Args:
+        df: 前処理済みのDataFrame
+        fingerprint: パース前に取得したソースファイルの識別情報
+    """
+    if feather is None or fingerprint is None or df.empty:
+        return
+    
+    snapshot_path, meta_path = _snapshot_paths(fingerprint['path'])
+    try:
+        os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+        # メモリマップで読めるよう非圧縮で書き出し、完成後に置き換える
+        tmp_path = f"{snapshot_path}.tmp"
+        feather.write_feather(df, tmp_path, compression='uncompressed')
+        os.replace(tmp_path, snapshot_path)
+        write_json_atomic(meta_path, {
+            'format_version': SNAPSHOT_FORMAT_VERSION,
+            'source': fingerprint,
+            'rows': len(df),
+            'created_at': datetime.now().isoformat(),
+        })
+    except (OSError, ValueError):
+        pass
+
+
+def write_json_atomic(path: str, data: dict) -> None:
+    """JSONファイルを一時ファイル経由で書き出す"""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
@@ -0,0 +1,349 @@
+"""
+SQLiteバックエンドモジュール - フィルター・集計をSQLに委譲する分析用ストレージ
+"""
+import logging
+import os
+import sqlite3
+from contextlib import closing
+from datetime import datetime
+import pandas as pd
+from src.config import (
+    SNAPSHOT_DIR, STREAMING_CHUNK_ROWS, CATEGORICAL_COLUMNS, CATEGORY_FILTER_COLUMNS,
+    WEEKDAY_NAMES, WEEKDAY_NAMES_JA
+)
+from src.utils.rollups import fill_empty_periods
+from src.utils.schema import CSV_DTYPES, add_derived_columns
+from src.utils.snapshot import (
+    SNAPSHOT_FORMAT_VERSION, cache_base, get_file_fingerprint, read_fresh_meta, write_json_atomic
+)
+
+logger = logging.getLogger(__name__)
+
+# 購買データのテーブル名
+TABLE_NAME = 'purchases'
+
+# インデックスを作成するカラム
+INDEXED_COLUMNS = ['購入日', '顧客ID'] + CATEGORICAL_COLUMNS
+
+# 文字列として格納するが、集計結果では曜日順に並べ直すカラム
+ORDERED_COLUMNS = {
+    '曜日': WEEKDAY_NAMES,
+    '曜日_日本語': WEEKDAY_NAMES_JA,
+}
+
+# pandasの集計関数名とSQLの集計式の対応
+SQL_AGGREGATES = {
+    'sum': 'SUM({})',
+    'mean': 'AVG({})',
+    'count': 'COUNT({})',
+    'size': 'COUNT(*)',
+    'nunique': 'COUNT(DISTINCT {})',
+    'min': 'MIN({})',
+    'max': 'MAX({})',
+}
+
+# aggregate_by_periodの期間ごとの集計キー（各期間の末日。pandasのresampleと同じラベル）
+PERIOD_EXPRESSIONS = {
+    'D': 'date("購入日")',
+    'W': 'date("購入日", \'weekday 0\')',
+    'M': 'date("購入日", \'start of month\', \'+1 month\', \'-1 day\')',
+    'Q': 'date(printf(\'%04d-%02d-01\', "年", "四半期" * 3), \'+1 month\', \'-1 day\')',
+    'Y': 'date(printf(\'%04d-12-31\', "年"))',
+}
+
+
+def _quote(column: str) -> str:
+    """カラム名をSQL識別子として引用"""
+    return '"' + column.replace('"', '""') + '"'
+
+
+class SQLiteSource:
+    """
+    SQLiteに格納した購買データへの遅延評価ハンドル
+    
+    filter_dataなどの条件はWHERE句として蓄積し、集計はGROUP BYとして
+    SQLiteで実行する。pandasに戻るのは集計済みの小さな結果だけになる。
+    カラムの取り出しは該当カラムだけを読み込む。それ以外のDataFrameとしての
+    操作は、警告をログに出したうえで条件に一致する明細を1度だけ読み込んで行う。
+    """
+    
+    def __init__(self, db_path: str, conditions: tuple = (), params: tuple = ()):
+        self.db_path = db_path
+        self.conditions = conditions
+        self.params = params
+        self._frame = None
+    
+    def _connect(self):
+        # sqlite3の接続のwithはトランザクションだけを扱い接続を閉じないため、closingで閉じる
+        return closing(sqlite3.connect(f"file:{self.db_path}?mode=ro", uri=True))
+    
+    def _where(self) -> str:
+        return f" WHERE {' AND '.join(self.conditions)}" if self.conditions else ''
+    
+    def read_sql(self, select: str, group_by: list = None, order_by: str = None, limit: int = None) -> pd.DataFrame:
+        """
+        蓄積した条件の下でSELECTを実行
+        
+        Args:
+            select: SELECT句の式
+            group_by: GROUP BYするカラムのリスト
+            order_by: ORDER BY句の式
+            limit: 取得件数の上限
+            
+        Returns:
+            結果のDataFrame
+        """
+        sql = f"SELECT {select} FROM {TABLE_NAME}{self._where()}"
+        if group_by:
+            sql += f" GROUP BY {', '.join(_quote(col) for col in group_by)}"
+        if order_by:
+            sql += f" ORDER BY {order_by}"
+        if limit is not None:
+            sql += f" LIMIT {int(limit)}"
+        
+        with self._connect() as conn:
+            return pd.read_sql_query(sql, conn, params=self.params)
+    
+    def scalar(self, select: str):
+        """単一の値を返すSELECTを実行"""
+        with self._connect() as conn:
+            return conn.execute(f"SELECT {select} FROM {TABLE_NAME}{self._where()}", self.params).fetchone()[0]
+    
+    def filter(self, filters: dict) -> 'SQLiteSource':
+        """
+        フィルター条件をWHERE句として追加した新しいハンドルを返す
+        
+        Args:
+            filters: filter_dataと同じ形式のフィルター条件
+            
+        Returns:
+            SQLiteSource
+        """
+        conditions = list(self.conditions)
+        params = list(self.params)
+        
+        if filters.get('date_range'):
+            start_date, end_date = filters['date_range']
+            conditions.append('"購入日" BETWEEN ? AND ?')
+            params += [pd.Timestamp(start_date).strftime('%Y-%m-%d'), pd.Timestamp(end_date).strftime('%Y-%m-%d')]
+        
+        for key, column in CATEGORY_FILTER_COLUMNS.items():
+            values = filters.get(key)
+            if values:
+                conditions.append(f"{_quote(column)} IN ({', '.join('?' * len(values))})")
+                params += [str(value) for value in values]
+        
+        if filters.get('age_range'):
+            min_age, max_age = filters['age_range']
+            conditions.append('"年齢" BETWEEN ? AND ?')
+            params += [int(min_age), int(max_age)]
+        
+        return SQLiteSource(self.db_path, tuple(conditions), tuple(params))
+    
+    def __len__(self) -> int:
+        return self.scalar('COUNT(*)')
+    
+    @property
+    def empty(self) -> bool:
+        return len(self) == 0
+    
+    @property
+    def columns(self) -> pd.Index:
+        with self._connect() as conn:
+            return pd.Index([row[1] for row in conn.execute(f"PRAGMA table_info({TABLE_NAME})")])
+    
+    def __contains__(self, column) -> bool:
+        return column in self.columns
+    
+    def __getitem__(self, key):
+        """
+        カラム名なら条件に一致する行のSeries、カラム名のリストならその列だけのDataFrameを返す
+        
+        それ以外はDataFrameとして評価する。
+        """
+        if isinstance(key, str):
+            return self.to_frame([key])[key]
+        if isinstance(key, list) and all(isinstance(col, str) for col in key):
+            return self.to_frame(key)
+        return self.frame[key]
+    
+    def __getattr__(self, name):
+        # SQLiteSourceにない属性はDataFrameとして解決する（既存コードとの互換用）
+        if name.startswith('_') or name in ('db_path', 'conditions', 'params'):
+            raise AttributeError(name)
+        return getattr(self.frame, name)
+    
+    @property
+    def frame(self) -> pd.DataFrame:
+        """条件に一致する明細のDataFrame（初回アクセス時に1度だけ読み込む）"""
+        if self._frame is None:
+            logger.warning("SQLiteSourceを明細のDataFrameとして読み込みます（条件: %s）", self._where() or 'なし')
+            self._frame = self.to_frame()
+        return self._frame
+    
+    def group_aggregate(self, by, value: str, agg: str) -> pd.DataFrame:
+        """
+        GROUP BYによる集計
+        
+        Args:
+            by: グループ化するカラム（文字列またはリスト）
+            value: 集計するカラム
+            agg: 集計関数名（sum, mean, count, size, nunique, min, max）
+            
+        Returns:
+            グループ化カラムと集計値のDataFrame
+        """
+        keys = [by] if isinstance(by, str) else list(by)
+        select = ', '.join(_quote(col) for col in keys)
+        expression = SQL_AGGREGATES[agg].format(_quote(value))
+        result = self.read_sql(f"{select}, {expression} AS {_quote(value)}", group_by=keys, order_by=select)
+        
+        if '購入日' in keys:
+            result['購入日'] = pd.to_datetime(result['購入日'])
+        
+        ordered = [col for col in keys if col in ORDERED_COLUMNS]
+        for col in ordered:
+            result[col] = pd.Categorical(result[col], categories=ORDERED_COLUMNS[col], ordered=True)
+        if ordered:
+            result = result.sort_values(keys, ignore_index=True)
+        return result
+    
+    def kpis(self) -> dict:
+        """calculate_kpisと同じ形式のKPIをSQLで計算"""
+        row = self.read_sql(
+            'SUM("購入金額") AS total, COUNT(DISTINCT "顧客ID") AS customers, '
+            'AVG("購入金額") AS mean_amount, COUNT(*) AS transactions, AVG("年齢") AS mean_age'
+        ).iloc[0]
+        
+        if row['transactions'] == 0:
+            return {
+                '総売上': 0,
+                '総顧客数': 0,
+                '平均購入金額': 0,
+                '総取引件数': 0,
+                '平均年齢': 0,
+                'リピート率': 0,
+            }
+        
+        with self._connect() as conn:
+            repeat_customers = conn.execute(
+                f'SELECT COUNT(*) FROM (SELECT "顧客ID" FROM {TABLE_NAME}{self._where()} '
+                'GROUP BY "顧客ID" HAVING COUNT(*) > 1)',
+                self.params
+            ).fetchone()[0]
+        
+        customers = int(row['customers'])
+        return {
+            '総売上': int(row['total']),
+            '総顧客数': customers,
+            '平均購入金額': float(row['mean_amount']),
+            '総取引件数': int(row['transactions']),
+            '平均年齢': float(row['mean_age']),
+            'リピート率': (repeat_customers / customers * 100) if customers > 0 else 0,
+        }
+    
+    def aggregate_by_period(self, period: str) -> pd.DataFrame:
+        """aggregate_by_periodと同じ形式の期間別集計をSQLで計算"""
+        expression = PERIOD_EXPRESSIONS[period[0].upper()]
+        sql = (
+            f'SELECT {expression} AS "日付", SUM("購入金額") AS "総売上", AVG("購入金額") AS "平均購入金額", '
+            f'COUNT(*) AS "取引件数", COUNT(DISTINCT "顧客ID") AS "顧客数" '
+            f'FROM {TABLE_NAME}{self._where()} GROUP BY 1 ORDER BY 1'
+        )
+        with self._connect() as conn:
+            result = pd.read_sql_query(sql, conn, params=self.params)
+        
+        result['日付'] = pd.to_datetime(result['日付'])
+        return fill_empty_periods(result, period)
+    
+    def top_n(self, group_by: str, value_column: str, n: int) -> pd.DataFrame:
+        """get_top_nと同じ形式の上位N件をSQLで取得"""
+        return self.read_sql(
+            f"{_quote(group_by)}, SUM({_quote(value_column)}) AS {_quote(value_column)}",
+            group_by=[group_by],
+            order_by=f"{_quote(value_column)} DESC",
+            limit=n
+        )
+    
+    def count_missing(self) -> pd.Series:
+        """count_missingと同じ形式のカラムごとの欠損数をSQLで計算"""
+        columns = list(self.columns)
+        row = self.read_sql(', '.join(f"COALESCE(SUM({_quote(col)} IS NULL), 0) AS {_quote(col)}" for col in columns)).iloc[0]
+        return row.astype('int64').rename(None)
+    
+    def unique_values(self, column: str) -> list:
+        """指定カラムのユニークな値を昇順で取得"""
+        return self.read_sql(f"DISTINCT {_quote(column)}", order_by=_quote(column))[column].tolist()
+    
+    def value_range(self, column: str) -> tuple:
+        """指定カラムの(最小値, 最大値)を取得"""
+        row = self.read_sql(f"MIN({_quote(column)}) AS lo, MAX({_quote(column)}) AS hi").iloc[0]
+        return row['lo'], row['hi']
+    
+    def to_frame(self, columns: list = None, limit: int = None) -> pd.DataFrame:
+        """条件に一致する明細をDataFrameとして取得"""
+        select = ', '.join(_quote(col) for col in columns) if columns else '*'
+        result = self.read_sql(select, limit=limit)
+        if '購入日' in result.columns:
+            result['購入日'] = pd.to_datetime(result['購入日'])
+        return result
+
+
+def build_sqlite_database(file_path: str, db_path: str, chunksize: int = STREAMING_CHUNK_ROWS) -> None:
+    """
+    CSVをチャンク単位で読み込み、インデックス付きのSQLiteデータベースを作成
+    
+    Args:
+        file_path: CSVファイルのパス
+        db_path: 出力するデータベースのパス
+        chunksize: 1チャンクあたりの行数
+    """
+    tmp_path = f"{db_path}.tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    
+    with closing(sqlite3.connect(tmp_path)) as conn:
+        with pd.read_csv(file_path, dtype=CSV_DTYPES, chunksize=chunksize) as reader:
+            for chunk in reader:
+                chunk = add_derived_columns(chunk)
+                chunk['購入日'] = chunk['購入日'].dt.strftime('%Y-%m-%d')
+                # SQLiteにはカテゴリー型がないため文字列として格納
+                for col in chunk.columns:
+                    if isinstance(chunk[col].dtype, pd.CategoricalDtype):
+                        chunk[col] = chunk[col].astype(str)
+                chunk.to_sql(TABLE_NAME, conn, if_exists='append', index=False)
+        
+        for col in INDEXED_COLUMNS:
+            conn.execute(f"CREATE INDEX IF NOT EXISTS {_quote('idx_' + col)} ON {TABLE_NAME} ({_quote(col)})")
+        conn.execute('ANALYZE')
+        conn.commit()
+    
+    os.replace(tmp_path, db_path)
+
+
+def get_sqlite_source(file_path: str) -> SQLiteSource:
+    """
+    CSVに対応するSQLiteデータベースを用意し、ハンドルを返す
+    
+    CSVが変更されていればデータベースを作り直す。
+    
+    Args:
+        file_path: CSVファイルのパス
+        
+    Returns:
+        SQLiteSource
+    """
+    os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+    base = cache_base(file_path)
+    db_path, meta_path = f"{base}.sqlite", f"{base}.sqlite.json"
+    
+    if not os.path.exists(db_path) or read_fresh_meta(meta_path, file_path) is None:
+        fingerprint = get_file_fingerprint(file_path)
+        build_sqlite_database(file_path, db_path)
+        write_json_atomic(meta_path, {
+            'format_version': SNAPSHOT_FORMAT_VERSION,
+            'source': fingerprint,
+            'created_at': datetime.now().isoformat(),
+        })
+    
+    return SQLiteSource(db_path)
@@ -0,0 +1,320 @@
+"""
+ストリーミング取り込みモジュール - メモリに収まらないCSVのチャンク単位処理
+"""
+import json
+import os
+from dataclasses import dataclass, field
+import numpy as np
+import pandas as pd
+from src.utils.schema import CSV_DTYPES, add_derived_columns, concat_frames, sort_by_date
+from src.utils.top_n import StreamingTopN
+
+try:
+    import pyarrow as pa
+    import pyarrow.feather as feather
+except ImportError:  # pyarrow未導入の場合はストリーミング取り込みを使えない
+    pa = None
+    feather = None
+
+# 顧客別統計のカラム
+CUSTOMER_STATS_COLUMNS = ['購入回数', '購入金額合計', '初回購入日', '最終購入日']
+
+
+@dataclass
+class PartialAggregates:
+    """
+    チャンク単位で計算し、後から結合できる部分集計
+    
+    合計・件数・顧客別統計だけを保持するため、結合順序に依存せず
+    元データを保持しないままKPIを算出できる。
+    """
+    row_count: int = 0
+    total_amount: int = 0
+    amount_sum_sq: float = 0.0
+    age_sum: int = 0
+    min_date: pd.Timestamp = None
+    max_date: pd.Timestamp = None
+    customers: pd.DataFrame = field(
+        default_factory=lambda: pd.DataFrame(columns=CUSTOMER_STATS_COLUMNS)
+    )
+    
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame) -> 'PartialAggregates':
+        """
+        前処理済みDataFrameから部分集計を作成
+        
+        Args:
+            df: 前処理済みのDataFrame（チャンク）
+            
+        Returns:
+            PartialAggregates
+        """
+        if df.empty:
+            return cls()
+        
+        amount = df['購入金額'].to_numpy(dtype=np.int64)
+        customers = df.groupby('顧客ID').agg(
+            購入回数=('購入金額', 'size'),
+            購入金額合計=('購入金額', 'sum'),
+            初回購入日=('購入日', 'min'),
+            最終購入日=('購入日', 'max'),
+        )
+        
+        return cls(
+            row_count=len(df),
+            total_amount=int(amount.sum()),
+            amount_sum_sq=float(np.square(amount, dtype=np.float64).sum()),
+            age_sum=int(df['年齢'].sum()),
+            min_date=df['購入日'].min(),
+            max_date=df['購入日'].max(),
+            customers=customers,
+        )
+    
+    def merge(self, other: 'PartialAggregates') -> 'PartialAggregates':
+        """
+        2つの部分集計を結合
+        
+        Args:
+            other: 結合する部分集計
+            
+        Returns:
+            結合後のPartialAggregates
+        """
+        return PartialAggregates.combine([self, other])
+    
+    @classmethod
+    def combine(cls, parts: list) -> 'PartialAggregates':
+        """
+        複数の部分集計を、顧客別統計の1回のグループ集計で結合
+        
+        Args:
+            parts: PartialAggregatesのリスト
+            
+        Returns:
+            結合後のPartialAggregates
+        """
+        parts = [part for part in parts if part.row_count > 0]
+        if not parts:
+            return cls()
+        if len(parts) == 1:
+            return parts[0]
+        
+        customers = pd.concat([part.customers for part in parts]).groupby(level=0).agg({
+            '購入回数': 'sum',
+            '購入金額合計': 'sum',
+            '初回購入日': 'min',
+            '最終購入日': 'max',
+        })
+        
+        return cls(
+            row_count=sum(part.row_count for part in parts),
+            total_amount=sum(part.total_amount for part in parts),
+            amount_sum_sq=sum(part.amount_sum_sq for part in parts),
+            age_sum=sum(part.age_sum for part in parts),
+            min_date=min(part.min_date for part in parts),
+            max_date=max(part.max_date for part in parts),
+            customers=customers,
+        )
+    
+    def to_kpis(self) -> dict:
+        """
+        calculate_kpisと同じ形式のKPI辞書に変換
+        
+        Returns:
+            KPI値の辞書
+        """
+        customer_count = len(self.customers)
+        if self.row_count == 0:
+            return {
+                '総売上': 0,
+                '総顧客数': 0,
+                '平均購入金額': 0,
+                '総取引件数': 0,
+                '平均年齢': 0,
+                'リピート率': 0,
+            }
+        
+        repeat_customers = int((self.customers['購入回数'] > 1).sum())
+        
+        return {
+            '総売上': self.total_amount,
+            '総顧客数': customer_count,
+            '平均購入金額': self.total_amount / self.row_count,
+            '総取引件数': self.row_count,
+            '平均年齢': self.age_sum / self.row_count,
+            'リピート率': (repeat_customers / customer_count * 100) if customer_count > 0 else 0,
+        }
+    
+    @classmethod
+    def from_dict(cls, data: dict, customers: pd.DataFrame = None) -> 'PartialAggregates':
+        """
+        to_dictで保存した値から部分集計を復元
+        
+        Args:
+            data: to_dictの戻り値
+            customers: 顧客別統計（省略時は空）
+            
+        Returns:
+            PartialAggregates
+        """
+        return cls(
+            row_count=data['row_count'],
+            total_amount=data['total_amount'],
+            amount_sum_sq=data['amount_sum_sq'],
+            age_sum=data['age_sum'],
+            min_date=pd.Timestamp(data['min_date']) if data['min_date'] else None,
+            max_date=pd.Timestamp(data['max_date']) if data['max_date'] else None,
+            customers=customers if customers is not None else pd.DataFrame(columns=CUSTOMER_STATS_COLUMNS),
+        )
+    
+    def to_dict(self) -> dict:
+        """顧客別統計以外をJSONに保存できる形式へ変換"""
+        return {
+            'row_count': self.row_count,
+            'total_amount': self.total_amount,
+            'amount_sum_sq': self.amount_sum_sq,
+            'age_sum': self.age_sum,
+            'min_date': self.min_date.isoformat() if self.min_date is not None else None,
+            'max_date': self.max_date.isoformat() if self.max_date is not None else None,
+        }
+
+
+def stream_ingest(file_path: str, store_dir: str, chunksize: int) -> PartialAggregates:
+    """
+    CSVをチャンク単位で読み込み、パーティション化したストアに書き出す
+    
+    各チャンクは型変換と派生カラムの計算を済ませてFeatherファイルとして保存し、
+    同時にチャンクごとの部分集計を結合していく。メモリ使用量はチャンクサイズと
+    顧客数にのみ比例する。各パーティションは購入日順に並べて保存する。
+    
+    Args:
+        file_path: CSVファイルのパス
+        store_dir: ストアの出力ディレクトリ
+        chunksize: 1チャンクあたりの行数
+        
+    Returns:
+        全チャンクを結合したPartialAggregates
+    """
+    if feather is None:
+        raise ImportError("ストリーミング取り込みにはpyarrowが必要です")
+    
+    os.makedirs(store_dir, exist_ok=True)
+    
+    aggregates = PartialAggregates()
+    pending = []
+    parts = []
+    
+    with pd.read_csv(file_path, dtype=CSV_DTYPES, chunksize=chunksize) as reader:
+        for i, chunk in enumerate(reader):
+            # 各パーティションを購入日順にしておき、読み込み時の並べ替えを整列済みの区間のマージにする
+            chunk = sort_by_date(add_derived_columns(chunk.reset_index(drop=True)))
+            
+            part_name = f"part-{i:05d}.feather"
+            feather.write_feather(chunk, os.path.join(store_dir, part_name), compression='uncompressed')
+            
+            chunk_aggregates = PartialAggregates.from_frame(chunk)
+            parts.append({'file': part_name, **chunk_aggregates.to_dict()})
+            
+            # 顧客別統計は、未結合のチャンクの顧客数が結合済みの顧客数に達したときだけ
+            # まとめて結合する（チャンクごとに全体を集計し直さず、全体で行数にほぼ比例する）
+            pending.append(chunk_aggregates)
+            if sum(len(part.customers) for part in pending) >= len(aggregates.customers):
+                aggregates = PartialAggregates.combine([aggregates, *pending])
+                pending = []
+    
+    aggregates = PartialAggregates.combine([aggregates, *pending])
+    _write_aggregates(store_dir, aggregates, parts)
+    
+    return aggregates
+
+
+def _write_aggregates(store_dir: str, aggregates: PartialAggregates, parts: list) -> None:
+    """部分集計とパーティション一覧をストアに保存"""
+    feather.write_feather(
+        aggregates.customers.reset_index(),
+        os.path.join(store_dir, 'customers.feather'),
+        compression='uncompressed'
+    )
+    with open(os.path.join(store_dir, 'aggregates.json'), 'w', encoding='utf-8') as f:
+        json.dump({'totals': aggregates.to_dict(), 'parts': parts}, f, ensure_ascii=False, indent=2)
+
+
+def load_aggregates(store_dir: str) -> PartialAggregates:
+    """
+    ストアに保存された部分集計を読み込む（明細データは読み込まない）
+    
+    Args:
+        store_dir: ストアのディレクトリ
+        
+    Returns:
+        PartialAggregates
+    """
+    with open(os.path.join(store_dir, 'aggregates.json'), encoding='utf-8') as f:
+        totals = json.load(f)['totals']
+    
+    customers = feather.read_table(
+        os.path.join(store_dir, 'customers.feather'), memory_map=True
+    ).to_pandas().set_index('顧客ID')
+    
+    return PartialAggregates.from_dict(totals, customers)
+
+
+def load_top_customers(store_dir: str, n: int = 10, column: str = '購入金額合計') -> pd.DataFrame:
+    """
+    ストアの顧客別統計から、指定カラムの上位N件の顧客を取得
+    
+    顧客別統計をメモリマップしたレコードバッチ単位で読み、上位N件だけを
+    ヒープに保持する。上位N件の行はその行を含むレコードバッチから取り出すため、
+    顧客別統計の全体をDataFrameに読み込まない。
+    
+    Args:
+        store_dir: ストアのディレクトリ
+        n: 取得件数
+        column: 順位付けに使う顧客別統計のカラム
+        
+    Returns:
+        顧客IDをインデックス、顧客別統計を列とする上位N件のDataFrame
+        （columnの降順、同じ値は顧客IDの昇順）
+    """
+    top_n = StreamingTopN(n)
+    with pa.memory_map(os.path.join(store_dir, 'customers.feather')) as source:
+        reader = pa.ipc.open_file(source)
+        # レコードバッチごとの先頭の行位置
+        starts = []
+        offset = 0
+        for i in range(reader.num_record_batches):
+            # ラベルにはファイル内の行位置を使い、上位N件の行だけを後から取り出す
+            # （顧客別統計は顧客ID順のため、同じ値は顧客IDの昇順で選ばれる）
+            scores = reader.get_batch(i).column(column).to_numpy(zero_copy_only=False)
+            top_n.push(np.arange(offset, offset + len(scores)), scores)
+            starts.append(offset)
+            offset += len(scores)
+        
+        rows = []
+        for _, position in top_n.result():
+            i = int(np.searchsorted(starts, position, side='right')) - 1
+            rows.append(reader.get_batch(i).slice(position - starts[i], 1))
+        customers = pa.Table.from_batches(rows, schema=reader.schema).to_pandas()
+    
+    return customers.set_index('顧客ID')
+
+
+def load_store(store_dir: str, columns: list = None) -> pd.DataFrame:
+    """
+    ストアの各パーティションをメモリマップで読み込み連結
+    
+    Args:
+        store_dir: ストアのディレクトリ
+        columns: 読み込むカラム（Noneの場合は全カラム）
+        
+    Returns:
+        連結したDataFrame
+    """
+    with open(os.path.join(store_dir, 'aggregates.json'), encoding='utf-8') as f:
+        parts = json.load(f)['parts']
+    
+    frames = [
+        feather.read_table(os.path.join(store_dir, part['file']), columns=columns, memory_map=True).to_pandas()
+        for part in parts
+    ]
+    return concat_frames(frames)
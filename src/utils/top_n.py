@@ -0,0 +1,156 @@
+"""
+上位N件モジュール - 全件を並べ替えずに、グループ別集計の上位N件を選ぶ
+"""
+import heapq
+import numpy as np
+import pandas as pd
+from src.utils.kpi_state import CUSTOMER_ID_SPAN_FACTOR, MIN_CUSTOMER_ID_SPAN
+
+
+def group_codes(keys: pd.Series) -> tuple:
+    """
+    グループ化するカラムの値を0以上の整数コードに変換
+    
+    カテゴリー型はカテゴリーのコード、値の範囲が行数に比べて小さい0以上の整数は
+    値そのもの、それ以外はハッシュによるコード化を使い、値の並べ替えはしない。
+    
+    Args:
+        keys: グループ化するカラムのSeries
+        
+    Returns:
+        (行ごとのコードの配列（欠損値は-1）, コードに対応する値のIndex)のタプル
+    """
+    if isinstance(keys.dtype, pd.CategoricalDtype):
+        return keys.array.codes, keys.cat.categories
+    
+    values = keys.to_numpy()
+    if np.issubdtype(values.dtype, np.integer) and len(values):
+        span = max(MIN_CUSTOMER_ID_SPAN, CUSTOMER_ID_SPAN_FACTOR * len(values))
+        if values.min() >= 0 and values.max() < span:
+            return values, pd.RangeIndex(int(values.max()) + 1)
+    
+    codes, uniques = pd.factorize(values)
+    return codes, pd.Index(uniques)
+
+
+def top_n_positions(scores: np.ndarray, n: int, labels: pd.Index = None) -> np.ndarray:
+    """
+    値の大きい順に上位N件の位置を取得（argpartitionで候補を選び、候補だけを並べ替える）
+    
+    N件目と同じ値が複数ある場合は、labelsの値の昇順（省略時は位置の昇順）で選ぶ。
+    
+    Args:
+        scores: 値の配列
+        n: 取得件数
+        labels: 同じ値の並び順に使う、位置ごとのラベル
+        
+    Returns:
+        上位N件の位置の配列（値の降順）
+    """
+    if n <= 0 or len(scores) == 0:
+        return np.zeros(0, dtype=np.int64)
+    
+    if n < len(scores):
+        threshold = scores[np.argpartition(scores, len(scores) - n)[len(scores) - n]]
+        # N件目と同じ値のものは全て候補に残し、並べ替えで選ぶ
+        candidates = np.flatnonzero(scores >= threshold)
+    else:
+        candidates = np.arange(len(scores))
+    
+    tiebreak = candidates if labels is None else labels[candidates]
+    order = np.lexsort((tiebreak, -scores[candidates]))
+    return candidates[order[:n]]
+
+
+def top_n_groups(keys: pd.Series, values: pd.Series, n: int, rank_by: str = 'sum') -> pd.DataFrame:
+    """
+    グループごとの合計・件数を集計し、上位N件のグループを取得
+    
+    整数コードごとの合計・件数をbincountで求め、上位N件をargpartitionで選ぶため、
+    計算量はグループ数に比例する部分と上位N件の並べ替えだけになる。
+    
+    Args:
+        keys: グループ化するカラムのSeries
+        values: 合計するカラムのSeries
+        n: 取得件数
+        rank_by: 順位付けに使う集計（'sum': 合計, 'count': 件数）
+        
+    Returns:
+        グループの値をインデックス（名前はkeysの名前）、合計・件数を列とする
+        上位N件のDataFrame（rank_byの降順）
+    """
+    codes, labels = group_codes(keys)
+    valid = codes >= 0
+    if not valid.all():
+        codes = codes[valid]
+        values = values[valid]
+    
+    amounts = values.to_numpy()
+    if np.issubdtype(amounts.dtype, np.floating):
+        amounts = np.nan_to_num(amounts)
+    sums = np.bincount(codes, weights=amounts, minlength=len(labels))
+    counts = np.bincount(codes, minlength=len(labels))
+    
+    # 行のないコード（整数値そのものをコードにした場合の欠番など）は除く
+    present = np.flatnonzero(counts > 0)
+    scores = sums[present] if rank_by == 'sum' else counts[present]
+    selected = present[top_n_positions(scores, n, labels[present])]
+    
+    if np.issubdtype(amounts.dtype, np.integer):
+        sums = sums.astype(np.int64)
+    return pd.DataFrame(
+        {'合計': sums[selected], '件数': counts[selected].astype(np.int64)},
+        index=pd.Index(labels[selected], name=keys.name)
+    )
+
+
+class StreamingTopN:
+    """
+    チャンク単位で与えられる(ラベル, 値)から、値の大きい上位N件を保持する
+    
+    保持する件数をNに限ったヒープ（最も順位の低いものが先頭）で、チャンクごとに
+    argpartitionで選んだ候補だけを入れ替える。ラベルごとの値が確定している入力
+    （行ごとの値や、集計済みの顧客別統計など）を、全体を読み込まずに順に処理できる。
+    同じ値はtop_n_positionsと同じくラベルの昇順で選ぶ。
+    """
+    
+    def __init__(self, n: int):
+        self.n = n
+        self._heap = []
+    
+    def push(self, labels, scores) -> None:
+        """
+        1チャンク分のラベルと値を反映
+        
+        Args:
+            labels: ラベルの配列
+            scores: 値の配列
+        """
+        labels = np.asarray(labels)
+        scores = np.asarray(scores)
+        positions = top_n_positions(scores, self.n, labels)
+        for score, label in zip(scores[positions].tolist(), labels[positions].tolist()):
+            entry = _RankedEntry(score, label)
+            if len(self._heap) < self.n:
+                heapq.heappush(self._heap, entry)
+            elif self._heap[0] < entry:
+                heapq.heapreplace(self._heap, entry)
+    
+    def result(self) -> list:
+        """保持している上位N件を順位順（値の降順、同じ値はラベルの昇順）に取得（(値, ラベル)のリスト）"""
+        return [(entry.score, entry.label) for entry in sorted(self._heap, reverse=True)]
+
+
+class _RankedEntry:
+    """ヒープの要素（値が小さいほど、同じ値ではラベルが大きいほど順位が低い）"""
+    
+    __slots__ = ('score', 'label')
+    
+    def __init__(self, score, label):
+        self.score = score
+        self.label = label
+    
+    def __lt__(self, other: '_RankedEntry') -> bool:
+        if self.score != other.score:
+            return self.score < other.score
+        return self.label > other.label
@@ -0,0 +1,100 @@
+"""
+テスト共通のフィクスチャ - 乱数シードを固定した合成の購買データ
+"""
+import os
+import sys
+import numpy as np
+import pandas as pd
+import pytest
+
+# プロジェクトルートをパスに追加
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+from src.config import CATEGORICAL_COLUMNS, CATEGORY_FILTER_COLUMNS
+from src.utils.schema import add_derived_columns, sort_by_date
+
+# 合成データの行数と乱数シード
+SAMPLE_ROWS = 20_000
+SAMPLE_SEED = 0
+
+# 各テストで共通に使うフィルター条件（id: 条件）
+FILTER_CASES = {
+    'フィルターなし': {},
+    'カテゴリー条件': {'regions': ['関東', '関西'], 'categories': ['家電', '食品']},
+    '期間と年齢': {'date_range': ('2023-03-01', '2023-08-31'), 'age_range': (21, 40)},
+    '単一グループ': {'regions': ['関東'], 'genders': ['女性'], 'categories': ['書籍'], 'payment_methods': ['現金']},
+    '一致なし': {'date_range': ('2022-01-01', '2022-06-30')},
+}
+
+
+def generate_sales_data(rows: int, seed: int = SAMPLE_SEED) -> pd.DataFrame:
+    """サンプルデータと同じ列構成の合成データ（CSVに書き出す前の生データ）を生成"""
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        '顧客ID': rng.integers(1, max(rows // 4, 2), rows),
+        '年齢': rng.integers(18, 80, rows),
+        '性別': rng.choice(['男性', '女性'], rows),
+        '地域': rng.choice(['北海道', '東北', '関東', '中部', '関西', '中国', '四国', '九州'], rows),
+        '購入カテゴリー': rng.choice(['家電', 'スポーツ', 'ファッション', '食品', '書籍'], rows),
+        '購入金額': rng.integers(500, 100000, rows),
+        '購入日': pd.Timestamp('2023-01-01') + pd.to_timedelta(rng.integers(0, 730, rows), unit='D'),
+        '支払方法': rng.choice(['クレジットカード', '現金', '電子マネー'], rows),
+    })
+
+
+def preprocess(raw: pd.DataFrame) -> pd.DataFrame:
+    """load_dataと同じ前処理（カテゴリー型・派生カラム・購入日順）を適用"""
+    df = raw.astype({col: 'category' for col in CATEGORICAL_COLUMNS})
+    return sort_by_date(add_derived_columns(df)).reset_index(drop=True)
+
+
+def reference_filter(df: pd.DataFrame, filters: dict) -> pd.DataFrame:
+    """フィルター条件をpandasの真偽値マスクでそのまま評価した結果（期待値の計算用）"""
+    mask = pd.Series(True, index=df.index)
+    if filters.get('date_range'):
+        start, end = (pd.Timestamp(value) for value in filters['date_range'])
+        mask &= (df['購入日'] >= start) & (df['購入日'] < end + pd.Timedelta(days=1))
+    for key, column in CATEGORY_FILTER_COLUMNS.items():
+        if filters.get(key):
+            mask &= df[column].isin(filters[key])
+    if filters.get('age_range'):
+        min_age, max_age = filters['age_range']
+        mask &= df['年齢'].between(min_age, max_age)
+    return df[mask]
+
+
+@pytest.fixture(scope='session')
+def raw_sales():
+    """前処理前の合成データ"""
+    return generate_sales_data(SAMPLE_ROWS)
+
+
+@pytest.fixture(scope='session')
+def sales_df(raw_sales):
+    """前処理済みの合成データ（共有データセットではないDataFrame）"""
+    return preprocess(raw_sales)
+
+
+@pytest.fixture(scope='session')
+def shared_df(raw_sales, tmp_path_factory):
+    """
+    合成データをCSVに書き出し、共有データセットとして読み込んだDataFrame
+    
+    派生データ（売上キューブ・ビットマップインデックスなど）はこのフレームでだけ作られる。
+    スナップショットはカレントディレクトリ基準で作られるため、一時ディレクトリで読み込む。
+    """
+    from src.utils.data_loader import load_shared_data
+    
+    directory = tmp_path_factory.mktemp('shared')
+    csv_path = directory / 'sales.csv'
+    raw_sales.to_csv(csv_path, index=False)
+    with pytest.MonkeyPatch.context() as patch:
+        patch.chdir(directory)
+        return load_shared_data(str(csv_path))
+
+
+@pytest.fixture(params=list(FILTER_CASES.values()), ids=list(FILTER_CASES))
+def filters(request):
+    """共通のフィルター条件（FILTER_CASESの各条件でテストを繰り返す）"""
+    return request.param
@@ -0,0 +1,92 @@
+"""
+売上キューブのテスト - pandasのgroupbyとの比較
+"""
+import numpy as np
+import pandas as pd
+import pytest
+from conftest import reference_filter
+from src.utils.cube import AGE_GROUP_COLUMN, SalesCube
+from src.utils.data_processor import age_groups
+from src.utils.filter_cache import canonical_filters
+
+# 比較するグループ化カラムの組
+GROUP_KEYS = [
+    ['地域'],
+    ['購入カテゴリー', '支払方法'],
+    [AGE_GROUP_COLUMN],
+    ['年月'],
+    ['曜日_日本語', '性別'],
+    ['購入日'],
+]
+
+
+@pytest.fixture(scope='module')
+def cube(sales_df):
+    return SalesCube(sales_df)
+
+
+def expected_rows(df: pd.DataFrame, filters: dict) -> pd.DataFrame:
+    """フィルター後の行に年齢層カラムを加えたもの"""
+    rows = reference_filter(df, filters)
+    return rows.assign(**{AGE_GROUP_COLUMN: age_groups(rows['年齢'])})
+
+
+@pytest.mark.parametrize('keys', GROUP_KEYS)
+@pytest.mark.parametrize('agg', ['sum', 'mean', 'count', 'size', 'std', 'var'])
+def test_aggregate_matches_groupby(sales_df, cube, filters, keys, agg):
+    cells = cube.select(dict(canonical_filters(sales_df, filters)))
+    result = cube.aggregate(cells, keys, '購入金額', agg)
+    expected = expected_rows(sales_df, filters).groupby(keys, observed=True)['購入金額'].agg(agg).reset_index()
+    
+    pd.testing.assert_frame_equal(result, expected, check_dtype=False, check_categorical=False, check_index_type=False)
+
+
+def test_single_group_has_one_row(sales_df, cube):
+    filters = {'regions': ['関東'], 'genders': ['女性']}
+    cells = cube.select(dict(canonical_filters(sales_df, filters)))
+    result = cube.aggregate(cells, ['地域', '性別'], '購入金額', 'sum')
+    rows = reference_filter(sales_df, filters)
+    
+    assert len(result) == 1
+    assert result['購入金額'].iloc[0] == rows['購入金額'].sum()
+
+
+def test_totals_match_rows(sales_df, cube, filters):
+    cells = cube.select(dict(canonical_filters(sales_df, filters)))
+    totals = cube.totals(cells)
+    rows = reference_filter(sales_df, filters)
+    amounts = rows['購入金額'].to_numpy(dtype=np.float64)
+    
+    assert totals['件数'] == len(rows)
+    assert totals['合計'] == rows['購入金額'].sum()
+    assert totals['二乗和'] == pytest.approx(np.square(amounts).sum())
+    assert totals['年齢合計'] == rows['年齢'].sum()
+
+
+def test_select_without_matching_rows_is_empty(sales_df, cube):
+    cells = cube.select(dict(canonical_filters(sales_df, {'date_range': ('2022-01-01', '2022-06-30')})))
+    result = cube.aggregate(cells, ['地域'], '購入金額', 'sum')
+    
+    assert cube.totals(cells)['件数'] == 0
+    assert result.empty
+    assert list(result.columns) == ['地域', '購入金額']
+
+
+def test_select_rejects_age_range_inside_age_group(sales_df, cube):
+    # 21〜40歳は年齢層（20代・30代）の境界に揃うが、25〜40歳は20代の途中で区切られる
+    assert cube.select({'age_range': (21, 40)}) is not None
+    assert cube.select({'age_range': (25, 40)}) is None
+
+
+def test_cell_positions_cover_all_rows(sales_df, cube):
+    positions = cube.cell_positions(sales_df)
+    
+    assert np.bincount(positions, minlength=len(cube)).tolist() == cube.count.tolist()
+
+
+def test_supports(cube):
+    assert cube.supports(['地域', '年月'], '購入金額', 'mean')
+    assert cube.supports([AGE_GROUP_COLUMN], '購入金額', 'std')
+    assert not cube.supports(['地域'], '購入金額', 'median')
+    assert not cube.supports(['顧客ID'], '購入金額', 'sum')
+    assert not cube.supports(['地域'], '年齢', 'sum')
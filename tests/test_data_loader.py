@@ -0,0 +1,40 @@
+"""
+データ読み込みモジュールのテスト - メモリ使用量レポート
+"""
+import numpy as np
+import pandas as pd
+from src.utils.data_loader import memory_usage_report
+
+
+def cast_baseline(df: pd.DataFrame) -> pd.Series:
+    """型定義の適用前の形式に実際に変換して計測したカラムごとのバイト数"""
+    untyped = pd.DataFrame({
+        col: (
+            df[col].astype(object) if isinstance(df[col].dtype, pd.CategoricalDtype)
+            else df[col].astype('int64') if pd.api.types.is_integer_dtype(df[col])
+            else df[col]
+        )
+        for col in df.columns
+    })
+    return untyped.memory_usage(index=False, deep=True)
+
+
+def test_report_matches_cast_baseline(sales_df):
+    report = memory_usage_report(sales_df).set_index('カラム')
+    expected = cast_baseline(sales_df)
+    
+    np.testing.assert_array_equal(report.loc[expected.index, '変換前(バイト)'], expected)
+    assert report.loc['合計', '変換後(バイト)'] == sales_df.memory_usage(index=False, deep=True).sum()
+    assert report.loc['地域', '変換前の型'] == 'object'
+
+
+def test_report_counts_missing_categories(sales_df):
+    rows = sales_df.head(1000)
+    frame = rows.assign(地域=rows['地域'].mask(np.arange(len(rows)) % 3 == 0))
+    report = memory_usage_report(frame).set_index('カラム')
+    
+    assert report.loc['地域', '変換前(バイト)'] == cast_baseline(frame)['地域']
+
+
+def test_empty_frame_gives_empty_report(sales_df):
+    assert memory_usage_report(sales_df.iloc[:0]).empty
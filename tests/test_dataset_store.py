@@ -0,0 +1,77 @@
+"""
+共有データセットのキャッシュのテスト - 複数スレッドからの同時登録
+"""
+from concurrent.futures import ThreadPoolExecutor
+import pandas as pd
+from src.utils.dataset_store import BoundedCache
+from src.utils.data_processor import filter_view
+from src.utils.period_comparison import compare_periods
+from src.utils.rollups import daily_rollup
+
+
+def test_bounded_cache_evicts_least_recently_used():
+    cache = BoundedCache(2)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    cache.get('a')
+    cache.put('c', 3)
+    
+    assert len(cache) == 2
+    assert cache.get('b') is None
+    assert (cache.get('a'), cache.get('c')) == (1, 3)
+
+
+def test_bounded_cache_keeps_first_value():
+    cache = BoundedCache(4)
+    first = cache.put('a', [1])
+    
+    assert cache.put('a', [1]) is first
+
+
+def test_concurrent_puts_stay_within_limit():
+    cache = BoundedCache(16)
+    
+    def fill(offset):
+        for key in range(500):
+            cache.put((offset, key), key)
+            cache.get((offset, key - 1))
+    
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        list(pool.map(fill, range(8)))
+    
+    assert len(cache) == 16
+
+
+def test_concurrent_comparisons_share_one_result(shared_df):
+    view = filter_view(shared_df, {'regions': ['関東']})
+    
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        results = list(pool.map(lambda _: compare_periods(view, 'M'), range(32)))
+    
+    assert all(result is results[0] for result in results[1:])
+
+
+def test_concurrent_rollups_share_one_rollup(shared_df):
+    view = filter_view(shared_df, {'categories': ['家電']})
+    
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        rollups = list(pool.map(lambda _: daily_rollup(view), range(32)))
+        monthly = list(pool.map(lambda rollup: rollup.rollup('M'), rollups))
+    
+    assert all(rollup is rollups[0] for rollup in rollups[1:])
+    for result in monthly[1:]:
+        pd.testing.assert_frame_equal(result, monthly[0])
+
+
+def test_bounded_cache_evicts_by_bytes():
+    cache = BoundedCache(max_bytes=100, sizeof=len)
+    cache.put('a', 'x' * 40)
+    cache.put('b', 'y' * 40)
+    cache.put('c', 'z' * 40)
+    
+    assert cache.get('a') is None
+    assert len(cache) == 2
+    
+    # 1つで上限を超える値は登録しない
+    assert cache.put('d', 'w' * 200) == 'w' * 200
+    assert cache.get('d') is None
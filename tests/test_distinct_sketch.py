@@ -0,0 +1,121 @@
+"""
+近似ユニーク数（HyperLogLog）のテスト - pandasのnuniqueとの比較
+"""
+import numpy as np
+import pandas as pd
+import pytest
+from conftest import preprocess, reference_filter
+from src.utils.cube import SalesCube
+from src.utils.distinct_sketch import (
+    CellSketches, estimate_cardinality, hash_values, register_ranks, standard_error
+)
+from src.utils.filter_cache import canonical_filters
+
+# 推定値の許容誤差（相対標準誤差の倍数。小さな値は絶対誤差で許容する）
+TOLERANCE_SIGMAS = 4
+ABSOLUTE_TOLERANCE = 2
+
+
+@pytest.fixture(scope='module')
+def cube(sales_df):
+    return SalesCube(sales_df)
+
+
+@pytest.fixture(scope='module')
+def sketches(sales_df, cube):
+    return CellSketches(sales_df, cube)
+
+
+def assert_close(estimates, expected):
+    """推定値が期待値から許容誤差以内であることを確認"""
+    estimates = np.asarray(estimates, dtype=np.float64)
+    expected = np.asarray(expected, dtype=np.float64)
+    tolerance = np.maximum(TOLERANCE_SIGMAS * standard_error() * expected, ABSOLUTE_TOLERANCE)
+    assert np.all(np.abs(estimates - expected) <= tolerance), (estimates, expected)
+
+
+@pytest.mark.parametrize('keys', [['地域'], ['購入カテゴリー', '性別'], ['年月'], ['曜日_日本語']])
+def test_distinct_by_group_matches_nunique(sales_df, cube, sketches, filters, keys):
+    cells = cube.select(dict(canonical_filters(sales_df, filters)))
+    result = cube.distinct(cells, keys, sketches)
+    expected = reference_filter(sales_df, filters).groupby(keys, observed=True)['顧客ID'].nunique().reset_index()
+    
+    assert list(result.columns) == keys + ['顧客ID']
+    pd.testing.assert_frame_equal(result[keys], expected[keys], check_dtype=False, check_categorical=False)
+    assert_close(result['顧客ID'], expected['顧客ID'])
+
+
+def test_distinct_total_matches_nunique(sales_df, cube, sketches, filters):
+    cells = cube.select(dict(canonical_filters(sales_df, filters)))
+    estimate = int(cube.distinct(cells, [], sketches)['顧客ID'].sum())
+    
+    assert_close([estimate], [reference_filter(sales_df, filters)['顧客ID'].nunique()])
+
+
+def test_distinct_without_matching_rows_is_empty(sales_df, cube, sketches):
+    cells = cube.select(dict(canonical_filters(sales_df, {'date_range': ('2022-01-01', '2022-06-30')})))
+    result = cube.distinct(cells, ['地域'], sketches)
+    
+    assert result.empty
+    assert list(result.columns) == ['地域', '顧客ID']
+
+
+def test_estimate_of_large_cardinality_within_standard_error():
+    precision = 12
+    values = pd.Series(np.arange(200_000, dtype=np.int64))
+    registers, ranks = register_ranks(hash_values(values), precision)
+    merged = np.zeros(1 << precision, dtype=np.uint8)
+    np.maximum.at(merged, registers, ranks)
+    
+    estimate = estimate_cardinality(merged.reshape(1, -1))[0]
+    assert abs(estimate - len(values)) <= TOLERANCE_SIGMAS * standard_error(precision) * len(values)
+
+
+def test_empty_registers_estimate_zero():
+    assert estimate_cardinality(np.zeros((2, 1 << 12), dtype=np.uint8)).tolist() == [0.0, 0.0]
+
+
+def test_register_ranks_range():
+    precision = 12
+    registers, ranks = register_ranks(hash_values(pd.Series(np.arange(10_000))), precision)
+    
+    assert registers.max() < (1 << precision)
+    assert ranks.min() >= 1
+    assert ranks.max() <= 64 - precision + 1
+
+
+def direct_registers(customer_ids: pd.Series, groups: np.ndarray, n_groups: int) -> np.ndarray:
+    """行から直接作ったグループごとのHyperLogLogのレジスタ"""
+    registers, ranks = register_ranks(hash_values(customer_ids), 12)
+    merged = np.zeros((n_groups, 1 << 12), dtype=np.uint8)
+    np.maximum.at(merged, (groups, registers), ranks)
+    return merged
+
+
+def test_dense_and_sparse_cells_merge_like_rows(raw_sales):
+    # 前半の行は属性と日付を2日分にまとめてエントリの多い（密な）セルにし、後半はそのまま残す
+    raw = raw_sales.copy()
+    raw.loc[:14_999, ['地域', '性別', '購入カテゴリー', '支払方法', '年齢']] = ['関東', '女性', '書籍', '現金', 35]
+    raw.loc[:14_999, '購入日'] = np.where(np.arange(15_000) % 2 == 0, pd.Timestamp('2023-01-01'), pd.Timestamp('2023-01-02'))
+    frame = preprocess(raw)
+    cube = SalesCube(frame)
+    sketches = CellSketches(frame, cube, precision=12)
+    
+    assert 0 < len(sketches.dense) < len(cube)
+    
+    cells = np.arange(len(cube))
+    groups = (np.arange(len(cube)) % 3).astype(np.int32)
+    row_groups = groups[cube.cell_positions(frame)]
+    estimates = sketches.estimate(cells, groups, 3)
+    expected = np.rint(estimate_cardinality(direct_registers(frame['顧客ID'], row_groups, 3))).astype(np.int64)
+    np.testing.assert_array_equal(estimates, expected)
+    
+    # セルの一部を除いた場合とsliceで指定した場合
+    groups[::5] = -1
+    included = groups[cube.cell_positions(frame)] >= 0
+    estimates = sketches.estimate(cells, groups, 3)
+    expected_rows = direct_registers(frame['顧客ID'][included], groups[cube.cell_positions(frame)][included], 3)
+    np.testing.assert_array_equal(estimates, np.rint(estimate_cardinality(expected_rows)).astype(np.int64))
+    
+    total = sketches.estimate(slice(0, len(cube)), np.zeros(len(cube), dtype=np.int32), 1)
+    assert total[0] == np.rint(estimate_cardinality(direct_registers(frame['顧客ID'], np.zeros(len(frame), dtype=np.int64), 1)))[0]
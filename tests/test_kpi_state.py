@@ -0,0 +1,115 @@
+"""
+KPI状態のテスト - pandasの合計・nuniqueとの比較
+"""
+import numpy as np
+import pandas as pd
+import pytest
+from conftest import reference_filter
+from src.utils.kpi_state import KPIState, MIN_CUSTOMER_ID_SPAN
+from src.utils.streaming import PartialAggregates
+
+
+def expected_kpis(df: pd.DataFrame) -> dict:
+    """pandasで計算したKPI"""
+    purchases = df.groupby('顧客ID').size()
+    return {
+        '総売上': df['購入金額'].sum(),
+        '総顧客数': df['顧客ID'].nunique(),
+        '平均購入金額': df['購入金額'].mean(),
+        '総取引件数': len(df),
+        '平均年齢': df['年齢'].mean(),
+        'リピート率': (purchases > 1).sum() / len(purchases) * 100,
+    }
+
+
+def split_rows(df: pd.DataFrame, parts: int) -> list:
+    """DataFrameを行順にparts個に分割"""
+    bounds = np.linspace(0, len(df), parts + 1).astype(int)
+    return [df.iloc[start:stop] for start, stop in zip(bounds[:-1], bounds[1:])]
+
+
+def assert_kpis_equal(result: dict, expected: dict) -> None:
+    """KPI辞書の比較（平均・割合は浮動小数点の誤差を許容）"""
+    assert result.keys() == expected.keys()
+    for key, value in expected.items():
+        assert result[key] == pytest.approx(value), key
+
+
+def test_from_frame_matches_pandas(sales_df, filters):
+    rows = reference_filter(sales_df, filters)
+    state = KPIState.from_frame(rows)
+    
+    if rows.empty:
+        assert state.to_kpis()['総取引件数'] == 0
+    else:
+        assert_kpis_equal(state.to_kpis(), expected_kpis(rows))
+
+
+def test_update_with_appended_rows(sales_df):
+    state = KPIState.from_frame(sales_df.iloc[:12_000])
+    for start in range(12_000, len(sales_df), 3_000):
+        assert state.update(sales_df.iloc[start:start + 3_000])
+    
+    full = KPIState.from_frame(sales_df)
+    assert (state.customer_count, state.repeat_count) == (full.customer_count, full.repeat_count)
+    np.testing.assert_array_equal(np.trim_zeros(state.purchase_counts, 'b'), np.trim_zeros(full.purchase_counts, 'b'))
+    assert_kpis_equal(state.to_kpis(), expected_kpis(sales_df))
+
+
+def test_merge_of_splits(sales_df):
+    parts = [KPIState.from_frame(part) for part in split_rows(sales_df.sample(frac=1, random_state=0), 4)]
+    merged = parts[0]
+    for part in parts[1:]:
+        merged = merged.merge(part)
+    
+    assert_kpis_equal(merged.to_kpis(), expected_kpis(sales_df))
+    # 結合順序に依存しない
+    assert_kpis_equal(parts[3].merge(parts[1]).to_kpis(), parts[1].merge(parts[3]).to_kpis())
+
+
+def test_from_aggregates(sales_df):
+    halves = [PartialAggregates.from_frame(part) for part in split_rows(sales_df, 2)]
+    state = KPIState.from_aggregates(halves[0].merge(halves[1]))
+    
+    assert_kpis_equal(state.to_kpis(), expected_kpis(sales_df))
+    assert KPIState.from_aggregates(PartialAggregates()).to_kpis()['総取引件数'] == 0
+
+
+def test_empty_frame(sales_df):
+    state = KPIState.from_frame(sales_df.iloc[:0])
+    
+    assert state.to_kpis() == {
+        '総売上': 0,
+        '総顧客数': 0,
+        '平均購入金額': 0,
+        '総取引件数': 0,
+        '平均年齢': 0,
+        'リピート率': 0,
+    }
+
+
+def test_single_customer(sales_df):
+    customer_id = sales_df['顧客ID'].value_counts().index[0]
+    rows = sales_df[sales_df['顧客ID'] == customer_id]
+    kpis = KPIState.from_frame(rows).to_kpis()
+    
+    assert kpis['総顧客数'] == 1
+    assert kpis['リピート率'] == 100
+    assert kpis['総売上'] == rows['購入金額'].sum()
+    
+    once = KPIState.from_frame(rows.iloc[:1]).to_kpis()
+    assert once['リピート率'] == 0
+
+
+def test_out_of_range_ids_are_rejected(sales_df):
+    rows = sales_df.head(10)
+    
+    assert KPIState.from_frame(rows.assign(顧客ID=rows['顧客ID'] - 10_000)) is None
+    assert KPIState.from_frame(rows.assign(顧客ID=rows['顧客ID'] + MIN_CUSTOMER_ID_SPAN)) is None
+    assert KPIState.from_frame(rows.assign(顧客ID=rows['顧客ID'].astype(str))) is None
+    
+    # 反映できない追記では状態を変更しない
+    state = KPIState.from_frame(rows)
+    before = state.to_kpis()
+    assert not state.update(rows.assign(顧客ID=-1))
+    assert state.to_kpis() == before
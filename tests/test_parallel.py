@@ -0,0 +1,35 @@
+"""
+並列読み込みのテスト - ファイルの順序によらず購入日順に返すこと
+"""
+import numpy as np
+import pytest
+from src.utils.parallel import load_files_parallel
+
+
+def write_files(raw_sales, tmp_path, labels):
+    """ラベルごとに行を分けたCSVを書き出し、パスを返す"""
+    paths = []
+    for label, rows in raw_sales.groupby(labels):
+        path = tmp_path / f"{label}.csv"
+        rows.to_csv(path, index=False)
+        paths.append(str(path))
+    return paths
+
+
+@pytest.mark.parametrize('split', ['年月', 'ランダム'])
+def test_shuffled_files_load_in_date_order(raw_sales, tmp_path, monkeypatch, split):
+    monkeypatch.chdir(tmp_path)
+    rng = np.random.default_rng(0)
+    if split == '年月':
+        labels = raw_sales['購入日'].dt.strftime('%Y-%m').to_numpy()
+    else:
+        labels = rng.integers(0, 4, len(raw_sales))
+    paths = write_files(raw_sales, tmp_path, labels)
+    paths = [paths[i] for i in rng.permutation(len(paths))]
+    
+    df, timings = load_files_parallel(paths, max_workers=2)
+    
+    assert df['購入日'].is_monotonic_increasing
+    assert len(df) == len(raw_sales)
+    assert df['購入金額'].sum() == raw_sales['購入金額'].sum()
+    assert len(timings) == len(paths)
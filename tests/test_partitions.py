@@ -0,0 +1,49 @@
+"""
+パーティションのテスト - 保持期間外の月を読み込まないこと
+"""
+import pandas as pd
+import pytest
+from src.utils import partitions
+from src.utils.partitions import load_partitioned, retention_range
+
+
+@pytest.fixture
+def partition_dir(raw_sales, tmp_path, monkeypatch):
+    """合成データを年月ごとのCSVに分けたディレクトリ（24か月分）"""
+    monkeypatch.chdir(tmp_path)
+    directory = tmp_path / 'partitions'
+    directory.mkdir()
+    for year_month, rows in raw_sales.groupby(raw_sales['購入日'].dt.strftime('%Y-%m')):
+        rows.to_csv(directory / f"{year_month}.csv", index=False)
+    return str(directory)
+
+
+def test_retention_range(partition_dir):
+    assert retention_range(partition_dir, None) is None
+    assert retention_range(partition_dir, 24) is None
+    assert retention_range(partition_dir, 6) == (pd.Timestamp('2024-07-01'), pd.Timestamp('2024-12-31'))
+
+
+def test_load_reads_only_retained_partitions(partition_dir, raw_sales, monkeypatch):
+    read = []
+    read_source = partitions.read_source
+    monkeypatch.setattr(partitions, 'read_source', lambda path: read.append(path) or read_source(path))
+    # マニフェストを先に作り、読み込み時に読むファイルだけを数える
+    partitions.load_manifest(partition_dir)
+    read.clear()
+    
+    df = load_partitioned(partition_dir, retention_range(partition_dir, 6))
+    
+    assert sorted(path[-11:-4] for path in read) == ['2024-07', '2024-08', '2024-09', '2024-10', '2024-11', '2024-12']
+    assert len(df) == (raw_sales['購入日'] >= '2024-07-01').sum()
+    assert df['購入日'].is_monotonic_increasing
+
+
+def test_shared_dataset_applies_retention(partition_dir, raw_sales, monkeypatch):
+    from src.utils import dataset_store
+    
+    monkeypatch.setattr(dataset_store, 'PARTITION_RETENTION_MONTHS', 3)
+    df = dataset_store.SharedDataset(partition_dir).get()
+    
+    assert df['購入日'].min() >= pd.Timestamp('2024-10-01')
+    assert len(df) == (raw_sales['購入日'] >= '2024-10-01').sum()
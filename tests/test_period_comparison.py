@@ -0,0 +1,25 @@
+"""
+期間比較のテスト - 期間フィルターの外の前期間も集計すること
+"""
+import pandas as pd
+from conftest import reference_filter
+from src.utils.data_processor import calculate_kpis, filter_view
+from src.utils.period_comparison import compare_periods
+
+
+def test_previous_period_outside_date_filter(shared_df):
+    filters = {'date_range': ('2024-03-01', '2024-03-31'), 'regions': ['関東', '関西']}
+    filtered = filter_view(shared_df, filters)
+    others = {key: value for key, value in filters.items() if key != 'date_range'}
+    
+    comparison = compare_periods(filter_view(shared_df, others), 'M', end=filtered['購入日'].max())
+    
+    assert comparison['current_range'][1] == pd.Timestamp('2024-03-31')
+    previous_start, previous_end = comparison['previous_range']
+    assert previous_end < pd.Timestamp('2024-03-01')
+    expected = calculate_kpis(reference_filter(shared_df, {**others, 'date_range': (previous_start, previous_end)}))
+    assert comparison['previous']['総売上'] == expected['総売上']
+    assert comparison['previous']['総取引件数'] == expected['総取引件数'] > 0
+    
+    # 期間フィルターをかけたまま比較すると前期間が空になる
+    assert compare_periods(filtered, 'M')['previous']['総取引件数'] == 0
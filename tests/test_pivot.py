@@ -0,0 +1,80 @@
+"""
+bincountピボットのテスト - pandasのpivot_tableとの比較
+"""
+import numpy as np
+import pandas as pd
+import pytest
+from conftest import reference_filter
+from src.utils.pivot import bincount_pivot
+
+# 比較する(行, 列)カラムの組
+PIVOT_DIMENSIONS = [
+    ('地域', '購入カテゴリー'),
+    ('支払方法', '購入カテゴリー'),
+    ('年月', '購入カテゴリー'),
+]
+
+
+def expected_pivot(rows: pd.DataFrame, index: str, columns: str, aggfunc: str, fill_value) -> pd.DataFrame:
+    """pivot_tableで作った期待値（ピボットと同じくデータのある行・列だけ）"""
+    return pd.pivot_table(rows, index=index, columns=columns, values='購入金額',
+                          aggfunc=aggfunc, fill_value=fill_value, observed=True)
+
+
+@pytest.mark.parametrize('index, columns', PIVOT_DIMENSIONS)
+@pytest.mark.parametrize('aggfunc', ['sum', 'count', 'mean'])
+@pytest.mark.parametrize('fill_value', [0, None])
+def test_pivot_matches_pivot_table(sales_df, filters, index, columns, aggfunc, fill_value):
+    rows = reference_filter(sales_df, filters)
+    result = bincount_pivot(rows[index], rows[columns], rows['購入金額'], aggfunc, fill_value)
+    expected = expected_pivot(rows, index, columns, aggfunc, fill_value)
+    
+    pd.testing.assert_frame_equal(result, expected, check_dtype=False, check_categorical=False,
+                                  check_index_type=False, check_column_type=False)
+
+
+def test_empty_cells_use_fill_value(sales_df):
+    # 関東は家電だけ、関西は食品だけの行にして、データのないセルを作る
+    rows = sales_df[
+        ((sales_df['地域'] == '関東') & (sales_df['購入カテゴリー'] == '家電'))
+        | ((sales_df['地域'] == '関西') & (sales_df['購入カテゴリー'] == '食品'))
+    ]
+    
+    filled = bincount_pivot(rows['地域'], rows['購入カテゴリー'], rows['購入金額'], 'sum', 0)
+    missing = bincount_pivot(rows['地域'], rows['購入カテゴリー'], rows['購入金額'], 'sum')
+    
+    assert filled.loc['関東', '食品'] == 0
+    assert np.isnan(missing.loc['関西', '家電'])
+    assert filled.loc['関東', '家電'] == rows.loc[rows['地域'] == '関東', '購入金額'].sum()
+
+
+def test_single_group_has_one_cell(sales_df):
+    rows = reference_filter(sales_df, {'regions': ['関東'], 'categories': ['書籍']})
+    result = bincount_pivot(rows['地域'], rows['購入カテゴリー'], rows['購入金額'], 'mean')
+    
+    assert result.shape == (1, 1)
+    assert result.iloc[0, 0] == pytest.approx(rows['購入金額'].mean())
+
+
+def test_empty_rows_give_empty_frame(sales_df):
+    rows = sales_df.iloc[:0]
+    result = bincount_pivot(rows['地域'], rows['購入カテゴリー'], rows['購入金額'], 'sum', 0)
+    
+    assert result.empty
+
+
+def test_missing_values_are_not_aggregated(sales_df):
+    rows = sales_df.head(500)
+    amounts = rows['購入金額'].astype(np.float64).mask(np.arange(len(rows)) % 7 == 0)
+    frame = rows.assign(購入金額=amounts)
+    
+    for aggfunc in ['sum', 'count', 'mean']:
+        result = bincount_pivot(frame['地域'], frame['購入カテゴリー'], frame['購入金額'], aggfunc, 0)
+        expected = expected_pivot(frame, '地域', '購入カテゴリー', aggfunc, 0)
+        pd.testing.assert_frame_equal(result, expected, check_dtype=False, check_categorical=False,
+                                      check_index_type=False, check_column_type=False)
+
+
+def test_unsupported_aggfunc_raises(sales_df):
+    with pytest.raises(ValueError):
+        bincount_pivot(sales_df['地域'], sales_df['購入カテゴリー'], sales_df['購入金額'], 'median')
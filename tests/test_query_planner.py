@@ -0,0 +1,160 @@
+"""
+クエリプランナーのテスト - pandasの真偽値マスクとの比較
+"""
+import numpy as np
+import pandas as pd
+import pytest
+from conftest import reference_filter
+from src.utils.dataset_store import dataset_version
+from src.utils.filter_cache import PredicateMaskCache
+from src.utils.query_planner import (
+    METHOD_BITMAP, METHOD_CANDIDATES, METHOD_REUSED, METHOD_SCAN, PLANNED_COLUMNS, execute_plan, plan_filters
+)
+
+
+def row_positions(rows, n_rows: int) -> np.ndarray:
+    """execute_planの結果（sliceまたは行番号の配列）を行番号の配列に揃える"""
+    if isinstance(rows, slice):
+        return np.arange(n_rows)[rows]
+    return np.asarray(rows)
+
+
+def expected_positions(df: pd.DataFrame, filters: dict) -> np.ndarray:
+    """pandasのマスクで求めた一致行の行番号"""
+    return reference_filter(df.reset_index(drop=True), filters).index.to_numpy()
+
+
+def test_plain_frame_matches_mask(sales_df, filters):
+    rows = execute_plan(sales_df, plan_filters(sales_df, filters))
+    
+    np.testing.assert_array_equal(row_positions(rows, len(sales_df)), expected_positions(sales_df, filters))
+
+
+def test_unsorted_frame_matches_mask(sales_df, filters):
+    # 購入日順でないフレームでは、日付範囲も行ごとの条件として評価する
+    shuffled = sales_df.sample(frac=1, random_state=0).reset_index(drop=True)
+    rows = execute_plan(shuffled, plan_filters(shuffled, filters))
+    
+    np.testing.assert_array_equal(row_positions(rows, len(shuffled)), expected_positions(shuffled, filters))
+
+
+def test_shared_frame_matches_mask(shared_df, filters):
+    rows = execute_plan(shared_df, plan_filters(shared_df, filters))
+    
+    np.testing.assert_array_equal(row_positions(rows, len(shared_df)), expected_positions(shared_df, filters))
+
+
+def test_cached_masks_match_mask(shared_df, filters):
+    masks = PredicateMaskCache().bind(dataset_version(shared_df, PLANNED_COLUMNS))
+    expected = expected_positions(shared_df, filters)
+    
+    # 1回目はビットセットを作って登録し、2回目は登録済みのビットセットを合成する
+    for _ in range(2):
+        rows = execute_plan(shared_df, plan_filters(shared_df, filters), masks)
+        np.testing.assert_array_equal(row_positions(rows, len(shared_df)), expected)
+
+
+def test_cached_masks_follow_changed_condition(shared_df):
+    masks = PredicateMaskCache().bind(dataset_version(shared_df, PLANNED_COLUMNS))
+    filters = {'regions': ['関東'], 'categories': ['家電']}
+    execute_plan(shared_df, plan_filters(shared_df, filters), masks)
+    
+    changed = {'regions': ['関東'], 'categories': ['食品']}
+    rows = execute_plan(shared_df, plan_filters(shared_df, changed), masks)
+    
+    np.testing.assert_array_equal(row_positions(rows, len(shared_df)), expected_positions(shared_df, changed))
+    assert masks.get('categories', ('食品',)) is not None
+
+
+def test_shared_frame_uses_indexes(shared_df):
+    filters = {'date_range': ('2023-03-01', '2023-08-31'), 'regions': ['関東']}
+    plan = plan_filters(shared_df, filters)
+    
+    # 日付範囲は日付インデックスの行範囲、地域はビットマップで評価する
+    assert plan.window_rows == len(reference_filter(shared_df, {'date_range': filters['date_range']}))
+    assert [predicate.method for predicate in plan.predicates] == [METHOD_BITMAP]
+
+
+def test_sparse_conditions_use_candidates(sales_df):
+    filters = {'regions': ['関東'], 'genders': ['女性'], 'categories': ['書籍'], 'payment_methods': ['現金']}
+    plan = plan_filters(sales_df, filters)
+    
+    # 選択率の小さい順に並び、絞り込んだ後の条件は候補行だけで評価する
+    selectivities = [predicate.selectivity for predicate in plan.predicates]
+    assert selectivities == sorted(selectivities)
+    assert plan.predicates[-1].method == METHOD_CANDIDATES
+
+
+def test_no_match_is_empty(sales_df):
+    plan = plan_filters(sales_df, {'date_range': ('2022-01-01', '2022-06-30')})
+    assert plan.is_empty
+    assert ('date_range', '期間内のデータなし') in plan.eliminated
+    assert plan.estimated_rows() == 0
+    assert len(execute_plan(sales_df, plan)) == 0
+    
+    plan = plan_filters(sales_df, {'regions': ['存在しない地域']})
+    assert plan.is_empty
+    assert ('regions', '一致する値なし') in plan.eliminated
+
+
+def test_full_selection_is_eliminated(sales_df):
+    filters = {
+        'regions': sales_df['地域'].cat.categories.tolist(),
+        'age_range': (0, 120),
+    }
+    plan = plan_filters(sales_df, filters)
+    
+    assert ('regions', '全ての値を選択') in plan.eliminated
+    assert ('age_range', 'データ全体の範囲') in plan.eliminated
+    assert not plan.predicates
+    assert execute_plan(sales_df, plan) == slice(0, len(sales_df))
+
+
+def test_plan_frame_lists_steps(shared_df):
+    filters = {'date_range': ('2023-03-01', '2023-08-31'), 'regions': ['関東'], 'age_range': (21, 40)}
+    steps = plan_filters(shared_df, filters).to_frame()
+    
+    assert steps['順序'].tolist() == [1, 2, 3]
+    assert steps['条件'].iloc[0] == '期間'
+
+
+def test_cached_masks_run_planned_methods(shared_df):
+    masks = PredicateMaskCache().bind(dataset_version(shared_df, PLANNED_COLUMNS))
+    filters = {
+        'date_range': ('2023-03-01', '2023-08-31'),
+        'regions': ['関東'], 'genders': ['女性'], 'categories': ['書籍'],
+        'payment_methods': ['現金'], 'age_range': (21, 40),
+    }
+    
+    plan = plan_filters(shared_df, filters)
+    rows = execute_plan(shared_df, plan, masks)
+    np.testing.assert_array_equal(row_positions(rows, len(shared_df)), expected_positions(shared_df, filters))
+    
+    # キャッシュを使う経路でも、計画した方式のとおりに評価する
+    assert plan.executed == [(predicate.key, predicate.method) for predicate in plan.predicates]
+    assert METHOD_BITMAP in dict(plan.executed).values()
+    
+    again = plan_filters(shared_df, filters)
+    execute_plan(shared_df, again, masks)
+    assert again.executed == [
+        (predicate.key, METHOD_CANDIDATES if predicate.method == METHOD_CANDIDATES else METHOD_REUSED)
+        for predicate in again.predicates
+    ]
+
+
+def test_cached_scan_bits_cover_date_window(shared_df):
+    masks = PredicateMaskCache().bind(dataset_version(shared_df, PLANNED_COLUMNS))
+    filters = {'date_range': ('2023-03-01', '2023-08-31'), 'age_range': (21, 40)}
+    plan = plan_filters(shared_df, filters)
+    execute_plan(shared_df, plan, masks)
+    
+    # 行範囲を走査する条件は日付範囲内だけを評価し、日付範囲が変われば評価し直す
+    assert plan.executed == [('age_range', METHOD_SCAN)]
+    start, stop = plan.window
+    assert len(masks.get('age_range', ((21, 40), plan.window))) == (stop + 7) // 8 - start // 8
+    
+    wider = {'date_range': ('2023-03-01', '2023-12-31'), 'age_range': (21, 40)}
+    plan = plan_filters(shared_df, wider)
+    rows = execute_plan(shared_df, plan, masks)
+    assert plan.executed == [('age_range', METHOD_SCAN)]
+    np.testing.assert_array_equal(row_positions(rows, len(shared_df)), expected_positions(shared_df, wider))
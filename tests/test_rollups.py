@@ -0,0 +1,48 @@
+"""
+日別集計のテスト - 期間別集計とスケッチの遅延作成
+"""
+import numpy as np
+import pandas as pd
+from conftest import reference_filter
+from src.utils.calendar_dim import to_day_id
+from src.utils.distinct_sketch import hash_values, register_ranks
+from src.utils.rollups import DailyRollup
+
+
+def test_monthly_rollup_matches_groupby(sales_df, filters):
+    rows = reference_filter(sales_df, filters)
+    result = DailyRollup(rows).rollup('M')
+    
+    grouped = rows.groupby(rows['購入日'].dt.to_period('M'))
+    expected = grouped['購入金額'].agg(['sum', 'size']).join(grouped['顧客ID'].nunique())
+    result = result[result['取引件数'] > 0]
+    
+    assert result['総売上'].tolist() == expected['sum'].tolist()
+    assert result['取引件数'].tolist() == expected['size'].tolist()
+    assert result['顧客数'].tolist() == expected['顧客ID'].tolist()
+
+
+def test_registers_are_built_on_first_approximate_query(sales_df):
+    rollup = DailyRollup(sales_df)
+    assert rollup._registers is None
+    before = rollup.nbytes
+    
+    rollup.rollup('M')
+    assert rollup._registers is None
+    
+    rollup.rollup('M', approximate=True)
+    assert rollup._registers is not None
+    assert rollup.nbytes >= before + rollup.registers.nbytes
+
+
+def test_lazy_registers_match_rows(sales_df):
+    rollup = DailyRollup(sales_df)
+    
+    # 行ごとに作ったスケッチと、日・顧客の組から作ったスケッチは同じになる
+    day_ids = to_day_id(sales_df['購入日'])
+    day_index = np.searchsorted(rollup.days, day_ids)
+    registers, ranks = register_ranks(hash_values(sales_df['顧客ID']), rollup.precision)
+    expected = np.zeros((len(rollup.days), rollup.n_registers), dtype=np.uint8)
+    np.maximum.at(expected, (day_index, registers), ranks)
+    
+    np.testing.assert_array_equal(rollup.registers, expected)
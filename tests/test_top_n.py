@@ -0,0 +1,158 @@
+"""
+上位N件のテスト - pandasのgroupbyとnlargestとの比較
+"""
+import numpy as np
+import pandas as pd
+import pytest
+from conftest import reference_filter
+from src.utils.streaming import PartialAggregates, load_top_customers
+from src.utils.top_n import StreamingTopN, group_codes, top_n_groups, top_n_positions
+
+# 比較するグループ化カラム（カテゴリー型・整数・日付）
+GROUP_COLUMNS = ['地域', '顧客ID', '購入日']
+
+
+def expected_top(rows: pd.DataFrame, column: str, n: int, rank_by: str) -> pd.DataFrame:
+    """groupbyで集計し、同じ値はグループの値の昇順にして上位N件を選んだ期待値"""
+    grouped = rows.groupby(column, observed=True)['購入金額'].agg(合計='sum', 件数='size')
+    ranked = '合計' if rank_by == 'sum' else '件数'
+    return grouped.reset_index().sort_values(
+        [ranked, column], ascending=[False, True], kind='stable'
+    ).head(n).set_index(column)
+
+
+@pytest.mark.parametrize('column', GROUP_COLUMNS)
+@pytest.mark.parametrize('rank_by', ['sum', 'count'])
+@pytest.mark.parametrize('n', [1, 5, 20])
+def test_top_n_matches_groupby(sales_df, filters, column, rank_by, n):
+    rows = reference_filter(sales_df, filters)
+    result = top_n_groups(rows[column], rows['購入金額'], n, rank_by)
+    expected = expected_top(rows, column, n, rank_by)
+    
+    pd.testing.assert_frame_equal(result, expected, check_dtype=False, check_categorical=False,
+                                  check_index_type=False)
+
+
+def test_top_sums_match_nlargest(sales_df):
+    result = top_n_groups(sales_df['顧客ID'], sales_df['購入金額'], 10)
+    expected = sales_df.groupby('顧客ID')['購入金額'].sum().nlargest(10)
+    
+    # 合計に同じ値がなければ、nlargestと同じ顧客が同じ順に並ぶ
+    assert expected.is_unique
+    assert result.index.tolist() == expected.index.tolist()
+    assert result['合計'].tolist() == expected.tolist()
+
+
+def test_single_group(sales_df):
+    rows = reference_filter(sales_df, {'regions': ['関東']})
+    result = top_n_groups(rows['地域'], rows['購入金額'], 5)
+    
+    assert result.index.tolist() == ['関東']
+    assert result['合計'].iloc[0] == rows['購入金額'].sum()
+    assert result['件数'].iloc[0] == len(rows)
+
+
+def test_empty_rows_give_empty_frame(sales_df):
+    rows = sales_df.iloc[:0]
+    result = top_n_groups(rows['地域'], rows['購入金額'], 5)
+    
+    assert result.empty
+    assert list(result.columns) == ['合計', '件数']
+    assert result.index.name == '地域'
+
+
+def test_missing_keys_are_excluded(sales_df):
+    rows = sales_df.head(1000)
+    regions = rows['地域'].mask(np.arange(len(rows)) % 5 == 0)
+    result = top_n_groups(regions, rows['購入金額'], 10)
+    
+    assert result['件数'].sum() == regions.notna().sum()
+
+
+def test_ties_are_ordered_by_label():
+    scores = np.array([3, 5, 5, 1, 5, 2])
+    labels = pd.Index(['f', 'e', 'a', 'c', 'b', 'd'])
+    
+    assert top_n_positions(scores, 2, labels).tolist() == [2, 4]
+    assert top_n_positions(scores, 2).tolist() == [1, 2]
+    assert top_n_positions(scores, 10, labels).tolist() == [2, 4, 1, 0, 5, 3]
+    assert len(top_n_positions(scores, 0)) == 0
+
+
+def test_group_codes(sales_df):
+    codes, labels = group_codes(sales_df['地域'])
+    assert (labels[codes] == sales_df['地域'].to_numpy()).all()
+    
+    # 小さい0以上の整数は値そのものをコードにする
+    codes, labels = group_codes(sales_df['顧客ID'])
+    assert (codes == sales_df['顧客ID'].to_numpy()).all()
+    
+    # それ以外はハッシュによるコード化
+    codes, labels = group_codes(pd.Series([10**12, -3, 10**12]))
+    assert codes.tolist() == [0, 1, 0]
+    assert labels.tolist() == [10**12, -3]
+
+
+@pytest.mark.parametrize('column', ['購入金額合計', '購入回数'])
+@pytest.mark.parametrize('n', [0, 1, 10])
+def test_streamed_top_customers_match_nlargest(sales_df, tmp_path, column, n):
+    feather = pytest.importorskip('pyarrow.feather')
+    customers = PartialAggregates.from_frame(sales_df).customers
+    # 複数のレコードバッチに分かれたストアにする
+    feather.write_feather(customers.reset_index(), tmp_path / 'customers.feather',
+                          compression='uncompressed', chunksize=500)
+    
+    result = load_top_customers(str(tmp_path), n, column)
+    expected = customers[column].nlargest(n, keep='all')
+    
+    assert len(result) == n
+    assert result[column].tolist() == expected.iloc[:n].tolist()
+    assert result.index.isin(expected.index).all()
+    pd.testing.assert_frame_equal(result, customers.loc[result.index], check_dtype=False)
+    
+    # 同じ値の顧客は、明細から集計した上位N件と同じく顧客IDの昇順で選ばれる
+    rank_by = 'sum' if column == '購入金額合計' else 'count'
+    in_memory = top_n_groups(sales_df['顧客ID'], sales_df['購入金額'], n, rank_by)
+    assert result.index.tolist() == in_memory.index.tolist()
+
+
+def test_streaming_ties_match_top_n_positions():
+    rng = np.random.default_rng(0)
+    scores = rng.integers(0, 5, 1000)
+    labels = rng.permutation(1000)
+    
+    top_n = StreamingTopN(25)
+    for start in range(0, len(scores), 64):
+        top_n.push(labels[start:start + 64], scores[start:start + 64])
+    
+    expected = top_n_positions(scores, 25, labels)
+    assert top_n.result() == list(zip(scores[expected].tolist(), labels[expected].tolist()))
+
+
+def test_top_customers_use_stream_store(raw_sales, tmp_path, monkeypatch):
+    pytest.importorskip('pyarrow')
+    from src.utils import data_processor, snapshot
+    from src.utils.data_loader import load_shared_data
+    
+    # 閾値を0にして、ストリーミング取り込みのストアから読み込ませる
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(snapshot, 'STREAMING_THRESHOLD_BYTES', 0)
+    csv_path = tmp_path / 'streamed.csv'
+    raw_sales.to_csv(csv_path, index=False)
+    df = load_shared_data(str(csv_path))
+    
+    calls = []
+    load = data_processor.load_streamed_top_customers
+    monkeypatch.setattr(data_processor, 'load_streamed_top_customers', lambda *args: calls.append(args) or load(*args))
+    
+    view = data_processor.filter_view(df, {})
+    for rank_by in ['sum', 'count']:
+        result = data_processor.get_top_groups(view, '顧客ID', '購入金額', 10, rank_by, first_columns=['地域'])
+        expected = data_processor.get_top_groups(df.copy(deep=True), '顧客ID', '購入金額', 10, rank_by, first_columns=['地域'])
+        pd.testing.assert_frame_equal(result, expected, check_dtype=False)
+    assert len(calls) == 2
+    
+    # フィルター結果は明細から集計する
+    filtered = data_processor.filter_view(df, {'regions': ['関東']})
+    data_processor.get_top_groups(filtered, '顧客ID', '購入金額', 10)
+    assert len(calls) == 2